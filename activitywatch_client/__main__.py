@@ -31,10 +31,23 @@ def main():
     parser.add_argument("--cli", action="store_true", help="Запустить CLI режим")
     parser.add_argument("--service", action="store_true", help="Запустить сервис синхронизации")
     parser.add_argument("--interval", type=int, default=5, help="Интервал синхронизации в минутах")
+    parser.add_argument("--status", action="store_true", help="Показать состояние синхронизации")
     
     args = parser.parse_args()
     
-    if args.service:
+    if args.status:
+        client = ActivityWatchClient()
+        state_manager = SyncStateManager(client.state_file)
+        sync_service = ActivityWatchSyncService(client, state_manager)
+        status = sync_service.get_status()
+        outbox = status["outbox"]
+        print(f"Device ID: {status['device_id']}")
+        print(f"Последняя синхронизация: {status['last_sync_time'] or 'никогда'}")
+        print(f"Событий в очереди: {outbox['pending_events']}")
+        if outbox["oldest_unsent_age_seconds"] is not None:
+            print(f"Возраст старейшего события: {outbox['oldest_unsent_age_seconds']:.0f} сек")
+        print(f"Размер файла очереди: {outbox['file_bytes']} байт")
+    elif args.service:
         # Запускаем сервис синхронизации
         client = ActivityWatchClient()
         state_manager = SyncStateManager(client.state_file)
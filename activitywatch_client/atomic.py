@@ -0,0 +1,31 @@
+import os
+from pathlib import Path
+
+
+def atomic_write(path: Path, data: bytes, fsync: bool = False):
+    """
+    Атомарно записывает файл через временный файл и переименование.
+
+    При сбое во время записи на диске остается либо старая, либо новая
+    версия файла, но никогда не частично записанная.
+
+    Args:
+        path: Путь к файлу
+        data: Содержимое файла
+        fsync: Сбрасывать ли данные на диск перед переименованием
+    """
+    tmp_path = path.with_name(path.name + ".tmp")
+    with open(tmp_path, "wb") as f:
+        f.write(data)
+        if fsync:
+            f.flush()
+            os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+    if fsync and hasattr(os, "O_DIRECTORY"):
+        # Фиксируем само переименование (только POSIX)
+        dir_fd = os.open(str(path.parent), os.O_RDONLY | os.O_DIRECTORY)
+        try:
+            os.fsync(dir_fd)
+        finally:
+            os.close(dir_fd)
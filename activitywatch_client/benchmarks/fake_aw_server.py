@@ -0,0 +1,209 @@
+"""
+Заглушка aw-server для бенчмарков и проверки клиента без ActivityWatch.
+
+События генерируются детерминированно: в каждом bucket событие i
+начинается в first + i * spacing, поэтому выборка по периоду считается
+арифметически и не требует хранения событий. Новые события появляются
+с течением времени с той же частотой; длительность последнего события
+растет, как при heartbeat.
+
+Запуск:
+    python fake_aw_server.py --port 5666 --history 20000 --spacing 1.0
+"""
+
+import argparse
+import json
+import math
+import threading
+import time
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+APPS = [
+    ("code", 0.30),
+    ("firefox", 0.25),
+    ("chrome", 0.15),
+    ("slack", 0.10),
+    ("terminal", 0.08),
+    ("telegram", 0.05),
+    ("spotify", 0.04),
+    ("explorer", 0.03),
+]
+
+BUCKET_TYPES = [
+    ("aw-watcher-window_bench", "currentwindow"),
+    ("aw-watcher-afk_bench", "afkstatus"),
+    ("aw-watcher-web-firefox_bench", "web.tab.current"),
+    ("aw-watcher-vscode_bench", "app.editor.activity"),
+]
+
+
+def _parse_time(value: str) -> float:
+    dt = datetime.fromisoformat(value.replace("Z", "+00:00"))
+    if dt.tzinfo is None:
+        dt = dt.replace(tzinfo=timezone.utc)
+    return dt.timestamp()
+
+
+def _format_time(ts: float) -> str:
+    return datetime.fromtimestamp(ts, tz=timezone.utc).isoformat()
+
+
+class GeneratedBucket:
+    """Bucket с событиями, заданными формулой."""
+
+    def __init__(self, bucket_id: str, bucket_type: str, first: float, spacing: float):
+        self.bucket_id = bucket_id
+        self.bucket_type = bucket_type
+        self.first = first
+        self.spacing = spacing
+        # Кумулятивные веса приложений для детерминированного выбора
+        self.cumulative = []
+        total = 0.0
+        for app, weight in APPS:
+            total += weight
+            self.cumulative.append((total, app))
+
+    def count(self, now: float) -> int:
+        """Количество событий, начавшихся к моменту now."""
+        if now < self.first:
+            return 0
+        return int((now - self.first) // self.spacing) + 1
+
+    def event(self, i: int, now: float) -> dict:
+        start = self.first + i * self.spacing
+        duration = min(self.spacing * 0.9, max(0.0, now - start))
+        if self.bucket_type == "afkstatus":
+            data = {"status": "afk" if i % 7 == 0 else "not-afk"}
+        else:
+            # Псевдослучайное, но воспроизводимое приложение
+            x = ((i * 2654435761) % 2**32) / 2**32
+            app = next(app for bound, app in self.cumulative if x <= bound + 1e-12)
+            data = {"app": app, "title": f"{app} window {i % 97}"}
+            if self.bucket_type == "web.tab.current":
+                data = {"url": f"https://example.com/{i % 211}", "title": data["title"]}
+        return {
+            "id": i + 1,
+            "timestamp": _format_time(start),
+            "duration": round(duration, 3),
+            "data": data,
+        }
+
+    def events(self, start, end, limit: int, now: float) -> list:
+        """События, пересекающиеся с периодом, от новых к старым."""
+        total = self.count(now)
+        if total == 0:
+            return []
+        lo = 0
+        if start is not None:
+            # Событие пересекается с периодом, если заканчивается после start
+            lo = max(0, math.ceil((start - self.first - self.spacing * 0.9) / self.spacing))
+        hi = total - 1
+        if end is not None:
+            hi = min(hi, int((end - self.first) // self.spacing))
+        if hi < lo:
+            return []
+        if limit is not None and limit >= 0:
+            lo = max(lo, hi - limit + 1)
+        return [self.event(i, now) for i in range(hi, lo - 1, -1)]
+
+
+class FakeAWServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address, history: int, spacing: float, buckets: int):
+        super().__init__(address, FakeAWHandler)
+        now = time.time()
+        first = now - history * spacing
+        self.buckets = {
+            bucket_id: GeneratedBucket(bucket_id, bucket_type, first, spacing)
+            for bucket_id, bucket_type in BUCKET_TYPES[:buckets]
+        }
+        self.lock = threading.Lock()
+        self.stats = {"requests": 0, "bytes_sent": 0, "events_served": 0}
+
+
+class FakeAWHandler(BaseHTTPRequestHandler):
+    server: FakeAWServer
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send(self, status: int, body, events: int = 0):
+        payload = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+        with self.server.lock:
+            self.server.stats["requests"] += 1
+            self.server.stats["bytes_sent"] += len(payload)
+            self.server.stats["events_served"] += events
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        parts = [p for p in url.path.split("/") if p]
+        now = time.time()
+
+        if url.path == "/_stats":
+            with self.server.lock:
+                stats = dict(self.server.stats)
+            return self._send(200, stats)
+        if parts[:2] != ["api", "0"]:
+            return self._send(404, {"message": "Not found"})
+
+        if parts[2:] == ["info"]:
+            return self._send(200, {"hostname": "bench", "version": "fake"})
+        if parts[2:] == ["buckets"]:
+            return self._send(
+                200,
+                {
+                    b.bucket_id: {
+                        "id": b.bucket_id,
+                        "type": b.bucket_type,
+                        "hostname": "bench",
+                        "created": _format_time(b.first),
+                    }
+                    for b in self.server.buckets.values()
+                },
+            )
+        if len(parts) == 5 and parts[2] == "buckets" and parts[4] == "events":
+            bucket = self.server.buckets.get(parts[3])
+            if bucket is None:
+                return self._send(404, {"message": "No such bucket"})
+            params = parse_qs(url.query)
+            start = _parse_time(params["start"][0]) if "start" in params else None
+            end = _parse_time(params["end"][0]) if "end" in params else None
+            limit = int(params.get("limit", ["-1"])[0])
+            events = bucket.events(start, end, limit, now)
+            return self._send(200, events, len(events))
+
+        return self._send(404, {"message": "Not found"})
+
+    def do_POST(self):
+        # Язык запросов не эмулируется: клиент переходит на локальный подсчет
+        length = int(self.headers.get("Content-Length", 0))
+        self.rfile.read(length)
+        self._send(404, {"message": "Query API is not emulated"})
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Заглушка aw-server")
+    parser.add_argument("--port", type=int, default=5666)
+    parser.add_argument("--history", type=int, default=20000, help="Событий истории в bucket")
+    parser.add_argument("--spacing", type=float, default=1.0, help="Интервал между событиями, сек")
+    parser.add_argument("--buckets", type=int, default=4, choices=range(1, 5))
+    args = parser.parse_args()
+
+    server = FakeAWServer(("127.0.0.1", args.port), args.history, args.spacing, args.buckets)
+    print(f"fake aw-server: http://127.0.0.1:{server.server_address[1]}/api/0", flush=True)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,167 @@
+"""
+Заглушка сервера приема данных для бенчмарков клиента.
+
+Реализует эндпоинты, которые использует клиент: проверку доступности,
+протокол v2 (/tracker/handshake, /tracker/receive_batch), протокол v1
+(/tracker/receive_incremental) и дневную сводку. События хранятся
+в памяти с дедупликацией по (bucket, id, timestamp), как на сервере.
+
+Служебные эндпоинты:
+    GET  /_stats    - счетчики принятых событий и байт
+    POST /_control  - {"down": true} имитирует недоступность сервера (503)
+
+Запуск:
+    python fake_ingest_server.py --port 8666
+"""
+
+import argparse
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class FakeIngestServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address):
+        super().__init__(address, FakeIngestHandler)
+        self.lock = threading.Lock()
+        self.down = False
+        self.sessions = {}
+        # bucket -> {(id, timestamp): длительность}
+        self.events = {}
+        # bucket -> (timestamp, id) последнего события
+        self.watermarks = {}
+        self.stats = {
+            "requests": 0,
+            "bytes_received": 0,
+            "events_received": 0,
+            "events_stored": 0,
+            "events_updated": 0,
+            "summaries": 0,
+            "rejected": 0,
+        }
+
+    def store(self, bucket_id: str, events: list) -> dict:
+        """Сохраняет пачку и возвращает водяную отметку bucket."""
+        with self.lock:
+            stored = self.events.setdefault(bucket_id, {})
+            for event in events:
+                key = (str(event.get("id")), event.get("timestamp"))
+                if key in stored:
+                    if "open" in event and stored[key] != event.get("duration"):
+                        self.stats["events_updated"] += 1
+                        stored[key] = event.get("duration")
+                    continue
+                stored[key] = event.get("duration")
+                self.stats["events_stored"] += 1
+                mark = (event.get("timestamp") or "", key[0])
+                if mark > self.watermarks.get(bucket_id, ("", "")):
+                    self.watermarks[bucket_id] = mark
+            self.stats["events_received"] += len(events)
+            mark = self.watermarks.get(bucket_id)
+        if not mark:
+            return None
+        return {"timestamp": mark[0], "event_id": mark[1]}
+
+
+class FakeIngestHandler(BaseHTTPRequestHandler):
+    server: FakeIngestServer
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send(self, status: int, body):
+        payload = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def _read_json(self):
+        length = int(self.headers.get("Content-Length", 0))
+        body = self.rfile.read(length)
+        with self.server.lock:
+            self.server.stats["requests"] += 1
+            self.server.stats["bytes_received"] += length
+        return json.loads(body or b"{}")
+
+    def _unavailable(self) -> bool:
+        if self.server.down:
+            with self.server.lock:
+                self.server.stats["rejected"] += 1
+            self._send(503, {"detail": "Service unavailable"})
+            return True
+        return False
+
+    def do_GET(self):
+        if self.path == "/_stats":
+            with self.server.lock:
+                return self._send(200, dict(self.server.stats, down=self.server.down))
+        if self._unavailable():
+            return
+        with self.server.lock:
+            self.server.stats["requests"] += 1
+        self._send(200, {"status": "ok"})
+
+    def do_POST(self):
+        data = self._read_json()
+
+        if self.path == "/_control":
+            self.server.down = bool(data.get("down"))
+            return self._send(200, {"down": self.server.down})
+        if self._unavailable():
+            return
+
+        if self.path == "/tracker/handshake":
+            with self.server.lock:
+                session_id = len(self.server.sessions) + 1
+                self.server.sessions[session_id] = data.get("device_id")
+                watermarks = {
+                    bucket_id: {"timestamp": mark[0], "event_id": mark[1]}
+                    for bucket_id, mark in self.server.watermarks.items()
+                    if bucket_id in (data.get("buckets") or [])
+                }
+            return self._send(
+                200, {"protocol": 2, "session_id": session_id, "watermarks": watermarks}
+            )
+
+        if self.path == "/tracker/receive_batch":
+            if data.get("session_id") not in self.server.sessions:
+                return self._send(410, {"detail": "Unknown or closed sync session"})
+            events = data.get("events", [])
+            watermark = self.server.store(data.get("bucket_id") or "", events)
+            return self._send(
+                200,
+                {"status": "committed", "events_count": len(events), "watermark": watermark},
+            )
+
+        if self.path == "/tracker/receive_incremental":
+            events = data.get("events", [])
+            self.server.store(data.get("bucket_id") or "", events)
+            return self._send(200, {"status": "accepted", "events_count": len(events)})
+
+        if self.path == "/tracker/receive_daily_summary":
+            with self.server.lock:
+                self.server.stats["summaries"] += 1
+            return self._send(200, {"status": "success"})
+
+        self._send(404, {"detail": "Not Found"})
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Заглушка сервера приема данных")
+    parser.add_argument("--port", type=int, default=8666)
+    args = parser.parse_args()
+
+    server = FakeIngestServer(("127.0.0.1", args.port))
+    print(f"fake ingest server: http://127.0.0.1:{server.server_address[1]}", flush=True)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
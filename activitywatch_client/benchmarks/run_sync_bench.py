@@ -0,0 +1,308 @@
+"""
+Бенчмарк синхронизации клиента на заглушках aw-server и сервера приема.
+
+Сценарии:
+    catch_up  - первая синхронизация всей истории buckets
+    steady    - регулярные циклы при постоянном потоке новых событий
+    outage    - сервер приема недоступен несколько циклов, затем
+                очередь досылается после восстановления
+
+Для каждого сценария выводятся события в секунду, переданные байты
+(ответы aw-server и запросы к серверу приема), количество HTTP-запросов,
+пиковый RSS и процессорное время клиента. Каждый сценарий выполняется
+в отдельном процессе, поэтому RSS и CPU не смешиваются между сценариями.
+Сеть не нужна: обе заглушки запускаются локально.
+
+Запуск:
+    python run_sync_bench.py
+    python run_sync_bench.py --history 100000 --spacing 0.05 --output bench.json
+    python run_sync_bench.py --server-url http://localhost:8000   # реальный сервер
+"""
+
+import argparse
+import json
+import logging
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.request
+from pathlib import Path
+from typing import Dict, Optional
+
+BENCH_DIR = Path(__file__).resolve().parent
+sys.path.insert(0, str(BENCH_DIR.parent))
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+SCENARIOS = ("catch_up", "steady", "outage")
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def _request(url: str, data: Optional[dict] = None) -> Optional[dict]:
+    body = json.dumps(data).encode() if data is not None else None
+    request = urllib.request.Request(
+        url, data=body, headers={"Content-Type": "application/json"}
+    )
+    try:
+        with urllib.request.urlopen(request, timeout=5) as response:
+            return json.loads(response.read())
+    except OSError:
+        return None
+
+
+def _wait_for(url: str, timeout: float = 10):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if _request(url) is not None:
+            return
+        time.sleep(0.1)
+    raise RuntimeError(f"Заглушка не запустилась: {url}")
+
+
+def _peak_rss_mb() -> Optional[float]:
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux отдает килобайты, macOS - байты
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+class Meter:
+    """Снимает показатели клиента и заглушек до и после участка сценария."""
+
+    def __init__(self, service, aw_url: str, ingest_url: Optional[str]):
+        self.service = service
+        self.aw_stats_url = aw_url.rsplit("/api/0", 1)[0] + "/_stats"
+        self.ingest_stats_url = f"{ingest_url}/_stats" if ingest_url else None
+
+    def _snapshot(self) -> Dict:
+        ingest = _request(self.ingest_stats_url) if self.ingest_stats_url else None
+        return {
+            "wall": time.monotonic(),
+            "cpu": time.process_time(),
+            "requests": self.service.client.request_count,
+            "aw": _request(self.aw_stats_url) or {},
+            "ingest": ingest or {},
+        }
+
+    def start(self):
+        self.before = self._snapshot()
+
+    def stop(self) -> Dict:
+        after = self._snapshot()
+        before = self.before
+        wall = after["wall"] - before["wall"]
+        delivered = after["ingest"].get("events_received", 0) - before["ingest"].get(
+            "events_received", 0
+        )
+        return {
+            "wall_seconds": round(wall, 3),
+            "cpu_seconds": round(after["cpu"] - before["cpu"], 3),
+            "http_requests": after["requests"] - before["requests"],
+            "events_delivered": delivered if self.ingest_stats_url else None,
+            "events_per_sec": round(delivered / wall, 1) if wall and delivered else None,
+            "aw_bytes": after["aw"].get("bytes_sent", 0) - before["aw"].get("bytes_sent", 0),
+            "ingest_bytes": (
+                after["ingest"].get("bytes_received", 0)
+                - before["ingest"].get("bytes_received", 0)
+            ),
+            "peak_rss_mb": _peak_rss_mb(),
+        }
+
+
+def _make_service(aw_url: str, server_url: str, workdir: Path):
+    from service import ActivityWatchClient
+    from sync_client import ActivityWatchSyncService, SyncStateManager
+
+    # Сервис пишет подробный лог на каждое событие: в замерах он не нужен
+    logging.getLogger().setLevel(logging.WARNING)
+
+    client = ActivityWatchClient(api_url=aw_url, server_url=server_url)
+    client._device_id = "bench-device"  # вместо конфигурации регистрации
+    client.state_file = workdir / "state.json"
+    client.outbox_file = workdir / "outbox.sqlite"
+    state_manager = SyncStateManager(client.state_file)
+    return ActivityWatchSyncService(client, state_manager)
+
+
+def _sync_until_drained(service, max_cycles: int = 50) -> int:
+    """Повторяет циклы, пока очередь не будет отправлена."""
+    cycles = 0
+    while cycles < max_cycles:
+        cycles += 1
+        if service.sync() and service.outbox.size() == 0:
+            break
+    return cycles
+
+
+def run_child(args) -> Dict:
+    """Выполняет один сценарий в текущем процессе."""
+    workdir = Path(args.workdir)
+    os.chdir(workdir)
+    service = _make_service(args.aw_url, args.server_url, workdir)
+    ingest_url = None if args.real_server else args.server_url
+    meter = Meter(service, args.aw_url, ingest_url)
+    result = {"scenario": args.child}
+
+    if args.child != "catch_up":
+        # Прогрев: история уже синхронизирована и не входит в замер
+        _sync_until_drained(service)
+
+    if args.child == "catch_up":
+        meter.start()
+        result["cycles"] = _sync_until_drained(service)
+        result.update(meter.stop())
+
+    elif args.child == "steady":
+        meter.start()
+        for _ in range(args.cycles):
+            time.sleep(args.cycle_interval)
+            service.sync()
+        result["cycles"] = args.cycles
+        result.update(meter.stop())
+        result["requests_per_cycle"] = round(result["http_requests"] / args.cycles, 1)
+
+    elif args.child == "outage":
+        _request(f"{args.server_url}/_control", {"down": True})
+        for _ in range(args.cycles):
+            time.sleep(args.cycle_interval)
+            service.sync()
+        result["backlog_events"] = service.outbox.size()
+
+        _request(f"{args.server_url}/_control", {"down": False})
+        service.client.invalidate_cache()
+        meter.start()
+        result["cycles"] = _sync_until_drained(service)
+        result.update(meter.stop())
+        result["recovery_seconds"] = result["wall_seconds"]
+
+    service.state.flush()
+    return result
+
+
+def run_scenario(scenario: str, args, aw_url: str, server_url: str) -> Dict:
+    with tempfile.TemporaryDirectory(prefix="aw-bench-") as workdir:
+        command = [
+            sys.executable,
+            str(Path(__file__).resolve()),
+            "--child", scenario,
+            "--aw-url", aw_url,
+            "--server-url", server_url,
+            "--workdir", workdir,
+            "--cycles", str(args.cycles),
+            "--cycle-interval", str(args.cycle_interval),
+        ]
+        if args.server_url:
+            command.append("--real-server")
+        output = subprocess.run(command, capture_output=True, text=True, check=True)
+        return json.loads(output.stdout.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Бенчмарк синхронизации клиента")
+    parser.add_argument("--scenario", choices=SCENARIOS + ("all",), default="all")
+    parser.add_argument("--history", type=int, default=20000, help="Событий истории в bucket")
+    parser.add_argument("--spacing", type=float, default=0.05, help="Интервал между событиями, сек")
+    parser.add_argument("--buckets", type=int, default=4, choices=range(1, 5))
+    parser.add_argument("--cycles", type=int, default=5, help="Циклов в steady/outage")
+    parser.add_argument("--cycle-interval", type=float, default=1.0, help="Пауза между циклами, сек")
+    parser.add_argument("--server-url", help="Реальный сервер приема вместо заглушки")
+    parser.add_argument("--output", help="Файл для результатов в JSON")
+    # Служебные аргументы дочернего процесса
+    parser.add_argument("--child", choices=SCENARIOS, help=argparse.SUPPRESS)
+    parser.add_argument("--aw-url", help=argparse.SUPPRESS)
+    parser.add_argument("--workdir", help=argparse.SUPPRESS)
+    parser.add_argument("--real-server", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        print(json.dumps(run_child(args)))
+        return
+
+    scenarios = SCENARIOS if args.scenario == "all" else (args.scenario,)
+    if args.server_url and "outage" in scenarios:
+        print("Сценарий outage требует заглушку сервера приема, пропускаем")
+        scenarios = tuple(s for s in scenarios if s != "outage")
+
+    processes = []
+    try:
+        aw_port = _free_port()
+        processes.append(
+            subprocess.Popen(
+                [
+                    sys.executable, str(BENCH_DIR / "fake_aw_server.py"),
+                    "--port", str(aw_port),
+                    "--history", str(args.history),
+                    "--spacing", str(args.spacing),
+                    "--buckets", str(args.buckets),
+                ],
+                stdout=subprocess.DEVNULL,
+            )
+        )
+        aw_url = f"http://127.0.0.1:{aw_port}/api/0"
+        _wait_for(f"{aw_url}/info")
+
+        server_url = args.server_url
+        if not server_url:
+            ingest_port = _free_port()
+            processes.append(
+                subprocess.Popen(
+                    [
+                        sys.executable, str(BENCH_DIR / "fake_ingest_server.py"),
+                        "--port", str(ingest_port),
+                    ],
+                    stdout=subprocess.DEVNULL,
+                )
+            )
+            server_url = f"http://127.0.0.1:{ingest_port}"
+            _wait_for(f"{server_url}/_stats")
+
+        results = []
+        for scenario in scenarios:
+            result = run_scenario(scenario, args, aw_url, server_url)
+            results.append(result)
+            print(
+                f"{scenario:>9}: {result['wall_seconds']:.2f} с, "
+                f"{result['events_per_sec'] or 0:.0f} событий/с, "
+                f"aw {result['aw_bytes'] / 1024:.0f} КБ, "
+                f"сервер {result['ingest_bytes'] / 1024:.0f} КБ, "
+                f"{result['http_requests']} запросов, "
+                f"CPU {result['cpu_seconds']:.2f} с, "
+                f"RSS {result['peak_rss_mb'] or 0:.0f} МБ"
+            )
+    finally:
+        for process in processes:
+            process.terminate()
+            process.wait()
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(
+                {
+                    "params": {
+                        "history": args.history,
+                        "spacing": args.spacing,
+                        "buckets": args.buckets,
+                        "cycles": args.cycles,
+                        "cycle_interval": args.cycle_interval,
+                    },
+                    "results": results,
+                },
+                f,
+                indent=2,
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,117 @@
+"""
+Сравнение дневной сводки, посчитанной клиентом, и сводки через aw-server.
+
+Запись фикстуры (нужен запущенный ActivityWatch):
+    python compare_summary.py record fixture.json --hours 24
+
+Сравнение по записанной фикстуре (без ActivityWatch):
+    python compare_summary.py compare fixture.json
+"""
+
+import argparse
+import json
+import sys
+import os
+import time
+from datetime import datetime, timedelta, timezone
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from service import ActivityWatchClient, WINDOW_BUCKET_TYPE
+
+
+def record(client: ActivityWatchClient, fixture: str, hours: int):
+    """Записывает сырые события и результаты запроса за последние часы."""
+    buckets = client.find_sync_buckets()
+    window_bucket = next(
+        (b for b, t in buckets.items() if t == WINDOW_BUCKET_TYPE), None
+    )
+    if not window_bucket:
+        print("Bucket окон не найден")
+        return
+
+    end = datetime.now(timezone.utc).replace(minute=0, second=0, microsecond=0)
+    start = end - timedelta(hours=hours)
+    periods = [
+        (start + timedelta(hours=i), start + timedelta(hours=i + 1))
+        for i in range(hours)
+    ]
+
+    events = client.get_events(window_bucket, start, end, limit=-1)
+    # Без учета AFK, чтобы сводки были сопоставимы со старым способом
+    results = client.query(periods, client.summary_query(window_bucket))
+    if results is None:
+        print("aw-server не выполнил запрос")
+        return
+
+    with open(fixture, "w") as f:
+        json.dump(
+            {
+                "bucket_id": window_bucket,
+                "periods": [[s.isoformat(), e.isoformat()] for s, e in periods],
+                "events": events,
+                "query_results": results,
+            },
+            f,
+        )
+    print(f"Записано {len(events)} событий за {hours} ч в {fixture}")
+
+
+def compare(client: ActivityWatchClient, fixture: str):
+    """Сравнивает сводки старого и нового способа по фикстуре."""
+    with open(fixture) as f:
+        data = json.load(f)
+
+    periods = [
+        (datetime.fromisoformat(s), datetime.fromisoformat(e))
+        for s, e in data["periods"]
+    ]
+    events = data["events"]
+    results = data["query_results"]
+
+    started = time.process_time()
+    old = client.prepare_daily_summary(events)
+    old_cpu = time.process_time() - started
+
+    started = time.process_time()
+    new = client.summarize_query_results(periods, results, len(events))
+    new_cpu = time.process_time() - started
+
+    print(f"Событий: {len(events)}, объединенных записей: {sum(map(len, results))}")
+    print(
+        f"Получено из aw-server: {len(json.dumps(events))} байт -> "
+        f"{len(json.dumps(results))} байт"
+    )
+    print(f"CPU клиента: {old_cpu * 1000:.1f} мс -> {new_cpu * 1000:.1f} мс")
+    print(
+        f"Активное время: {old['total_active_time']:.0f} сек -> "
+        f"{new['total_active_time']:.0f} сек"
+    )
+
+    # flood закрывает короткие разрывы между событиями, поэтому у нового
+    # способа время по приложениям может быть немного больше
+    print("\nПриложение: старый / новый (сек)")
+    apps = set(old["applications"]) | set(new["applications"])
+    for app in sorted(apps, key=lambda a: -old["applications"].get(a, 0)):
+        old_time = old["applications"].get(app, 0)
+        new_time = new["applications"].get(app, 0)
+        print(f"  {app}: {old_time:.0f} / {new_time:.0f} ({new_time - old_time:+.0f})")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Сравнение способов подсчета сводки")
+    parser.add_argument("mode", choices=["record", "compare"])
+    parser.add_argument("fixture", help="Файл фикстуры")
+    parser.add_argument("--hours", type=int, default=24, help="Глубина записи в часах")
+    parser.add_argument("--aw-url", default="http://localhost:5600/api/0")
+    args = parser.parse_args()
+
+    client = ActivityWatchClient(api_url=args.aw_url)
+    if args.mode == "record":
+        record(client, args.fixture, args.hours)
+    else:
+        compare(client, args.fixture)
+
+
+if __name__ == "__main__":
+    main()
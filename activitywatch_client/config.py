@@ -1,5 +1,5 @@
 from datetime import datetime
-from typing import Dict, List, Optional
+from typing import Any, Dict, List, Optional
 from dataclasses import dataclass, field
 from abc import ABC, abstractmethod
 
@@ -24,11 +24,12 @@ class SyncState:
     """Состояние синхронизации"""
 
     last_sync_time: Optional[datetime] = None
-    last_event_hashes: List[str] = field(default_factory=list)
     device_id: str = ""
     first_sync: Optional[datetime] = None
     last_daily_report: Optional[str] = None
     processed_events_count: int = 0
+    bucket_sync_times: Dict[str, datetime] = field(default_factory=dict)
+    open_events: Dict[str, Dict[str, Any]] = field(default_factory=dict)
 
 
 class BaseSyncClient(ABC):
@@ -0,0 +1,261 @@
+import math
+import struct
+import logging
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Iterable, Optional, Tuple
+
+from atomic import atomic_write
+
+logger = logging.getLogger(__name__)
+
+# Ключ события для дедупликации: (время в микросекундах UTC, id события, md5-хэш)
+EventKey = Tuple[int, int, str]
+
+_MAGIC = b"AWDD"
+_VERSION = 1
+# magic, version, m_bits, k, current_count, previous_count,
+# current_min_us, previous_min_us, watermark_us, watermark_id
+_HEADER = struct.Struct("<4sHIIIIqqqq")
+_NONE = -1
+
+
+def to_micros(dt: datetime) -> int:
+    """Переводит datetime в целые микросекунды UTC."""
+    if dt.tzinfo is None:
+        dt = dt.replace(tzinfo=timezone.utc)
+    delta = dt - datetime(1970, 1, 1, tzinfo=timezone.utc)
+    return (delta.days * 86400 + delta.seconds) * 1_000_000 + delta.microseconds
+
+
+class EventDeduplicator:
+    """
+    Дедупликация событий по водяной отметке и скользящему фильтру Блума.
+
+    Событие новее отметки (время, id) считается новым без дополнительных
+    проверок. События не новее отметки проверяются по двум поколениям
+    фильтра Блума; события старше окна, покрытого фильтром, считаются уже
+    отправленными. Проверка выполняется за O(1), а файл состояния имеет
+    постоянный размер.
+
+    Attributes:
+        sidecar_file (Path): Бинарный файл с отметкой и фильтром
+        capacity (int): Количество событий в одном поколении фильтра
+    """
+
+    def __init__(
+        self, sidecar_file: Path, capacity: int = 20000, error_rate: float = 0.001
+    ):
+        """
+        Инициализация дедупликатора.
+
+        Args:
+            sidecar_file: Путь к бинарному файлу состояния
+            capacity: Количество событий в одном поколении фильтра
+            error_rate: Допустимая вероятность ложного срабатывания
+        """
+        self.sidecar_file = sidecar_file
+        self.capacity = capacity
+        self.m_bits = max(
+            8, int(math.ceil(-capacity * math.log(error_rate) / (math.log(2) ** 2)))
+        )
+        self.k = max(1, int(round(self.m_bits / capacity * math.log(2))))
+        self._reset()
+        self._load()
+
+    def _reset(self):
+        """Сбрасывает фильтр и отметку."""
+        size = (self.m_bits + 7) // 8
+        self.current = bytearray(size)
+        self.previous = bytearray(size)
+        self.current_count = 0
+        self.previous_count = 0
+        self.current_min_us = _NONE
+        self.previous_min_us = _NONE
+        self.watermark: Optional[Tuple[int, int]] = None
+        self.dirty = False
+
+    def _load(self):
+        """Загружает отметку и фильтр из файла."""
+        if not self.sidecar_file.exists():
+            return
+
+        try:
+            with open(self.sidecar_file, "rb") as f:
+                header = f.read(_HEADER.size)
+                (
+                    magic,
+                    version,
+                    m_bits,
+                    k,
+                    current_count,
+                    previous_count,
+                    current_min_us,
+                    previous_min_us,
+                    watermark_us,
+                    watermark_id,
+                ) = _HEADER.unpack(header)
+                if magic != _MAGIC or version != _VERSION:
+                    logger.warning("Неизвестный формат файла дедупликации, сбрасываем")
+                    return
+
+                size = (m_bits + 7) // 8
+                current = f.read(size)
+                previous = f.read(size)
+                if len(current) != size or len(previous) != size:
+                    logger.warning("Файл дедупликации поврежден, сбрасываем")
+                    return
+        except (IOError, struct.error) as e:
+            logger.error(f"Ошибка загрузки файла дедупликации: {e}")
+            return
+
+        if watermark_us != _NONE:
+            self.watermark = (watermark_us, watermark_id)
+
+        if m_bits != self.m_bits or k != self.k:
+            # Параметры фильтра изменились: сохраняем только отметку
+            logger.info("Параметры фильтра изменились, фильтр пересоздан")
+            self.current_min_us = watermark_us
+            return
+
+        self.current = bytearray(current)
+        self.previous = bytearray(previous)
+        self.current_count = current_count
+        self.previous_count = previous_count
+        self.current_min_us = current_min_us
+        self.previous_min_us = previous_min_us
+
+    def save(self, fsync: bool = False) -> bool:
+        """
+        Атомарно сохраняет отметку и фильтр в файл.
+
+        Args:
+            fsync: Сбрасывать ли данные на диск
+
+        Returns:
+            bool: True если сохранение успешно, иначе False
+        """
+        watermark_us, watermark_id = self.watermark or (_NONE, 0)
+        header = _HEADER.pack(
+            _MAGIC,
+            _VERSION,
+            self.m_bits,
+            self.k,
+            self.current_count,
+            self.previous_count,
+            self.current_min_us,
+            self.previous_min_us,
+            watermark_us,
+            watermark_id,
+        )
+        try:
+            atomic_write(
+                self.sidecar_file, header + self.current + self.previous, fsync=fsync
+            )
+            self.dirty = False
+            return True
+        except OSError as e:
+            logger.error(f"Ошибка сохранения файла дедупликации: {e}")
+            return False
+
+    def _positions(self, event_hash: str):
+        """Позиции битов для хэша события (двойное хэширование)."""
+        value = int(event_hash, 16)
+        h1 = value >> 64
+        h2 = (value & 0xFFFFFFFFFFFFFFFF) | 1
+        m = self.m_bits
+        return [(h1 + i * h2) % m for i in range(self.k)]
+
+    @staticmethod
+    def _contains(bits: bytearray, positions) -> bool:
+        for pos in positions:
+            if not bits[pos >> 3] & (1 << (pos & 7)):
+                return False
+        return True
+
+    @property
+    def horizon_us(self) -> int:
+        """Самое раннее время, покрытое фильтром."""
+        bounds = [
+            value
+            for value in (self.current_min_us, self.previous_min_us)
+            if value != _NONE
+        ]
+        return min(bounds) if bounds else _NONE
+
+    def is_new(self, key: EventKey) -> bool:
+        """
+        Проверяет, является ли событие новым.
+
+        Args:
+            key: Ключ события (время, id, хэш)
+
+        Returns:
+            bool: True если событие еще не отправлялось
+        """
+        ts_us, event_id, event_hash = key
+        if self.watermark is None or (ts_us, event_id) > self.watermark:
+            return True
+
+        horizon = self.horizon_us
+        if horizon == _NONE or ts_us < horizon:
+            return False
+
+        positions = self._positions(event_hash)
+        return not (
+            self._contains(self.current, positions)
+            or self._contains(self.previous, positions)
+        )
+
+    def add(self, keys: Iterable[EventKey]):
+        """
+        Отмечает события как отправленные и сдвигает отметку.
+
+        Args:
+            keys: Ключи событий
+        """
+        for ts_us, event_id, event_hash in keys:
+            if self.current_count >= self.capacity:
+                self._rotate()
+
+            for pos in self._positions(event_hash):
+                self.current[pos >> 3] |= 1 << (pos & 7)
+            self.current_count += 1
+            if self.current_min_us == _NONE or ts_us < self.current_min_us:
+                self.current_min_us = ts_us
+
+            if self.watermark is None or (ts_us, event_id) > self.watermark:
+                self.watermark = (ts_us, event_id)
+            self.dirty = True
+
+    def move_watermark(self, watermark: Tuple[int, int]):
+        """
+        Переносит отметку на заданную позицию (время, id).
+
+        При переносе назад фильтр очищается: в нем отмечены события после
+        новой отметки, которые теперь нужно отправить повторно, а удалить
+        отдельные ключи из фильтра Блума нельзя. Без фильтра события не
+        новее отметки считаются отправленными, события новее - новыми.
+
+        Args:
+            watermark: Новая отметка (время в микросекундах, id события)
+        """
+        if self.watermark is not None and watermark < self.watermark:
+            size = len(self.current)
+            self.current = bytearray(size)
+            self.previous = bytearray(size)
+            self.current_count = 0
+            self.previous_count = 0
+            self.current_min_us = _NONE
+            self.previous_min_us = _NONE
+        self.watermark = watermark
+        self.dirty = True
+
+    def _rotate(self):
+        """Переводит текущее поколение фильтра в предыдущее."""
+        self.previous = self.current
+        self.previous_count = self.current_count
+        self.previous_min_us = self.current_min_us
+        self.current = bytearray(len(self.previous))
+        self.current_count = 0
+        self.current_min_us = _NONE
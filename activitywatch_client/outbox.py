@@ -0,0 +1,233 @@
+import json
+import sqlite3
+import threading
+import time
+import logging
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple, Any
+
+logger = logging.getLogger(__name__)
+
+
+class EventOutbox:
+    """
+    Локальная очередь (outbox) событий на SQLite.
+
+    События, полученные из ActivityWatch, сначала записываются в очередь,
+    а затем отправляются на сервер в порядке добавления. Запись удаляется
+    только после подтверждения сервером, поэтому простой сервера любой
+    длительности не приводит к потере данных и повторной выборке из
+    ActivityWatch.
+
+    Очередь разделена на партиции по bucket; партиции можно отправлять
+    из разных потоков, доступ к соединению защищен блокировкой.
+
+    Attributes:
+        db_file (Path): Путь к файлу базы очереди
+    """
+
+    def __init__(self, db_file: Path):
+        """
+        Инициализация очереди.
+
+        Args:
+            db_file: Путь к файлу SQLite
+        """
+        self.db_file = db_file
+        self.conn = sqlite3.connect(
+            str(db_file), isolation_level=None, check_same_thread=False
+        )
+        self.lock = threading.Lock()
+        self._init_schema()
+
+    def _init_schema(self):
+        """Создает таблицу очереди и настраивает SQLite."""
+        # auto_vacuum нужно выставить до создания первой таблицы
+        self.conn.execute("PRAGMA auto_vacuum = INCREMENTAL")
+        self.conn.execute("PRAGMA journal_mode = WAL")
+        self.conn.execute("PRAGMA synchronous = NORMAL")
+        self.conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS outbox (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                bucket_id TEXT NOT NULL DEFAULT '',
+                event_timestamp TEXT,
+                payload TEXT NOT NULL,
+                enqueued_at REAL NOT NULL
+            )
+            """
+        )
+        columns = {row[1] for row in self.conn.execute("PRAGMA table_info(outbox)")}
+        if "bucket_id" not in columns:
+            # Очередь, созданная до разделения по bucket
+            self.conn.execute(
+                "ALTER TABLE outbox ADD COLUMN bucket_id TEXT NOT NULL DEFAULT ''"
+            )
+        self.conn.execute(
+            "CREATE INDEX IF NOT EXISTS ix_outbox_bucket ON outbox (bucket_id, id)"
+        )
+
+    def append(self, events: List[Dict], bucket_id: str = "") -> int:
+        """
+        Добавляет события в конец партиции одной транзакцией.
+
+        Args:
+            events: Список событий ActivityWatch
+            bucket_id: Идентификатор bucket (партиция очереди)
+
+        Returns:
+            int: Количество добавленных событий
+        """
+        if not events:
+            return 0
+
+        now = time.time()
+        rows = [
+            (bucket_id, event.get("timestamp"), json.dumps(event, default=str), now)
+            for event in events
+        ]
+        with self.lock, self.conn:
+            self.conn.execute("BEGIN")
+            self.conn.executemany(
+                "INSERT INTO outbox (bucket_id, event_timestamp, payload, enqueued_at) "
+                "VALUES (?, ?, ?, ?)",
+                rows,
+            )
+        return len(rows)
+
+    def peek(self, bucket_id: str = "", limit: int = 5000) -> List[Tuple[int, Dict]]:
+        """
+        Возвращает самые старые неотправленные события партиции.
+
+        Args:
+            bucket_id: Идентификатор bucket
+            limit: Максимальное количество событий
+
+        Returns:
+            List[Tuple[int, Dict]]: Пары (id записи, событие) в порядке добавления
+        """
+        with self.lock:
+            rows = self.conn.execute(
+                "SELECT id, payload FROM outbox WHERE bucket_id = ? ORDER BY id LIMIT ?",
+                (bucket_id, limit),
+            ).fetchall()
+        return [(row_id, json.loads(payload)) for row_id, payload in rows]
+
+    def ack(self, last_id: int, bucket_id: str = "") -> int:
+        """
+        Подтверждает отправку записей партиции до last_id включительно.
+
+        Args:
+            last_id: Идентификатор последней подтвержденной записи
+            bucket_id: Идентификатор bucket
+
+        Returns:
+            int: Количество удаленных записей
+        """
+        with self.lock, self.conn:
+            self.conn.execute("BEGIN")
+            cursor = self.conn.execute(
+                "DELETE FROM outbox WHERE bucket_id = ? AND id <= ?",
+                (bucket_id, last_id),
+            )
+        return cursor.rowcount
+
+    def compact(self):
+        """Возвращает освободившиеся страницы файла очереди."""
+        with self.lock:
+            self.conn.execute("PRAGMA incremental_vacuum")
+            self.conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+
+    def drain(
+        self, send, bucket_id: str = "", chunk_size: int = 5000
+    ) -> Tuple[bool, List[Dict]]:
+        """
+        Отправляет партицию очереди пачками в порядке добавления.
+
+        Args:
+            send: Функция отправки пачки событий, возвращающая bool
+            bucket_id: Идентификатор bucket
+            chunk_size: Размер пачки
+
+        Returns:
+            Tuple[bool, List[Dict]]: Признак полной отправки и отправленные события
+        """
+        sent_events = []
+        while True:
+            batch = self.peek(bucket_id, chunk_size)
+            if not batch:
+                break
+
+            events = [event for _, event in batch]
+            if not send(events):
+                logger.error(
+                    f"Ошибка отправки пачки из очереди {bucket_id} "
+                    f"({len(events)} событий), в очереди осталось {self.size(bucket_id)}"
+                )
+                return False, sent_events
+
+            self.ack(batch[-1][0], bucket_id)
+            sent_events.extend(events)
+
+        return True, sent_events
+
+    def partitions(self) -> List[str]:
+        """Список bucket, у которых есть неотправленные события."""
+        with self.lock:
+            rows = self.conn.execute("SELECT DISTINCT bucket_id FROM outbox").fetchall()
+        return [row[0] for row in rows]
+
+    def size(self, bucket_id: Optional[str] = None) -> int:
+        """
+        Количество неотправленных событий.
+
+        Args:
+            bucket_id: Идентификатор bucket (None - вся очередь)
+        """
+        with self.lock:
+            if bucket_id is None:
+                row = self.conn.execute("SELECT COUNT(*) FROM outbox").fetchone()
+            else:
+                row = self.conn.execute(
+                    "SELECT COUNT(*) FROM outbox WHERE bucket_id = ?", (bucket_id,)
+                ).fetchone()
+        return row[0]
+
+    def oldest_age_seconds(self) -> Optional[float]:
+        """
+        Возраст самого старого неотправленного события.
+
+        Returns:
+            Optional[float]: Секунды с момента постановки в очередь или None
+        """
+        with self.lock:
+            row = self.conn.execute("SELECT MIN(enqueued_at) FROM outbox").fetchone()
+        if row[0] is None:
+            return None
+        return max(0.0, time.time() - row[0])
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        Статистика очереди для статуса клиента.
+
+        Returns:
+            Dict: Размер очереди по партициям, возраст старейшей записи и размер файла
+        """
+        with self.lock:
+            page_count = self.conn.execute("PRAGMA page_count").fetchone()[0]
+            page_size = self.conn.execute("PRAGMA page_size").fetchone()[0]
+            by_bucket = dict(
+                self.conn.execute(
+                    "SELECT bucket_id, COUNT(*) FROM outbox GROUP BY bucket_id"
+                ).fetchall()
+            )
+        return {
+            "pending_events": sum(by_bucket.values()),
+            "pending_by_bucket": by_bucket,
+            "oldest_unsent_age_seconds": self.oldest_age_seconds(),
+            "file_bytes": page_count * page_size,
+        }
+
+    def close(self):
+        """Закрывает соединение с базой очереди."""
+        self.conn.close()
@@ -2,7 +2,6 @@
 import sys
 import os
 import logging
-import time
 import atexit
 from pathlib import Path
 
@@ -85,25 +84,11 @@ def main():
         logger.info("✅ Все компоненты инициализированы")
         logger.info(f"Device ID: {client.device_info.device_id}")
         
-        # Непрерывная синхронизация (более надежная версия)
-        sync_interval = 60  # минут
-        logger.info(f"Запуск непрерывной синхронизации (интервал {sync_interval} секунд)...")
-        
-        while True:
-            try:
-                success = sync_service.sync()
-                if not success:
-                    logger.warning("Синхронизация завершилась с ошибкой")
-                
-                logger.info(f"Ожидание {sync_interval} секунд до следующей синхронизации")
-                time.sleep(sync_interval)
-                
-            except KeyboardInterrupt:
-                logger.info("Остановлено пользователем")
-                break
-            except Exception as e:
-                logger.error(f"Ошибка в цикле синхронизации: {e}", exc_info=True)
-                time.sleep(60)  # Ждем минуту перед повторной попыткой
+        # Непрерывная синхронизация: интервал подстраивается под активность,
+        # после ошибок растет экспоненциально
+        sync_interval = 60  # секунд
+        logger.info(f"Запуск непрерывной синхронизации (базовый интервал {sync_interval} секунд)...")
+        sync_service.continuous_sync(sync_interval / 60)
         
         return 0
         
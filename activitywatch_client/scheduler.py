@@ -0,0 +1,111 @@
+import random
+import zlib
+import logging
+from typing import Optional
+
+logger = logging.getLogger(__name__)
+
+
+class AdaptiveScheduler:
+    """
+    Планировщик интервала между циклами синхронизации.
+
+    Интервал подстраивается под наблюдаемый поток событий: пока
+    пользователь активен, интервал подбирается так, чтобы за цикл
+    набиралась пачка примерно target_batch событий; в простое интервал
+    растет до max_interval. После ошибок интервал растет экспоненциально
+    до max_backoff. К каждому интервалу добавляется случайный разброс, а
+    генератор инициализируется идентификатором устройства, чтобы
+    устройства парка не просыпались синхронно.
+
+    Attributes:
+        base_interval (float): Базовый интервал, секунды
+        min_interval (float): Минимальный интервал, секунды
+        max_interval (float): Максимальный интервал в простое, секунды
+        max_backoff (float): Максимальная пауза после ошибок, секунды
+        jitter (float): Доля случайного разброса интервала
+        target_batch (int): Желаемое количество событий за цикл
+    """
+
+    def __init__(
+        self,
+        base_interval: float = 60,
+        min_interval: Optional[float] = None,
+        max_interval: Optional[float] = None,
+        max_backoff: float = 900,
+        jitter: float = 0.2,
+        target_batch: int = 50,
+        seed: str = "",
+    ):
+        """
+        Инициализация планировщика.
+
+        Args:
+            base_interval: Базовый интервал, секунды
+            min_interval: Минимальный интервал (по умолчанию base_interval / 4)
+            max_interval: Максимальный интервал в простое (по умолчанию base_interval * 5)
+            max_backoff: Максимальная пауза после ошибок, секунды
+            jitter: Доля случайного разброса интервала
+            target_batch: Желаемое количество событий за цикл
+            seed: Строка для инициализации генератора (идентификатор устройства)
+        """
+        self.base_interval = base_interval
+        self.min_interval = min_interval or base_interval / 4
+        self.max_interval = max_interval or base_interval * 5
+        self.max_backoff = max(max_backoff, self.max_interval)
+        self.jitter = jitter
+        self.target_batch = target_batch
+
+        self.random = random.Random(zlib.crc32(seed.encode()) if seed else None)
+        self.interval = float(base_interval)
+        self.event_rate: Optional[float] = None
+        self.failures = 0
+
+    def startup_delay(self) -> float:
+        """
+        Случайная задержка перед первым циклом.
+
+        Устройства, запущенные одновременно (после перезагрузки или
+        обновления), равномерно распределяются по базовому интервалу.
+
+        Returns:
+            float: Задержка, секунды
+        """
+        return self.random.uniform(0, self.base_interval)
+
+    def next_delay(self, success: bool, events: int, elapsed: float) -> float:
+        """
+        Вычисляет паузу до следующего цикла.
+
+        Args:
+            success: Успешен ли завершившийся цикл
+            events: Количество новых событий за цикл
+            elapsed: Время с начала предыдущего цикла, секунды
+
+        Returns:
+            float: Пауза, секунды
+        """
+        if not success:
+            self.failures += 1
+            # Экспоненциальная задержка с полным разбросом
+            ceiling = min(self.max_backoff, self.interval * 2 ** self.failures)
+            return self.random.uniform(self.interval, max(self.interval, ceiling))
+
+        self.failures = 0
+
+        if elapsed > 0:
+            rate = events / elapsed
+            self.event_rate = (
+                rate if self.event_rate is None else 0.5 * self.event_rate + 0.5 * rate
+            )
+
+        if events and self.event_rate:
+            # Пользователь активен: интервал под желаемый размер пачки
+            interval = self.target_batch / self.event_rate
+        else:
+            # Простой: интервал постепенно растет
+            interval = self.interval * 1.5
+
+        self.interval = min(self.max_interval, max(self.min_interval, interval))
+        spread = self.interval * self.jitter
+        return self.interval + self.random.uniform(-spread, spread)
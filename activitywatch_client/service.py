@@ -6,6 +6,9 @@ sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
 import platform
 import socket
 import hashlib
+import json
+import threading
+import time
 from datetime import datetime, timedelta, timezone
 from typing import Dict, List, Optional, Tuple, Any
 from dataclasses import asdict
@@ -15,6 +18,7 @@ import logging
 
 
 from config import DeviceInfo
+from dedupe import EventDeduplicator, EventKey, to_micros
 from security import SecurityToken
 
 logging.basicConfig(
@@ -27,6 +31,15 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+# Типы buckets, которые синхронизируются с сервером
+WINDOW_BUCKET_TYPE = "currentwindow"
+SYNC_BUCKET_TYPES = (
+    WINDOW_BUCKET_TYPE,
+    "afkstatus",
+    "web.tab.current",
+    "app.editor.activity",
+)
+
 
 class ActivityWatchClient:
     """
@@ -43,6 +56,13 @@ class ActivityWatchClient:
         server_url (str): URL целевого сервера
         device_info (DeviceInfo): Информация об устройстве
         state_file (Path): Путь к файлу состояния
+        outbox_file (Path): Путь к файлу очереди неотправленных событий
+        connection_ttl (float): Время кэширования успешной проверки соединения, секунды
+        buckets_ttl (float): Время кэширования списка buckets, секунды
+        request_count (int): Количество выполненных HTTP-запросов
+        protocol_version (int): Версия протокола синхронизации с сервером
+        sync_session_id (Optional[int]): Открытая сессия протокола v2
+        server_watermarks (Dict): Bucket -> последняя зафиксированная сервером отметка
     """
 
     def __init__(
@@ -66,33 +86,241 @@ class ActivityWatchClient:
         # Файл состояния синхронизации
         self.state_file = Path.home() / ".activitywatch_sync_state.json"
 
+        # Локальная очередь событий, ожидающих отправки на сервер
+        self.outbox_file = Path.home() / ".activitywatch_sync_outbox.sqlite"
+
         # Сессия HTTP для повторного использования соединений
         self.session = requests.Session()
         self.session.timeout = 10
+        self.session.hooks["response"].append(self._count_request)
+        self.request_count = 0
+
+        # Кэш проверок соединения и списка buckets: ключ -> (истекает, значение)
+        self.connection_ttl = 60.0
+        self.buckets_ttl = 300.0
+        self._cache: Dict[str, Tuple[float, Any]] = {}
+        self._cache_lock = threading.Lock()
+
+        # Протокол v2: сессия открывается рукопожатием, загрузки несут только
+        # id сессии и события; при отсутствии /tracker/handshake - протокол v1
+        self.protocol_version = 2
+        self.sync_session_id: Optional[int] = None
+        self.server_watermarks: Dict[str, Dict[str, Any]] = {}
+        self._device_id: Optional[str] = None
+        self._device_token: Optional[str] = None
 
         logger.info(
             f"Инициализирован клиент для устройства: {self.device_info.device_name}"
         )
 
+    def get_device_id(self) -> Optional[str]:
+        """
+        Идентификатор устройства из конфигурации регистрации.
+
+        Конфигурация читается с диска один раз; вместе с device_id
+        запоминается токен устройства для заголовка Authorization.
+
+        Returns:
+            Optional[str]: device_id или None, если устройство не зарегистрировано
+        """
+        if self._device_id is None:
+            config = SecurityToken().load_config()
+            self._device_id = config.get("device_id") or None
+            self._device_token = config.get("token") or None
+            if not self._device_id:
+                logger.error(
+                    "device_id не найден в конфиге! Запустите регистрацию: python client.py"
+                )
+        return self._device_id
+
+    def _auth_headers(self) -> Dict[str, str]:
+        """Заголовок Authorization с токеном устройства из конфигурации"""
+        self.get_device_id()
+        if not self._device_token:
+            return {}
+        return {"Authorization": f"Bearer {self._device_token}"}
+
+    def handshake(
+        self, bucket_ids: List[str]
+    ) -> Optional[Dict[str, Tuple[datetime, Optional[str]]]]:
+        """
+        Открывает сессию синхронизации протокола v2.
+
+        Сведения об устройстве передаются только здесь, один раз за сессию.
+
+        Args:
+            bucket_ids: Синхронизируемые buckets
+
+        Returns:
+            Optional[Dict]: Bucket -> (время, id) последнего сохраненного
+            сервером события или None, если сессию открыть не удалось
+        """
+        device_id = self.get_device_id()
+        if not device_id:
+            return None
+
+        payload = {
+            "protocol": 2,
+            "device_id": device_id,
+            "device_info": asdict(self.device_info),
+            "buckets": bucket_ids,
+        }
+        try:
+            response = self.session.post(
+                f"{self.server_url}/tracker/handshake",
+                json=payload,
+                headers=self._auth_headers(),
+                timeout=15,
+            )
+        except requests.RequestException as e:
+            logger.error(f"Ошибка подключения при открытии сессии: {e}")
+            self.invalidate_cache("server")
+            return None
+
+        if self._endpoint_missing(response):
+            logger.warning("Сервер не поддерживает протокол v2, используется v1")
+            self.protocol_version = 1
+            return None
+        if response.status_code != 200:
+            logger.error(
+                f"Ошибка открытия сессии: {response.status_code} - {response.text}"
+            )
+            return None
+
+        try:
+            data = response.json()
+            watermarks = {
+                bucket_id: (
+                    self._parse_timestamp(watermark["timestamp"]),
+                    watermark.get("event_id"),
+                )
+                for bucket_id, watermark in (data.get("watermarks") or {}).items()
+                if watermark
+            }
+            self.sync_session_id = int(data["session_id"])
+        except (KeyError, TypeError, ValueError) as e:
+            logger.error(f"Некорректный ответ при открытии сессии: {e}")
+            return None
+
+        self.server_watermarks = dict(data.get("watermarks") or {})
+        logger.info(f"Открыта сессия синхронизации {self.sync_session_id}")
+        return watermarks
+
+    @staticmethod
+    def _endpoint_missing(response: requests.Response) -> bool:
+        """
+        Отсутствует ли вызванный адрес на сервере (сервер протокола v1).
+
+        405 - адрес есть, но без POST. 404 считается отсутствием адреса,
+        только если в нем нет detail обработчика: неизвестный путь FastAPI
+        отвечает стандартным {"detail": "Not Found"}, а ошибки самого
+        обработчика несут свой detail.
+        """
+        if response.status_code == 405:
+            return True
+        if response.status_code != 404:
+            return False
+        try:
+            detail = response.json().get("detail")
+        except (ValueError, AttributeError):
+            return True
+        return detail in (None, "Not Found")
+
     def get_earliest_event_time(self, bucket_id: str) -> Optional[datetime]:
         """
-        Надёжное получение времени самого раннего события в bucket.
-        Запрашивает до 50 000 событий за последние 5 лет и находит минимальную дату.
+        Получение времени самого раннего события в bucket.
+
+        Сортировка выполняется движком запросов aw-server, клиент получает
+        одно событие вместо всей истории bucket.
         """
-        five_years_ago = datetime.now(timezone.utc) - timedelta(days=5*365)
-        events = self.get_events(bucket_id, start_time=five_years_ago, limit=50000)
-        if not events:
-            # Если за 5 лет событий нет, пробуем вообще без временного ограничения
-            events = self.get_events(bucket_id, limit=50000)
+        now = datetime.now(timezone.utc)
+        five_years_ago = now - timedelta(days=5 * 365)
+        result = self.query(
+            [(five_years_ago, now)],
+            [
+                f"events = query_bucket({json.dumps(bucket_id)});",
+                "RETURN = limit_events(sort_by_timestamp(events), 1);",
+            ],
+        )
+        if result is None:
+            # Старый aw-server без /query: ищем минимум среди событий
+            events = self.get_events(bucket_id, start_time=five_years_ago, limit=50000)
+            events = sorted(events, key=lambda e: self._parse_timestamp(e["timestamp"]))
+        else:
+            events = result[0]
+
         if events:
-            # Сортируем на случай, если API вернуло в неправильном порядке
-            sorted_events = sorted(events, key=lambda e: self._parse_timestamp(e["timestamp"]))
-            earliest = self._parse_timestamp(sorted_events[0]["timestamp"])
+            earliest = self._parse_timestamp(events[0]["timestamp"])
             logger.info(f"✅ Самое раннее событие в {bucket_id}: {earliest}")
             return earliest
         logger.info(f"ℹ️ В bucket {bucket_id} нет событий")
         return None
 
+    def query(
+        self, timeperiods: List[Tuple[datetime, datetime]], query: List[str]
+    ) -> Optional[List[Any]]:
+        """
+        Выполняет запрос на языке запросов aw-server (/api/0/query).
+
+        Args:
+            timeperiods: Периоды (начало, конец), запрос выполняется для каждого
+            query: Строки запроса, результат задается через RETURN
+
+        Returns:
+            Optional[List]: Результаты в порядке периодов или None при ошибке
+        """
+        payload = {
+            "timeperiods": [
+                f"{self._ensure_utc(start).isoformat()}/{self._ensure_utc(end).isoformat()}"
+                for start, end in timeperiods
+            ],
+            "query": query,
+        }
+
+        try:
+            response = self.session.post(f"{self.api_url}/query/", json=payload, timeout=60)
+            if response.status_code == 200:
+                return response.json()
+            logger.warning(
+                f"Ошибка запроса к aw-server: {response.status_code} - {response.text}"
+            )
+        except (requests.RequestException, ValueError) as e:
+            logger.error(f"Ошибка выполнения запроса к aw-server: {e}")
+        return None
+
+    def _count_request(self, response, *args, **kwargs):
+        """Хук сессии: считает выполненные HTTP-запросы."""
+        with self._cache_lock:
+            self.request_count += 1
+        return response
+
+    def _get_cached(self, key: str) -> Any:
+        """Возвращает значение из кэша или None, если оно устарело."""
+        with self._cache_lock:
+            entry = self._cache.get(key)
+        if entry and entry[0] > time.monotonic():
+            return entry[1]
+        return None
+
+    def _set_cached(self, key: str, value: Any, ttl: float):
+        """Кладет значение в кэш на ttl секунд."""
+        with self._cache_lock:
+            self._cache[key] = (time.monotonic() + ttl, value)
+
+    def invalidate_cache(self, *keys: str):
+        """
+        Сбрасывает кэш проверок соединения и списка buckets.
+
+        Args:
+            keys: Ключи для сброса (по умолчанию - все)
+        """
+        with self._cache_lock:
+            if keys:
+                for key in keys:
+                    self._cache.pop(key, None)
+            else:
+                self._cache.clear()
+
     def _parse_timestamp(self, ts_str: str) -> datetime:
         if "Z" in ts_str:
             dt = datetime.fromisoformat(ts_str.replace("Z", "+00:00"))
@@ -125,13 +353,19 @@ class ActivityWatchClient:
         """
         Проверяет подключение к ActivityWatch.
 
+        Успешный результат кэшируется на connection_ttl секунд.
+
         Returns:
             bool: True если подключение успешно, иначе False
         """
+        if self._get_cached("activitywatch"):
+            return True
+
         try:
             response = self.session.get(f"{self.api_url}/info", timeout=3)
             if response.status_code == 200:
                 logger.info("Подключение к ActivityWatch успешно")
+                self._set_cached("activitywatch", True, self.connection_ttl)
                 return True
         except requests.RequestException as e:
             logger.error(f"Ошибка подключения к ActivityWatch: {e}")
@@ -141,13 +375,19 @@ class ActivityWatchClient:
         """
         Проверяет подключение к целевому серверу.
 
+        Успешный результат кэшируется на connection_ttl секунд.
+
         Returns:
             bool: True если подключение успешно, иначе False
         """
+        if self._get_cached("server"):
+            return True
+
         try:
             response = self.session.get(f"{self.server_url}", timeout=3)
             if response.status_code == 200:
                 logger.info("Подключение к серверу успешно")
+                self._set_cached("server", True, self.connection_ttl)
                 return True
         except requests.RequestException as e:
             logger.error(f"Ошибка подключения к серверу: {e}")
@@ -186,6 +426,29 @@ class ActivityWatchClient:
         # Если не нашли, возвращаем первый доступный
         return list(buckets.keys())[0] if buckets else None
 
+    def find_sync_buckets(self) -> Dict[str, str]:
+        """
+        Находит все buckets, данные которых синхронизируются с сервером.
+
+        Непустой результат кэшируется на buckets_ttl секунд.
+
+        Returns:
+            Dict[str, str]: Идентификатор bucket -> тип bucket
+        """
+        cached = self._get_cached("buckets")
+        if cached:
+            return dict(cached)
+
+        buckets = self.get_buckets()
+        sync_buckets = {
+            bucket_id: info.get("type", "")
+            for bucket_id, info in buckets.items()
+            if info.get("type") in SYNC_BUCKET_TYPES
+        }
+        if sync_buckets:
+            self._set_cached("buckets", sync_buckets, self.buckets_ttl)
+        return dict(sync_buckets)
+
     def get_events(
         self,
         bucket_id: str,
@@ -226,6 +489,11 @@ class ActivityWatchClient:
 
             if response.status_code == 200:
                 return response.json()
+            elif response.status_code == 404:
+                # bucket удален: список buckets нужно перечитать
+                logger.warning(f"Bucket {bucket_id} не найден")
+                self.invalidate_cache("buckets")
+                return []
             elif response.status_code == 500:
                 logger.warning(
                     f"ActivityWatch вернул 500 для периода "
@@ -237,18 +505,30 @@ class ActivityWatchClient:
                 return []
         except requests.RequestException as e:
             logger.error(f"Ошибка запроса событий: {e}")
+            self.invalidate_cache("activitywatch")
             return []
 
     def get_events_safe(
-        self, bucket_id: str, target_start: datetime, max_hours_back: int = 24
+        self,
+        bucket_id: str,
+        target_start: datetime,
+        max_hours_back: int = 24,
+        search_fallback: bool = True,
+        limit: int = -1,
     ) -> Tuple[List[Dict], datetime]:
         """
         Безопасное получение событий с обработкой случаев отсутствия данных.
 
+        По умолчанию события запрашиваются без лимита (limit=-1): курсор
+        синхронизации после выборки переносится на текущее время, и все,
+        что не вошло бы в лимит, было бы потеряно.
+
         Args:
             bucket_id: Идентификатор bucket
             target_start: Целевое время начала
             max_hours_back: Максимальный период назад в часах
+            search_fallback: Искать ли ближайшие данные, если за период их нет
+            limit: Максимальное количество событий (-1 - без лимита)
 
         Returns:
             Tuple[List[Dict], datetime]: События и фактическое время начала
@@ -263,15 +543,18 @@ class ActivityWatchClient:
         time_diff_hours = (current_time - target_start).total_seconds() / 3600
 
         if time_diff_hours > max_hours_back:
+            clamped_start = current_time - timedelta(hours=max_hours_back)
             logger.warning(
-                f"Запрос слишком старого времени ({time_diff_hours:.1f} часов), ограничиваю {max_hours_back} часами"
+                f"Запрос слишком старого времени ({time_diff_hours:.1f} часов), ограничиваю "
+                f"{max_hours_back} часами: события {bucket_id} с {target_start.isoformat()} "
+                f"по {clamped_start.isoformat()} не будут получены"
             )
-            target_start = current_time - timedelta(hours=max_hours_back)
+            target_start = clamped_start
 
         # Пробуем получить данные
-        events = self.get_events(bucket_id, target_start, current_time)
+        events = self.get_events(bucket_id, target_start, current_time, limit=limit)
 
-        if events:
+        if events or not search_fallback:
             return events, target_start
 
         # Если данных нет, пробуем найти ближайшие доступные
@@ -293,7 +576,7 @@ class ActivityWatchClient:
             logger.info(
                 f"Пробую стратегию: {strategy_name} (с {new_start.strftime('%H:%M')})"
             )
-            events = self.get_events(bucket_id, new_start, current_time)
+            events = self.get_events(bucket_id, new_start, current_time, limit=limit)
 
             if events:
                 logger.info(f"Данные найдены по стратегии: {strategy_name}")
@@ -335,67 +618,58 @@ class ActivityWatchClient:
         )
         return hashlib.md5(event_str.encode()).hexdigest()
 
+    def event_key(self, event: Dict) -> Optional[EventKey]:
+        """
+        Вычисляет ключ дедупликации события.
+
+        Args:
+            event: Событие
+
+        Returns:
+            Optional[EventKey]: Ключ (время, id, хэш) или None при ошибке разбора
+        """
+        event_time = event.get("timestamp")
+        if not event_time:
+            return None
+
+        try:
+            ts_us = to_micros(self._parse_timestamp(event_time))
+        except ValueError as e:
+            logger.warning(f"Ошибка парсинга времени события: {e}")
+            return None
+
+        try:
+            event_id = int(event.get("id") or 0)
+        except (TypeError, ValueError):
+            event_id = 0
+
+        return ts_us, event_id, self.calculate_event_hash(event)
+
     def filter_new_events(
-        self,
-        events: List[Dict],
-        last_sync_time: Optional[datetime],
-        known_hashes: List[str],
-    ) -> Tuple[List[Dict], List[str]]:
+        self, events: List[Dict], dedupe: EventDeduplicator
+    ) -> Tuple[List[Dict], List[EventKey]]:
         """
         Фильтрует только новые события.
 
         Args:
             events: Список всех событий
-            last_sync_time: Время последней синхронизации
-            known_hashes: Известные хэши событий
+            dedupe: Дедупликатор с отметкой уже обработанных событий
 
         Returns:
-            Tuple[List[Dict], List[str]]: Новые события и их хэши
+            Tuple[List[Dict], List[EventKey]]: Новые события и их ключи
         """
         new_events = []
-        new_hashes = []
-
-        if not last_sync_time:
-            # Первая синхронизация - все события новые
-            for event in events:
-                event_hash = self.calculate_event_hash(event)
-                new_events.append(event)
-                new_hashes.append(event_hash)
-            return new_events, new_hashes
-
-        # Убедимся, что last_sync_time в UTC
-        last_sync_time = self._ensure_utc(last_sync_time)
+        new_keys = []
 
         for event in events:
-            # Проверка по времени
-            event_time = event.get("timestamp")
-            if event_time:
-                try:
-                    # Парсим время события (ActivityWatch отдает в UTC)
-                    if "Z" in event_time:
-                        event_dt = datetime.fromisoformat(
-                            event_time.replace("Z", "+00:00")
-                        ).replace(tzinfo=timezone.utc)
-                    else:
-                        event_dt = datetime.fromisoformat(event_time)
-                        if event_dt.tzinfo is None:
-                            event_dt = event_dt.replace(tzinfo=timezone.utc)
-
-                    if event_dt <= last_sync_time:
-                        continue
-                except ValueError as e:
-                    logger.warning(f"Ошибка парсинга времени события: {e}")
-                    continue
-
-            # Проверка по хэшу
-            event_hash = self.calculate_event_hash(event)
-            if event_hash in known_hashes:
+            key = self.event_key(event)
+            if key is None or not dedupe.is_new(key):
                 continue
 
             new_events.append(event)
-            new_hashes.append(event_hash)
+            new_keys.append(key)
 
-        return new_events, new_hashes
+        return new_events, new_keys
 
     def categorize_application(self, app_name: str) -> str:
         """
@@ -514,12 +788,158 @@ class ActivityWatchClient:
 
         return summary
 
-    def send_incremental_update(self, events: List[Dict]) -> bool:
+    def prepare_daily_summary_from_aggregator(self, aggregator) -> Dict:
+        """
+        Подготавливает дневную сводку по нарастающим счетчикам.
+
+        Args:
+            aggregator: DailyAggregator с учтенными событиями
+
+        Returns:
+            Dict: Дневная сводка
+        """
+        return aggregator.to_summary(
+            {
+                "date": datetime.now(timezone.utc).strftime("%Y-%m-%d"),
+                "device_info": asdict(self.device_info),
+            },
+            self.categorize_application,
+        )
+
+    def summary_query(
+        self, window_bucket_id: str, afk_bucket_id: Optional[str] = None
+    ) -> List[str]:
+        """
+        Запрос aw-server для дневной сводки: время по приложениям.
+
+        Args:
+            window_bucket_id: Bucket окон
+            afk_bucket_id: Bucket AFK; если указан, учитывается только активное время
+
+        Returns:
+            List[str]: Строки запроса
+        """
+        lines = [f"events = flood(query_bucket({json.dumps(window_bucket_id)}));"]
+        if afk_bucket_id:
+            lines += [
+                f"not_afk = flood(query_bucket({json.dumps(afk_bucket_id)}));",
+                'not_afk = filter_keyvals(not_afk, "status", ["not-afk"]);',
+                "events = filter_period_intersect(events, not_afk);",
+            ]
+        lines.append('RETURN = merge_events_by_keys(events, ["app"]);')
+        return lines
+
+    def prepare_daily_summary_via_query(
+        self,
+        start: datetime,
+        end: datetime,
+        window_bucket_id: str,
+        afk_bucket_id: Optional[str] = None,
+        total_events: int = 0,
+    ) -> Optional[Dict]:
+        """
+        Подготавливает дневную сводку средствами aw-server.
+
+        Период разбивается на часы, все часы считаются одним запросом;
+        aw-server возвращает уже объединенные по приложениям события.
+
+        Args:
+            start: Начало периода
+            end: Конец периода
+            window_bucket_id: Bucket окон
+            afk_bucket_id: Bucket AFK (опционально)
+            total_events: Количество синхронизированных событий за период
+
+        Returns:
+            Optional[Dict]: Дневная сводка или None, если aw-server не ответил
+        """
+        start = self._ensure_utc(start).replace(minute=0, second=0, microsecond=0)
+        end = self._ensure_utc(end)
+
+        periods = []
+        hour_start = start
+        while hour_start < end:
+            hour_end = min(hour_start + timedelta(hours=1), end)
+            periods.append((hour_start, hour_end))
+            hour_start += timedelta(hours=1)
+        if not periods:
+            return None
+
+        results = self.query(periods, self.summary_query(window_bucket_id, afk_bucket_id))
+        if results is None or len(results) != len(periods):
+            return None
+
+        return self.summarize_query_results(periods, results, total_events)
+
+    def summarize_query_results(
+        self,
+        periods: List[Tuple[datetime, datetime]],
+        results: List[List[Dict]],
+        total_events: int = 0,
+    ) -> Dict:
+        """
+        Собирает дневную сводку из почасовых результатов запроса.
+
+        Args:
+            periods: Часовые периоды запроса
+            results: Объединенные по приложениям события для каждого периода
+            total_events: Количество синхронизированных событий за период
+
+        Returns:
+            Dict: Дневная сводка в том же формате, что prepare_daily_summary
+        """
+        summary = {
+            "date": datetime.now(timezone.utc).strftime("%Y-%m-%d"),
+            "device_info": asdict(self.device_info),
+            "hourly_data": {},
+            "applications": {},
+            "categories": {},
+            "total_active_time": 0,
+            "total_events": total_events,
+        }
+
+        for (hour_start, _), events in zip(periods, results):
+            if not events:
+                continue
+
+            hour_data = summary["hourly_data"].setdefault(
+                hour_start.strftime("%Y-%m-%d %H:00"),
+                {"applications": {}, "total_time": 0},
+            )
+            for event in events:
+                app = event.get("data", {}).get("app", "Unknown")
+                duration = event.get("duration", 0)
+
+                hour_data["applications"][app] = (
+                    hour_data["applications"].get(app, 0) + duration
+                )
+                hour_data["total_time"] += duration
+                summary["applications"][app] = (
+                    summary["applications"].get(app, 0) + duration
+                )
+                summary["total_active_time"] += duration
+
+        for app, duration in summary["applications"].items():
+            category = self.categorize_application(app)
+            summary["categories"][category] = (
+                summary["categories"].get(category, 0) + duration
+            )
+
+        return summary
+
+    def send_incremental_update(
+        self,
+        events: List[Dict],
+        bucket_id: Optional[str] = None,
+        bucket_type: Optional[str] = None,
+    ) -> bool:
         """
         Отправляет инкрементальное обновление на сервер.
 
         Args:
             events: Список новых событий
+            bucket_id: Идентификатор bucket, из которого получены события
+            bucket_type: Тип bucket (currentwindow, afkstatus, ...)
 
         Returns:
             bool: True если отправка успешна, иначе False
@@ -527,18 +947,13 @@ class ActivityWatchClient:
         if not events:
             logger.info("Нет событий для отправки")
             return True
-        sec = SecurityToken()
-        config = sec.load_config()
 
-        # ✅ ПРОВЕРКА + ОТЛАДКА
-        print(f"🔍 Полный конфиг: {config}")
-        device_id = config.get("device_id")
-        print(f"🔍 device_id: '{device_id}' (type: {type(device_id)})")
+        if self.sync_session_id is not None:
+            return self._send_batch(events, bucket_id, bucket_type)
 
+        device_id = self.get_device_id()
         if not device_id:
-            print("❌ ERROR: device_id не найден в конфиге!")
-            print("Запустите регистрацию: python client.py")
-            return
+            return False
 
         payload = {
             "type": "incremental_update",
@@ -546,13 +961,16 @@ class ActivityWatchClient:
             "events": events,
             "timestamp": datetime.now(timezone.utc).isoformat(),
             "count": len(events),
-            "device_id": device_id,  # ✅ Теперь точно строка!
+            "device_id": device_id,
+            "bucket_id": bucket_id,
+            "bucket_type": bucket_type,
         }
 
         try:
             response = self.session.post(
                 f"{self.server_url}/tracker/receive_incremental",
                 json=payload,
+                headers=self._auth_headers(),
                 timeout=160,
             )
 
@@ -566,8 +984,58 @@ class ActivityWatchClient:
                 return False
         except requests.RequestException as e:
             logger.error(f"Ошибка подключения при отправке: {e}")
+            self.invalidate_cache("server")
+            return False
+
+    def _send_batch(
+        self, events: List[Dict], bucket_id: Optional[str], bucket_type: Optional[str]
+    ) -> bool:
+        """
+        Отправляет пачку событий в открытой сессии (протокол v2).
+
+        Сервер сохраняет события до ответа, поэтому успешный ответ означает,
+        что события зафиксированы, а его водяная отметка - новая позиция bucket.
+
+        Returns:
+            bool: True если сервер зафиксировал пачку
+        """
+        payload = {
+            "session_id": self.sync_session_id,
+            "bucket_id": bucket_id,
+            "bucket_type": bucket_type,
+            "events": events,
+        }
+
+        try:
+            response = self.session.post(
+                f"{self.server_url}/tracker/receive_batch",
+                json=payload,
+                headers=self._auth_headers(),
+                timeout=160,
+            )
+        except requests.RequestException as e:
+            logger.error(f"Ошибка подключения при отправке: {e}")
+            self.invalidate_cache("server")
             return False
 
+        if response.status_code == 410:
+            # Сессия закрыта сервером: в следующем цикле откроем новую
+            logger.warning(f"Сессия {self.sync_session_id} закрыта сервером")
+            self.sync_session_id = None
+            return False
+        if response.status_code != 200:
+            logger.error(f"Ошибка отправки: {response.status_code} - {response.text}")
+            return False
+
+        try:
+            watermark = response.json().get("watermark")
+        except ValueError:
+            watermark = None
+        if watermark and bucket_id:
+            self.server_watermarks[bucket_id] = watermark
+        logger.info(f"Сервер зафиксировал {len(events)} событий {bucket_id or ''}")
+        return True
+
     def send_daily_summary(self, summary: Dict) -> bool:
         """
         Отправляет дневную сводку на сервер.
@@ -578,10 +1046,13 @@ class ActivityWatchClient:
         Returns:
             bool: True если отправка успешна, иначе False
         """
+        # Идентификатор регистрации: по нему сервер сверяет токен
+        payload = {**summary, "device_id": self.get_device_id()}
         try:
             response = self.session.post(
                 f"{self.server_url}/tracker/receive_daily_summary",
-                json=summary,
+                json=payload,
+                headers=self._auth_headers(),
                 timeout=15,
             )
 
@@ -0,0 +1,192 @@
+import logging
+from datetime import datetime, timezone
+from typing import Callable, Dict, Iterable, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class DailyAggregator:
+    """
+    Нарастающая дневная сводка по событиям окон.
+
+    Каждое отправленное событие сразу сворачивается в счетчики по часам
+    и приложениям, поэтому сами события в памяти не хранятся, а сводка
+    строится без повторного разбора событий. Счетчики сохраняются вместе
+    с состоянием синхронизации и переживают перезапуск клиента.
+
+    Повторная отправка незавершенного события ("open") с выросшей
+    длительностью учитывается только приростом длительности.
+
+    Attributes:
+        hourly (Dict): Час ("%Y-%m-%d %H:00") -> приложение -> секунды
+        applications (Dict): Приложение -> секунды
+        total_active_time (float): Суммарное время, секунды
+        total_events (int): Количество учтенных событий
+        started_at (Optional[datetime]): Время самого раннего учтенного события
+        open_event (Optional[Dict]): id, timestamp и учтенная длительность
+            незавершенного события
+    """
+
+    def __init__(self):
+        self.open_event: Optional[Dict] = None
+        self.reset()
+
+    def reset(self):
+        """
+        Очищает счетчики после отправки сводки.
+
+        Незавершенное событие сохраняется: уже учтенная часть его
+        длительности отправлена в сводке, новая сводка получит прирост.
+        """
+        self.hourly: Dict[str, Dict[str, float]] = {}
+        self.applications: Dict[str, float] = {}
+        self.total_active_time = 0.0
+        self.total_events = 0
+        self.started_at: Optional[datetime] = None
+
+    @property
+    def empty(self) -> bool:
+        """Нет ни одного учтенного события."""
+        return not self.hourly
+
+    def add(self, event: Dict) -> bool:
+        """
+        Учитывает событие в счетчиках.
+
+        Args:
+            event: Событие ActivityWatch
+
+        Returns:
+            bool: True если событие учтено
+        """
+        event_time = event.get("timestamp")
+        if not event_time:
+            return False
+
+        try:
+            dt = datetime.fromisoformat(event_time.replace("Z", "+00:00"))
+        except ValueError:
+            return False
+        if dt.tzinfo is None:
+            dt = dt.replace(tzinfo=timezone.utc)
+
+        app = event.get("data", {}).get("app", "Unknown")
+        duration = event.get("duration", 0)
+
+        is_update = False
+        if "open" in event:
+            previous = self.open_event
+            is_update = (
+                previous is not None
+                and previous["id"] == event.get("id")
+                and previous["timestamp"] == event_time
+            )
+            self.open_event = (
+                {"id": event.get("id"), "timestamp": event_time, "duration": duration}
+                if event["open"]
+                else None
+            )
+            if is_update:
+                duration -= previous["duration"]
+
+        hour = self.hourly.setdefault(dt.strftime("%Y-%m-%d %H:00"), {})
+        hour[app] = hour.get(app, 0) + duration
+        self.applications[app] = self.applications.get(app, 0) + duration
+        self.total_active_time += duration
+        if not is_update:
+            self.total_events += 1
+        if self.started_at is None or dt < self.started_at:
+            self.started_at = dt
+        return True
+
+    def extend(self, events: Iterable[Dict]) -> int:
+        """
+        Учитывает несколько событий.
+
+        Args:
+            events: События ActivityWatch
+
+        Returns:
+            int: Количество учтенных событий
+        """
+        return sum(1 for event in events if self.add(event))
+
+    def to_summary(self, base: Dict, categorize: Callable[[str], str]) -> Dict:
+        """
+        Строит дневную сводку в формате prepare_daily_summary.
+
+        Args:
+            base: Общие поля сводки (date, device_info)
+            categorize: Функция категоризации приложения
+
+        Returns:
+            Dict: Дневная сводка
+        """
+        categories: Dict[str, float] = {}
+        for app, duration in self.applications.items():
+            category = categorize(app)
+            categories[category] = categories.get(category, 0) + duration
+
+        return {
+            **base,
+            "hourly_data": {
+                hour_key: {"applications": dict(apps), "total_time": sum(apps.values())}
+                for hour_key, apps in self.hourly.items()
+            },
+            "applications": dict(self.applications),
+            "categories": categories,
+            "total_active_time": self.total_active_time,
+            "total_events": self.total_events,
+        }
+
+    def to_dict(self) -> Dict:
+        """Сериализует счетчики для файла состояния."""
+        return {
+            "hourly": self.hourly,
+            "total_events": self.total_events,
+            "open_event": self.open_event,
+            "started_at": (
+                self.started_at.isoformat().replace("+00:00", "Z")
+                if self.started_at
+                else None
+            ),
+        }
+
+    @classmethod
+    def from_dict(cls, data: Optional[Dict]) -> "DailyAggregator":
+        """
+        Восстанавливает счетчики из файла состояния.
+
+        Итоги по приложениям не хранятся, а пересчитываются из почасовых.
+
+        Args:
+            data: Сериализованные счетчики
+
+        Returns:
+            DailyAggregator: Восстановленная сводка (пустая при ошибке)
+        """
+        aggregator = cls()
+        if not data:
+            return aggregator
+
+        try:
+            for hour_key, apps in (data.get("hourly") or {}).items():
+                hour = aggregator.hourly.setdefault(hour_key, {})
+                for app, duration in apps.items():
+                    hour[app] = float(duration)
+                    aggregator.applications[app] = (
+                        aggregator.applications.get(app, 0) + float(duration)
+                    )
+                    aggregator.total_active_time += float(duration)
+            aggregator.total_events = int(data.get("total_events", 0))
+            aggregator.open_event = data.get("open_event")
+            started_at = data.get("started_at")
+            if started_at:
+                aggregator.started_at = datetime.fromisoformat(
+                    started_at.replace("Z", "+00:00")
+                )
+        except (AttributeError, TypeError, ValueError) as e:
+            logger.error(f"Ошибка загрузки дневной сводки: {e}")
+            return cls()
+
+        return aggregator
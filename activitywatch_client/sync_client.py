@@ -1,10 +1,13 @@
 import json
+import re
+import threading
 import time
 
 import socket
 
-from datetime import datetime, timedelta, timezone, time
-from typing import Dict, List
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List, Optional, Tuple
+from concurrent.futures import ThreadPoolExecutor
 
 from pathlib import Path
 
@@ -12,7 +15,12 @@ import logging
 
 
 from config import BaseSyncClient, SyncState
-from service import ActivityWatchClient
+from service import ActivityWatchClient, WINDOW_BUCKET_TYPE
+from dedupe import EventDeduplicator, EventKey, to_micros
+from outbox import EventOutbox
+from atomic import atomic_write
+from summary import DailyAggregator
+from scheduler import AdaptiveScheduler
 import sys
 import os
 
@@ -28,22 +36,58 @@ logging.basicConfig(
 logger = logging.getLogger(__name__)
 
 
+# 2: добавлены курсоры по buckets (bucket_sync_times)
+# 3: добавлена нарастающая дневная сводка (daily_summary)
+# 4: добавлены незавершенные события по buckets (open_events)
+STATE_SCHEMA_VERSION = 4
+
+# Максимальная глубина дневной сводки, считаемой через aw-server, в часах
+MAX_SUMMARY_HOURS = 48
+
+
+def _format_datetime(value: Optional[datetime]) -> Optional[str]:
+    """Сериализует datetime в ISO-строку UTC с суффиксом Z."""
+    if value is None:
+        return None
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return value.astimezone(timezone.utc).isoformat().replace("+00:00", "Z")
+
+
+def _parse_datetime(value) -> Optional[datetime]:
+    """Разбирает ISO-строку в datetime UTC."""
+    if not value:
+        return None
+    dt = datetime.fromisoformat(value.replace("Z", "+00:00"))
+    if dt.tzinfo is None:
+        dt = dt.replace(tzinfo=timezone.utc)
+    return dt
+
+
 class SyncStateManager:
     """
     Менеджер состояния синхронизации.
 
-    Управляет сохранением и загрузкой состояния синхронизации.
+    Управляет сохранением и загрузкой состояния синхронизации. Изменения
+    накапливаются в памяти и записываются одной атомарной операцией
+    за цикл синхронизации (см. flush).
     """
 
-    def __init__(self, state_file: Path):
+    def __init__(self, state_file: Path, fsync: bool = False):
         """
         Инициализация менеджера состояния.
 
         Args:
             state_file: Путь к файлу состояния
+            fsync: Сбрасывать ли файлы состояния на диск при записи
         """
         self.state_file = state_file
+        self.fsync = fsync
+        self.dirty = False
+        self.lock = threading.Lock()
+        self.daily = DailyAggregator()
         self.state = self._load_state()
+        self.dedupes: Dict[str, EventDeduplicator] = {}
 
     def _load_state(self) -> SyncState:
         """
@@ -60,160 +104,560 @@ class SyncStateManager:
             return default_state
 
         try:
-            with open(self.state_file, "r") as f:
-                data = json.load(f)
-
-            state = SyncState()
-            for key, value in data.items():
-                if hasattr(state, key):
-                    if key.endswith("_time") and value:
-                        # Парсим datetime
-                        try:
-                            if "Z" in value:
-                                dt = datetime.fromisoformat(
-                                    value.replace("Z", "+00:00")
-                                ).replace(tzinfo=timezone.utc)
-                            else:
-                                dt = datetime.fromisoformat(value)
-                                if dt.tzinfo is None:
-                                    dt = dt.replace(tzinfo=timezone.utc)
-                            setattr(state, key, dt)
-                        except ValueError:
-                            setattr(state, key, value)
-                    else:
-                        setattr(state, key, value)
-
-            return state
-        except (json.JSONDecodeError, IOError) as e:
+            with open(self.state_file, "rb") as f:
+                data = json.loads(f.read())
+
+            # Файлы без версии записаны старым форматом с теми же полями
+            version = data.get("version", 0)
+            if version > STATE_SCHEMA_VERSION:
+                logger.warning(
+                    f"Файл состояния версии {version} новее поддерживаемой "
+                    f"{STATE_SCHEMA_VERSION}, читаем известные поля"
+                )
+
+            self.daily = DailyAggregator.from_dict(data.get("daily_summary"))
+
+            return SyncState(
+                last_sync_time=_parse_datetime(data.get("last_sync_time")),
+                device_id=data.get("device_id") or default_state.device_id,
+                first_sync=_parse_datetime(data.get("first_sync"))
+                or default_state.first_sync,
+                last_daily_report=data.get("last_daily_report"),
+                processed_events_count=int(data.get("processed_events_count", 0)),
+                bucket_sync_times={
+                    bucket_id: _parse_datetime(value)
+                    for bucket_id, value in (data.get("bucket_sync_times") or {}).items()
+                    if value
+                },
+                open_events=dict(data.get("open_events") or {}),
+            )
+        except (json.JSONDecodeError, IOError, ValueError, TypeError) as e:
             logger.error(f"Ошибка загрузки состояния: {e}")
             return default_state
 
+    def _serialize(self) -> Dict:
+        """Сериализует состояние в словарь текущей версии схемы."""
+        return {
+            "version": STATE_SCHEMA_VERSION,
+            "device_id": self.state.device_id,
+            "last_sync_time": _format_datetime(self.state.last_sync_time),
+            "first_sync": _format_datetime(self.state.first_sync),
+            "last_daily_report": self.state.last_daily_report,
+            "processed_events_count": self.state.processed_events_count,
+            "bucket_sync_times": {
+                bucket_id: _format_datetime(value)
+                for bucket_id, value in self.state.bucket_sync_times.items()
+            },
+            "open_events": self.state.open_events,
+            "daily_summary": self.daily.to_dict(),
+        }
+
     def save_state(self) -> bool:
         """
-        Сохраняет состояние в файл.
+        Атомарно сохраняет состояние в файл.
 
         Returns:
             bool: True если сохранение успешно, иначе False
         """
         try:
-            # Конвертируем datetime в строки
-            state_dict = {}
-            for key in dir(self.state):
-                if not key.startswith("_"):
-                    value = getattr(self.state, key)
-                    if isinstance(value, datetime):
-                        # Убедимся, что datetime в UTC
-                        if value.tzinfo is None:
-                            value = value.replace(tzinfo=timezone.utc)
-                        state_dict[key] = value.isoformat().replace("+00:00", "Z")
-                    elif value is not None:
-                        state_dict[key] = value
-
-            with open(self.state_file, "w") as f:
-                json.dump(state_dict, f, indent=2, default=str)
-
+            data = json.dumps(self._serialize(), separators=(",", ":"))
+            atomic_write(self.state_file, data.encode(), fsync=self.fsync)
+            self.dirty = False
             return True
-        except IOError as e:
+        except OSError as e:
             logger.error(f"Ошибка сохранения состояния: {e}")
             return False
 
-    def update_sync_time(self, sync_time: datetime):
+    def mark_dirty(self):
+        """Отмечает состояние как измененное."""
+        self.dirty = True
+
+    def flush(self) -> bool:
+        """
+        Записывает накопленные изменения состояния и дедупликатора.
+
+        Returns:
+            bool: True если запись успешна или не требовалась
+        """
+        success = True
+        for dedupe in list(self.dedupes.values()):
+            if dedupe.dirty:
+                success = dedupe.save(fsync=self.fsync) and success
+        if self.dirty:
+            success = self.save_state() and success
+        return success
+
+    def get_bucket_sync_time(
+        self, bucket_id: str, bucket_type: str = ""
+    ) -> Optional[datetime]:
+        """
+        Возвращает курсор (время последней синхронизации) bucket.
+
+        Args:
+            bucket_id: Идентификатор bucket
+            bucket_type: Тип bucket
+
+        Returns:
+            Optional[datetime]: Время последней синхронизации или None
+        """
+        sync_time = self.state.bucket_sync_times.get(bucket_id)
+        if sync_time is None and bucket_type == WINDOW_BUCKET_TYPE:
+            # До синхронизации нескольких buckets общий курсор относился к окнам
+            sync_time = self.state.last_sync_time
+        return sync_time
+
+    def get_dedupe(self, bucket_id: str, bucket_type: str = "") -> EventDeduplicator:
+        """
+        Возвращает дедупликатор bucket, загружая его при первом обращении.
+
+        Args:
+            bucket_id: Идентификатор bucket
+            bucket_type: Тип bucket
+
+        Returns:
+            EventDeduplicator: Дедупликатор с отдельным файлом для bucket
+        """
+        with self.lock:
+            dedupe = self.dedupes.get(bucket_id)
+            if dedupe is None:
+                safe_id = re.sub(r"[^A-Za-z0-9_.-]", "_", bucket_id)
+                dedupe = EventDeduplicator(
+                    self.state_file.with_name(f"{self.state_file.stem}.{safe_id}.dedupe")
+                )
+                sync_time = self.get_bucket_sync_time(bucket_id, bucket_type)
+                if dedupe.watermark is None and sync_time:
+                    # Отметки еще нет: начинаем с курсора bucket
+                    dedupe.watermark = (to_micros(sync_time), 0)
+                self.dedupes[bucket_id] = dedupe
+            return dedupe
+
+    def update_sync_time(self, sync_time: datetime, bucket_id: Optional[str] = None):
         """
         Обновляет время последней синхронизации.
 
         Args:
             sync_time: Время синхронизации
+            bucket_id: Идентификатор bucket, курсор которого нужно сдвинуть
         """
         # Убедимся, что sync_time в UTC
         if sync_time.tzinfo is None:
             sync_time = sync_time.replace(tzinfo=timezone.utc)
 
-        self.state.last_sync_time = sync_time
-        self.state.processed_events_count += 1
-        self.save_state()
+        with self.lock:
+            if bucket_id is not None:
+                self.state.bucket_sync_times[bucket_id] = sync_time
+            if self.state.last_sync_time is None or sync_time > self.state.last_sync_time:
+                self.state.last_sync_time = sync_time
+            self.state.processed_events_count += 1
+            self.dirty = True
+
+    def add_event_keys(self, keys: List[EventKey], bucket_id: str, bucket_type: str = ""):
+        """
+        Отмечает события bucket как обработанные в дедупликаторе.
+
+        Args:
+            keys: Ключи событий
+            bucket_id: Идентификатор bucket
+            bucket_type: Тип bucket
+        """
+        self.get_dedupe(bucket_id, bucket_type).add(keys)
+
+    def get_open_event(self, bucket_id: str) -> Optional[Dict]:
+        """
+        Возвращает незавершенное (последнее) событие bucket.
+
+        Args:
+            bucket_id: Идентификатор bucket
+
+        Returns:
+            Optional[Dict]: id, timestamp и отправленная длительность события
+        """
+        with self.lock:
+            return self.state.open_events.get(bucket_id)
+
+    def set_open_event(self, bucket_id: str, event: Dict):
+        """
+        Запоминает незавершенное событие bucket.
 
-    def add_event_hashes(self, hashes: List[str], max_hashes: int = 1000):
+        Args:
+            bucket_id: Идентификатор bucket
+            event: Последнее событие bucket
+        """
+        open_event = {
+            "id": event.get("id"),
+            "timestamp": event.get("timestamp"),
+            "duration": event.get("duration", 0),
+        }
+        with self.lock:
+            if self.state.open_events.get(bucket_id) != open_event:
+                self.state.open_events[bucket_id] = open_event
+                self.dirty = True
+
+    def resume_from_server(
+        self,
+        bucket_id: str,
+        bucket_type: str,
+        server_time: datetime,
+        server_event_id: Optional[str] = None,
+    ):
         """
-        Добавляет хэши событий в состояние.
+        Переносит курсор и отметку дедупликатора bucket на водяную отметку
+        сервера - время последнего события, которое сервер сохранил.
 
         Args:
-            hashes: Список хэшей событий
-            max_hashes: Максимальное количество хранимых хэшей
+            bucket_id: Идентификатор bucket
+            bucket_type: Тип bucket
+            server_time: Время последнего сохраненного сервером события
+            server_event_id: Его id в ActivityWatch
+        """
+        try:
+            event_id = int(server_event_id or 0)
+        except ValueError:
+            event_id = 0
+
+        dedupe = self.get_dedupe(bucket_id, bucket_type)
+        with self.lock:
+            local_time = self.get_bucket_sync_time(bucket_id, bucket_type)
+            if local_time != server_time:
+                logger.info(
+                    f"Курсор {bucket_id} перенесен на отметку сервера: "
+                    f"{local_time} -> {server_time}"
+                )
+            self.state.bucket_sync_times[bucket_id] = server_time
+            dedupe.move_watermark((to_micros(server_time), event_id))
+            self.dirty = True
+
+    def add_to_daily_summary(self, events: List[Dict]) -> int:
         """
-        self.state.last_event_hashes.extend(hashes)
-        # Ограничиваем количество хранимых хэшей
-        self.state.last_event_hashes = self.state.last_event_hashes[-max_hashes:]
-        self.save_state()
+        Учитывает отправленные события окон в дневной сводке.
+
+        Args:
+            events: Отправленные события
+
+        Returns:
+            int: Количество учтенных событий
+        """
+        with self.lock:
+            added = self.daily.extend(events)
+            if added:
+                self.dirty = True
+        return added
+
+    def reset_daily_summary(self, report_date: str):
+        """
+        Очищает дневную сводку после успешной отправки.
+
+        Args:
+            report_date: Дата отправленного отчета
+        """
+        with self.lock:
+            self.daily.reset()
+            self.state.last_daily_report = report_date
+            self.dirty = True
 
 
 class ActivityWatchSyncService(BaseSyncClient):
     """
     Сервис синхронизации ActivityWatch.
 
-    Координирует процесс сбора и отправки данных.
+    Координирует процесс сбора и отправки данных. Все синхронизируемые
+    buckets (окна, AFK, браузер, редакторы) обрабатываются параллельно,
+    у каждого свой курсор, дедупликатор и партиция очереди.
     """
 
-    def __init__(self, client: ActivityWatchClient, state_manager: SyncStateManager):
+    def __init__(
+        self,
+        client: ActivityWatchClient,
+        state_manager: SyncStateManager,
+        outbox: Optional[EventOutbox] = None,
+        max_workers: int = 4,
+    ):
         """
         Инициализация сервиса синхронизации.
 
         Args:
             client: Клиент ActivityWatch
             state_manager: Менеджер состояния
+            outbox: Очередь неотправленных событий (по умолчанию client.outbox_file)
+            max_workers: Максимальное количество buckets, обрабатываемых параллельно
         """
         self.client = client
         self.state = state_manager
-        self.daily_cache = []
-
-    def _catch_up_history(self, bucket_id: str) -> bool:
-        logger.info("Начинаем дозаполнение истории...")
-        
-        # Получаем ВСЕ события из bucket (limit=-1 значит "без лимита")
-        logger.info(f"Загружаем все события из {bucket_id}...")
-        all_events = self.client.get_events(bucket_id, limit=-1)
-        
+        self.outbox = outbox or EventOutbox(client.outbox_file)
+        self.max_workers = max_workers
+        self.buckets: Dict[str, str] = {}
+        # Buckets, для которых получены отметки сервера в текущей сессии
+        self.session_buckets: set = set()
+        self.last_cycle: Dict[str, int] = {"events": 0, "requests": 0}
+
+    def _run_concurrently(self, func, items: List) -> List:
+        """
+        Выполняет func для каждого элемента в пуле потоков.
+
+        Args:
+            func: Функция одного аргумента
+            items: Элементы для обработки
+
+        Returns:
+            List: Результаты в порядке элементов
+        """
+        if len(items) <= 1:
+            return [func(item) for item in items]
+
+        with ThreadPoolExecutor(
+            max_workers=min(self.max_workers, len(items)),
+            thread_name_prefix="aw-sync",
+        ) as executor:
+            return list(executor.map(func, items))
+
+    def _catch_up_history(self, bucket_id: str, bucket_type: str) -> int:
+        """
+        Дозаполняет историю: ставит в очередь все события bucket с момента
+        последней синхронизации без ограничения глубины.
+
+        Args:
+            bucket_id: Идентификатор bucket
+            bucket_type: Тип bucket
+
+        Returns:
+            int: Количество поставленных в очередь событий
+        """
+        last_sync = self._include_open_event(
+            bucket_id, self.state.get_bucket_sync_time(bucket_id, bucket_type)
+        )
+        current_time = datetime.now(timezone.utc)
+
+        # Получаем события с последней синхронизации (limit=-1 значит "без лимита")
+        logger.info(f"Дозаполнение истории {bucket_id} начиная с {last_sync or 'начала'}...")
+        all_events = self.client.get_events(bucket_id, start_time=last_sync, limit=-1)
+
         if not all_events:
-            logger.info("Нет событий для отправки")
+            logger.info(f"Нет событий для дозаполнения в {bucket_id}")
+            self.state.update_sync_time(current_time, bucket_id)
+            return 0
+
+        new_events, new_keys = self.client.filter_new_events(
+            all_events, self.state.get_dedupe(bucket_id, bucket_type)
+        )
+        new_events = self._apply_open_event(bucket_id, all_events, new_events)
+        queued = self.outbox.append(new_events, bucket_id)
+        self.state.update_sync_time(current_time, bucket_id)
+        self.state.add_event_keys(new_keys, bucket_id, bucket_type)
+        logger.info(f"✅ Дозаполнение {bucket_id}: в очередь поставлено {queued} событий")
+        return queued
+
+    def _collect_new_events(self, bucket_id: str, bucket_type: str) -> int:
+        """
+        Забирает новые события bucket из ActivityWatch в локальную очередь.
+
+        Args:
+            bucket_id: Идентификатор bucket
+            bucket_type: Тип bucket
+
+        Returns:
+            int: Количество поставленных в очередь событий
+        """
+        last_sync = self.state.get_bucket_sync_time(bucket_id, bucket_type)
+        current_time = datetime.now(timezone.utc)
+        if not last_sync:
+            last_sync = current_time - timedelta(hours=1)
+        last_sync = self._include_open_event(bucket_id, last_sync)
+
+        # Поиск данных за более узкие периоды внутри пустого периода не нужен;
+        # выборка без лимита: курсор ниже переносится на current_time
+        events, actual_start = self.client.get_events_safe(
+            bucket_id, last_sync, search_fallback=False, limit=-1
+        )
+        if not events:
+            logger.info(f"Нет новых событий в {bucket_id}")
+            return 0
+
+        new_events, new_keys = self.client.filter_new_events(
+            events, self.state.get_dedupe(bucket_id, bucket_type)
+        )
+        new_events = self._apply_open_event(bucket_id, events, new_events)
+        if not new_events:
+            logger.info(f"Все события {bucket_id} уже обработаны")
+            return 0
+
+        queued = self.outbox.append(new_events, bucket_id)
+        self.state.update_sync_time(current_time, bucket_id)
+        self.state.add_event_keys(new_keys, bucket_id, bucket_type)
+        return queued
+
+    def _include_open_event(
+        self, bucket_id: str, start: Optional[datetime]
+    ) -> Optional[datetime]:
+        """
+        Сдвигает начало выборки так, чтобы в нее попало незавершенное
+        событие bucket: его длительность растет с каждым heartbeat.
+
+        Args:
+            bucket_id: Идентификатор bucket
+            start: Начало выборки по курсору
+
+        Returns:
+            Optional[datetime]: Начало выборки
+        """
+        open_event = self.state.get_open_event(bucket_id)
+        if not open_event or start is None:
+            return start
+        try:
+            open_time = self.client._parse_timestamp(open_event["timestamp"])
+        except (KeyError, TypeError, ValueError):
+            return start
+        return min(start, open_time)
+
+    def _apply_open_event(
+        self, bucket_id: str, events: List[Dict], new_events: List[Dict]
+    ) -> List[Dict]:
+        """
+        Помечает последнее событие bucket как незавершенное ("open") и
+        добавляет к отправке обновление длительности ранее отправленного
+        незавершенного события. Сервер обновляет длительность такого
+        события на месте, не дублируя его.
+
+        Args:
+            bucket_id: Идентификатор bucket
+            events: Все полученные из ActivityWatch события
+            new_events: Новые события после дедупликации
+
+        Returns:
+            List[Dict]: События для отправки
+        """
+        if not events:
+            return new_events
+
+        to_send = list(new_events)
+        newest = max(events, key=lambda e: e.get("timestamp") or "")
+
+        previous = self.state.get_open_event(bucket_id)
+        if previous:
+            current = next(
+                (
+                    e
+                    for e in events
+                    if e.get("id") == previous["id"]
+                    and e.get("timestamp") == previous["timestamp"]
+                ),
+                None,
+            )
+            if (
+                current is not None
+                and current.get("duration") != previous["duration"]
+                and all(current is not e for e in new_events)
+            ):
+                # Обновление идет раньше новых событий, которые его закрывают
+                current["open"] = current is newest
+                to_send.insert(0, current)
+
+        newest["open"] = True
+        self.state.set_open_event(bucket_id, newest)
+        return to_send
+
+    def _collect_bucket(self, bucket: Tuple[str, str]) -> int:
+        """
+        Собирает события одного bucket в очередь.
+
+        Args:
+            bucket: Пара (идентификатор bucket, тип bucket)
+
+        Returns:
+            int: Количество поставленных в очередь событий
+        """
+        bucket_id, bucket_type = bucket
+        try:
+            if self._should_catch_up(bucket_id, bucket_type):
+                return self._catch_up_history(bucket_id, bucket_type)
+            return self._collect_new_events(bucket_id, bucket_type)
+        except Exception as e:
+            logger.error(f"Ошибка сбора событий {bucket_id}: {e}", exc_info=True)
+            return 0
+
+    def _flush_outbox(self, buckets: Dict[str, str]) -> bool:
+        """
+        Отправляет накопленную очередь на сервер, партиции - параллельно.
+
+        Args:
+            buckets: Идентификатор bucket -> тип bucket
+
+        Returns:
+            bool: True если очередь отправлена полностью
+        """
+        partitions = self.outbox.partitions()
+        if not partitions:
             return True
-        
-        total_events = len(all_events)
-        logger.info(f"Всего событий: {total_events}")
-        
-        # Конвертируем в формат для сервера
-        serialized_events = []
-        for event in all_events:
-            # event - это словарь, обращаемся по ключам
-            serialized_events.append({
-                "timestamp": event.get("timestamp"),
-                "duration": event.get("duration", 0),
-                "data": event.get("data", {})
-            })
-        
-        # Отправляем пачками по 5000 событий
-        CHUNK_SIZE = 5000
+
+        if not self.client.check_server_connection():
+            logger.warning(
+                f"Сервер недоступен, в очереди осталось {self.outbox.size()} событий"
+            )
+            return False
+
+        def drain(bucket_id: str) -> Tuple[str, bool, List[Dict]]:
+            # Пустой bucket_id - очередь, созданная до разделения по buckets (окна)
+            bucket_type = buckets.get(bucket_id, "" if bucket_id else WINDOW_BUCKET_TYPE)
+
+            def send(events: List[Dict]) -> bool:
+                return self.client.send_incremental_update(
+                    events, bucket_id or None, bucket_type or None
+                )
+
+            try:
+                success, sent_events = self.outbox.drain(send, bucket_id)
+            except Exception as e:
+                logger.error(f"Ошибка отправки очереди {bucket_id}: {e}", exc_info=True)
+                success, sent_events = False, []
+            return bucket_type, success, sent_events
+
+        results = self._run_concurrently(drain, partitions)
+
         success = True
-        
-        for i in range(0, total_events, CHUNK_SIZE):
-            chunk = serialized_events[i:i + CHUNK_SIZE]
-            logger.info(f"Отправка пачки {i//CHUNK_SIZE + 1}/{(total_events-1)//CHUNK_SIZE + 1} ({len(chunk)} событий)...")
-            
-            if not self.client.send_incremental_update(chunk):
-                logger.error(f"Ошибка при отправке пачки {i//CHUNK_SIZE + 1}")
-                success = False
-                break
-        
-        if success:
-            # Обновляем время последней синхронизации на текущее
-            self.state.update_sync_time(datetime.now(timezone.utc))
-            logger.info("✅ Дозаполнение истории завершено успешно")
-        else:
-            logger.error("❌ Дозаполнение истории завершилось с ошибками")
-        
+        sent_any = False
+        for bucket_type, drained, sent_events in results:
+            success = success and drained
+            sent_any = sent_any or bool(sent_events)
+            if bucket_type == WINDOW_BUCKET_TYPE:
+                self.state.add_to_daily_summary(sent_events)
+
+        if sent_any:
+            self.outbox.compact()
+            self._check_and_send_daily_report()
         return success
 
-    def _should_catch_up(self) -> bool:
-        """Проверяет, нужно ли дозаполнять историю."""
-        last_sync = self.state.state.last_sync_time
+    def _ensure_session(self, buckets: Dict[str, str]):
+        """
+        Открывает сессию синхронизации на сервере (протокол v2) и
+        продолжает buckets с сохраненных сервером водяных отметок.
+
+        Партиции с неотправленными событиями не переносятся: их события
+        новее отметки сервера и будут отправлены из очереди.
+
+        Args:
+            buckets: Идентификатор bucket -> тип bucket
+        """
+        if self.client.protocol_version < 2:
+            return
+        if self.client.sync_session_id and set(buckets) <= self.session_buckets:
+            return
+        if not self.client.check_server_connection():
+            return
+
+        watermarks = self.client.handshake(list(buckets))
+        if watermarks is None:
+            return
+        self.session_buckets = set(buckets)
+
+        pending = set(self.outbox.partitions())
+        for bucket_id, (server_time, server_event_id) in watermarks.items():
+            if bucket_id in buckets and bucket_id not in pending:
+                self.state.resume_from_server(
+                    bucket_id, buckets[bucket_id], server_time, server_event_id
+                )
+
+    def _should_catch_up(self, bucket_id: str, bucket_type: str = "") -> bool:
+        """Проверяет, нужно ли дозаполнять историю bucket."""
+        last_sync = self.state.get_bucket_sync_time(bucket_id, bucket_type)
 
         # Если никогда не синхронизировались – точно нужно
         if last_sync is None:
@@ -231,60 +675,94 @@ class ActivityWatchSyncService(BaseSyncClient):
         return False
 
     def sync(self) -> bool:
+        self.last_cycle["events"] = 0
         if not self.client.check_activitywatch_connection():
             return False
-        if not self.client.check_server_connection():
-            return False
 
-        bucket_id = self.client.find_window_bucket()
-        if not bucket_id:
+        buckets = self.client.find_sync_buckets()
+        if not buckets:
+            logger.warning("Не найдено ни одного bucket для синхронизации")
             return False
+        self.buckets = buckets
+        self._ensure_session(buckets)
 
-        # Догон истории
-        if self._should_catch_up():
-            if not self._catch_up_history(bucket_id):
-                return False
-
-        # Инкрементальная синхронизация
-        last_sync = self.state.state.last_sync_time
-        current_time = datetime.now(timezone.utc)
-        if not last_sync:
-            last_sync = current_time - timedelta(hours=1)
+        try:
+            # Сбор событий в очередь не зависит от доступности сервера
+            queued = self._run_concurrently(self._collect_bucket, list(buckets.items()))
+            self.last_cycle["events"] = sum(queued)
+            logger.info(
+                f"В очередь поставлено {sum(queued)} событий из {len(buckets)} buckets"
+            )
+
+            return self._flush_outbox(buckets)
+        finally:
+            # Одна запись состояния за цикл
+            self.state.flush()
+
+    def _build_daily_summary(self) -> Dict:
+        """
+        Строит дневную сводку по синхронизированным событиям окон.
 
-        events, actual_start = self.client.get_events_safe(bucket_id, last_sync)
-        if not events:
-            logger.info("Нет новых событий")
-            return True
+        Сводка считается запросом к aw-server; если aw-server недоступен
+        или не поддерживает /query, сводка строится по нарастающим
+        счетчикам состояния.
 
-        new_events, new_hashes = self.client.filter_new_events(
-            events, self.state.state.last_sync_time, self.state.state.last_event_hashes
+        Returns:
+            Dict: Дневная сводка
+        """
+        window_bucket = next(
+            (b for b, t in self.buckets.items() if t == WINDOW_BUCKET_TYPE), None
+        )
+        afk_bucket = next(
+            (b for b, t in self.buckets.items() if t == "afkstatus"), None
         )
-        if not new_events:
-            logger.info("Все события уже обработаны")
-            return True
 
-        success = self.client.send_incremental_update(new_events)
-        if success:
-            self.state.update_sync_time(current_time)
-            self.state.add_event_hashes(new_hashes)
-            self.daily_cache.extend(new_events)
-            self._check_and_send_daily_report()
-        return success
+        daily = self.state.daily
+        summary = None
+        if window_bucket and daily.started_at:
+            now = datetime.now(timezone.utc)
+            start = max(daily.started_at, now - timedelta(hours=MAX_SUMMARY_HOURS))
+            summary = self.client.prepare_daily_summary_via_query(
+                start, now, window_bucket, afk_bucket, daily.total_events
+            )
+
+        if summary is None:
+            summary = self.client.prepare_daily_summary_from_aggregator(daily)
+        return summary
 
     def _check_and_send_daily_report(self):
         """Проверяет и отправляет дневной отчет при необходимости."""
         today = datetime.now(timezone.utc).strftime("%Y-%m-%d")
 
-        if self.state.state.last_daily_report != today and self.daily_cache:
+        if self.state.state.last_daily_report != today and not self.state.daily.empty:
             logger.info(f"Отправка дневного отчета за {today}")
 
-            summary = self.client.prepare_daily_summary(self.daily_cache)
+            summary = self._build_daily_summary()
             success = self.client.send_daily_summary(summary)
 
             if success:
-                self.state.state.last_daily_report = today
-                self.state.save_state()
-                self.daily_cache = []  # Очищаем кэш
+                self.state.reset_daily_summary(today)
+
+    def get_status(self) -> Dict:
+        """
+        Возвращает состояние клиента синхронизации.
+
+        Returns:
+            Dict: Время последней синхронизации и статистика очереди
+        """
+        last_sync = self.state.state.last_sync_time
+        return {
+            "device_id": self.state.state.device_id,
+            "last_sync_time": last_sync.isoformat() if last_sync else None,
+            "buckets": {
+                bucket_id: sync_time.isoformat()
+                for bucket_id, sync_time in self.state.state.bucket_sync_times.items()
+            },
+            "outbox": self.outbox.stats(),
+            "last_cycle": dict(self.last_cycle),
+            "protocol": self.client.protocol_version,
+            "server_watermarks": dict(self.client.server_watermarks),
+        }
 
     def get_available_data(self) -> List[Dict]:
         """Получить доступные данные для синхронизации."""
@@ -292,43 +770,69 @@ class ActivityWatchSyncService(BaseSyncClient):
         if not bucket_id:
             return []
 
-        last_sync = self.state.state.last_sync_time or datetime.now(
-            timezone.utc
-        ) - timedelta(hours=1)
+        last_sync = self.state.get_bucket_sync_time(
+            bucket_id, WINDOW_BUCKET_TYPE
+        ) or datetime.now(timezone.utc) - timedelta(hours=1)
         events, _ = self.client.get_events_safe(bucket_id, last_sync)
 
         return events
 
-    def continuous_sync(self, interval_minutes: int = 1):
+    def continuous_sync(
+        self, interval_minutes: float = 1, scheduler: Optional[AdaptiveScheduler] = None
+    ):
         """
         Запускает непрерывную синхронизацию.
 
+        Пауза между циклами подбирается планировщиком: она короче при
+        активной работе пользователя, длиннее в простое и растет
+        экспоненциально после ошибок.
+
         Args:
-            interval_minutes: Интервал между синхронизациями в минутах
+            interval_minutes: Базовый интервал между синхронизациями в минутах
+            scheduler: Планировщик (по умолчанию AdaptiveScheduler с базовым интервалом)
         """
+        scheduler = scheduler or AdaptiveScheduler(
+            base_interval=interval_minutes * 60, seed=self.state.state.device_id
+        )
         logger.info(
-            f"Запуск непрерывной синхронизации с интервалом {interval_minutes} минут"
+            f"Запуск непрерывной синхронизации с базовым интервалом {interval_minutes} минут"
         )
 
         try:
+            delay = scheduler.startup_delay()
+            logger.info(f"Первый цикл через {delay:.0f} сек")
+            time.sleep(delay)
+
+            last_start = time.monotonic()
             while True:
+                started = time.monotonic()
+                requests_before = self.client.request_count
                 logger.info("Начало цикла синхронизации")
-                self.sync()
-
+                try:
+                    success = self.sync()
+                except Exception as e:
+                    logger.error(f"Ошибка в цикле синхронизации: {e}", exc_info=True)
+                    success = False
+
+                self.last_cycle["requests"] = self.client.request_count - requests_before
+                outbox_stats = self.outbox.stats()
                 logger.info(
-                    f"Ожидание {interval_minutes} минут до следующей синхронизации"
+                    f"Цикл: {self.last_cycle['events']} событий, "
+                    f"{self.last_cycle['requests']} HTTP-запросов; "
+                    f"очередь: {outbox_stats['pending_events']} событий, "
+                    f"старейшему {outbox_stats['oldest_unsent_age_seconds'] or 0:.0f} сек"
+                )
+
+                delay = scheduler.next_delay(
+                    success, self.last_cycle["events"], started - last_start
                 )
-                time.sleep(interval_minutes * 60)
+                last_start = started
+                logger.info(f"Ожидание {delay:.0f} сек до следующей синхронизации")
+                time.sleep(delay)
 
         except KeyboardInterrupt:
             logger.info("Синхронизация остановлена пользователем")
 
-            # Отправляем оставшиеся данные перед выходом
-            if self.daily_cache:
-                logger.info("Отправка накопленных данных перед выходом")
-                summary = self.client.prepare_daily_summary(self.daily_cache)
-                self.client.send_daily_summary(summary)
-
-        except Exception as e:
-            logger.error(f"Критическая ошибка в непрерывной синхронизации: {e}")
-            raise
+            # Дневная сводка хранится в состоянии и будет отправлена после
+            # перезапуска, перед выходом достаточно записать состояние
+            self.state.flush()
@@ -0,0 +1 @@
+"""Нагрузочное тестирование сервера: генератор данных и драйвер трафика."""
@@ -0,0 +1,87 @@
+"""
+Стоимость аутентификации на запрос: get_current_user с кэшем
+пользователей по JWT и без него.
+
+Промах кэша - декодирование JWT и запрос пользователя в БД, попадание -
+sha256 токена и поиск в словаре. Берется первый пользователь,
+созданный generate_data.
+
+Запуск из каталога backend:
+    python -m loadtest.bench_auth --requests 2000
+"""
+
+import argparse
+import asyncio
+import time
+from typing import List
+
+from sqlalchemy import select
+from starlette.requests import Request
+
+from src.activitywatch.core.security import create_access_token, get_current_user, principal_cache
+from src.activitywatch.database.models import User
+from src.activitywatch.database.query_stats import count_queries
+from src.activitywatch.loader import db_manager
+
+from loadtest.generate_data import PREFIX
+from loadtest.load_driver import percentile
+
+
+def make_request(token: str) -> Request:
+    return Request(
+        {
+            "type": "http",
+            "method": "GET",
+            "path": "/api/statistics/summary",
+            "headers": [(b"cookie", f"token={token}".encode())],
+        }
+    )
+
+
+async def measure(token: str, requests: int, cached: bool) -> dict:
+    request = make_request(token)
+    timings: List[float] = []
+    with count_queries() as counter:
+        for _ in range(requests):
+            if not cached:
+                principal_cache.clear()
+            started = time.perf_counter()
+            await get_current_user(request)
+            timings.append((time.perf_counter() - started) * 1e6)
+    timings.sort()
+    return {
+        "p50": percentile(timings, 50),
+        "p99": percentile(timings, 99),
+        "queries": counter.count / requests,
+    }
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="Стоимость get_current_user на запрос")
+    parser.add_argument("--requests", type=int, default=2000)
+    args = parser.parse_args()
+
+    async with db_manager.get_session() as session:
+        user = (
+            await session.execute(
+                select(User).where(User.email.like(f"{PREFIX}%")).order_by(User.id).limit(1)
+            )
+        ).scalar_one_or_none()
+    if user is None:
+        raise SystemExit("Нет пользователей loadtest: сначала python -m loadtest.generate_data")
+
+    token = create_access_token({"sub": user.email, "user_id": user.id, "type": "access"})
+    await measure(token, 100, cached=False)  # прогрев пула соединений
+
+    for name, cached in (("без кэша", False), ("с кэшем", True)):
+        result = await measure(token, args.requests, cached)
+        print(
+            f"{name:9} p50 {result['p50']:8.1f} мкс  p99 {result['p99']:8.1f} мкс  "
+            f"SQL запросов на запрос {result['queries']:.2f}"
+        )
+
+    await db_manager.engine.dispose()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
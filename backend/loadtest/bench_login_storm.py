@@ -0,0 +1,163 @@
+"""
+Задержка посторонних запросов во время наплыва входов.
+
+Одно приложение FastAPI вызывается напрямую через ASGI, без сети и БД:
+POST /login проверяет пароль Argon2, GET /ping ничего не делает.
+Пока идут входы, /ping вызывается с постоянным интервалом и меряется
+его задержка. Сравниваются три режима:
+
+    idle     - входов нет (базовая задержка /ping);
+    inline   - verify_password прямо в обработчике, как было раньше;
+    executor - password_hasher.verify в пуле потоков Argon2.
+
+В режиме inline каждый вход останавливает цикл событий на время
+Argon2, и p99 /ping растет до десятков миллисекунд; с пулом потоков
+p99 должен остаться близким к idle. Код выхода 1, если p99 /ping
+в режиме executor превышает --max-p99-ms.
+
+Запуск из каталога backend:
+    python -m loadtest.bench_login_storm --logins 200 --concurrency 20
+"""
+
+import argparse
+import asyncio
+import sys
+import time
+from typing import Dict, List
+
+from fastapi import FastAPI, Request
+
+from src.activitywatch.core.metrics import password_hash_queue_time
+from src.activitywatch.core.security import (
+    get_password_hash,
+    password_hasher,
+    verify_password,
+)
+
+from loadtest.load_driver import percentile
+
+PASSWORD = "loadtest-password"
+PING_INTERVAL = 0.005
+
+
+def build_app(password_hash: str, mode: str) -> FastAPI:
+    app = FastAPI()
+
+    @app.post("/login")
+    async def login(request: Request):
+        password = (await request.body()).decode()
+        if mode == "inline":
+            ok = verify_password(password, password_hash)
+        else:
+            ok = await password_hasher.verify(password, password_hash)
+        return {"ok": ok}
+
+    @app.get("/ping")
+    async def ping():
+        return {"ok": True}
+
+    return app
+
+
+async def call(app: FastAPI, method: str, path: str, body: bytes = b""):
+    scope = {
+        "type": "http",
+        "asgi": {"version": "3.0"},
+        "http_version": "1.1",
+        "method": method,
+        "scheme": "http",
+        "path": path,
+        "raw_path": path.encode(),
+        "root_path": "",
+        "query_string": b"",
+        "headers": [(b"host", b"bench"), (b"content-length", str(len(body)).encode())],
+        "client": ("127.0.0.1", 1),
+        "server": ("bench", 80),
+    }
+
+    async def receive():
+        return {"type": "http.request", "body": body, "more_body": False}
+
+    async def send(message):
+        pass
+
+    await app(scope, receive, send)
+
+
+async def run_storm(app: FastAPI, logins: int, concurrency: int, idle_seconds: float) -> Dict:
+    """Входы с заданной параллельностью и замер /ping каждые PING_INTERVAL."""
+    latencies: List[float] = []
+    done = asyncio.Event()
+
+    async def pinger():
+        # Задержка считается от запланированного момента запроса, а не от
+        # фактического: пока цикл событий стоит, запросы копятся, как
+        # копились бы запросы клиентов
+        scheduled = time.perf_counter()
+        while not done.is_set():
+            delay = scheduled - time.perf_counter()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            await call(app, "GET", "/ping")
+            latencies.append((time.perf_counter() - scheduled) * 1000)
+            scheduled += PING_INTERVAL
+
+    async def login_worker(count: int):
+        for _ in range(count):
+            await call(app, "POST", "/login", PASSWORD.encode())
+
+    started = time.perf_counter()
+    ping_task = asyncio.create_task(pinger())
+    if logins:
+        per_worker, extra = divmod(logins, concurrency)
+        await asyncio.gather(
+            *(login_worker(per_worker + (i < extra)) for i in range(concurrency))
+        )
+    else:
+        await asyncio.sleep(idle_seconds)
+    elapsed = time.perf_counter() - started
+    done.set()
+    await ping_task
+
+    latencies.sort()
+    return {
+        "pings": len(latencies),
+        "p50": percentile(latencies, 50),
+        "p99": percentile(latencies, 99),
+        "max": latencies[-1] if latencies else 0.0,
+        "logins_per_s": logins / elapsed,
+    }
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="p99 /ping во время наплыва входов")
+    parser.add_argument("--logins", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=20)
+    parser.add_argument("--max-p99-ms", type=float, default=20.0)
+    args = parser.parse_args()
+
+    password_hash = get_password_hash(PASSWORD)
+    print(f"потоков Argon2: {password_hasher.workers}")
+
+    results = {}
+    for mode in ("idle", "inline", "executor"):
+        app = build_app(password_hash, mode)
+        logins = 0 if mode == "idle" else args.logins
+        results[mode] = await run_storm(app, logins, args.concurrency, idle_seconds=2.0)
+        r = results[mode]
+        print(
+            f"{mode:9} /ping p50 {r['p50']:7.2f} мс  p99 {r['p99']:7.2f} мс  "
+            f"max {r['max']:7.2f} мс  входов/с {r['logins_per_s']:6.1f}"
+        )
+
+    queue = password_hash_queue_time.labels("verify").summary()
+    print(f"ожидание потока Argon2 (verify), с: p50 {queue['p50']} p99 {queue['p99']}")
+
+    password_hasher.shutdown()
+    if results["executor"]["p99"] > args.max_p99_ms:
+        print(f"p99 /ping в режиме executor выше {args.max_p99_ms} мс")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
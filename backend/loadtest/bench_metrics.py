@@ -0,0 +1,96 @@
+"""
+Накладные расходы middleware метрик на HTTP запрос.
+
+Одно и то же приложение FastAPI (с числом маршрутов как у сервера)
+вызывается напрямую через ASGI, без сети, с RouteContextMiddleware и
+MetricsMiddleware и без них. Разница времени на запрос - стоимость
+пометки маршрута, счетчиков и гистограмм.
+
+Запуск из каталога backend:
+    python -m loadtest.bench_metrics --requests 20000
+"""
+
+import argparse
+import asyncio
+import time
+
+from fastapi import FastAPI
+
+from src.activitywatch.core.middleware import MetricsMiddleware, RouteContextMiddleware
+from src.activitywatch.database.query_stats import QueryStats
+
+
+def build_app(instrumented: bool, routes: int) -> FastAPI:
+    app = FastAPI()
+    for index in range(routes):
+        app.add_api_route(f"/api/route{index}/{{item}}", lambda item: {"item": item})
+
+    @app.get("/api/statistics/overview")
+    async def overview():
+        return {"ok": True}
+
+    if instrumented:
+        app.add_middleware(MetricsMiddleware)
+        app.add_middleware(RouteContextMiddleware, query_stats=QueryStats())
+    return app
+
+
+async def call(app: FastAPI, path: str):
+    scope = {
+        "type": "http",
+        "asgi": {"version": "3.0"},
+        "http_version": "1.1",
+        "method": "GET",
+        "scheme": "http",
+        "path": path,
+        "raw_path": path.encode(),
+        "root_path": "",
+        "query_string": b"",
+        "headers": [(b"host", b"bench")],
+        "client": ("127.0.0.1", 1),
+        "server": ("bench", 80),
+    }
+
+    async def receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message):
+        pass
+
+    await app(scope, receive, send)
+
+
+async def measure(app: FastAPI, requests: int, path: str) -> float:
+    for _ in range(200):  # прогрев
+        await call(app, path)
+    started = time.perf_counter()
+    for _ in range(requests):
+        await call(app, path)
+    return (time.perf_counter() - started) / requests * 1e6
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="Накладные расходы middleware метрик")
+    parser.add_argument("--requests", type=int, default=20000)
+    parser.add_argument("--routes", type=int, default=40, help="Маршрутов в приложении")
+    parser.add_argument("--rounds", type=int, default=3)
+    args = parser.parse_args()
+
+    # Маршрут в конце списка - худший случай для поиска шаблона
+    path = "/api/statistics/overview"
+    plain = build_app(False, args.routes)
+    instrumented = build_app(True, args.routes)
+
+    best_plain = best_instrumented = float("inf")
+    for _ in range(args.rounds):
+        best_plain = min(best_plain, await measure(plain, args.requests, path))
+        best_instrumented = min(best_instrumented, await measure(instrumented, args.requests, path))
+
+    overhead = best_instrumented - best_plain
+    print(f"без метрик:  {best_plain:8.1f} мкс/запрос")
+    print(f"с метриками: {best_instrumented:8.1f} мкс/запрос")
+    print(f"накладные:   {overhead:8.1f} мкс/запрос ({overhead / best_plain * 100:.1f}%)")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
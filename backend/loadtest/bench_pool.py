@@ -0,0 +1,120 @@
+"""
+Влияние размера пула соединений на задержку /api/statistics/summary.
+
+Для каждого размера пула создается отдельный DatabaseManager (без
+overflow), сессия запроса приложения подменяется сессией этого пула,
+и concurrency клиентов одновременно запрашивают сводку через ASGI,
+без сети. Печатаются p50/p99 сводки и ожидание соединения из пула:
+пока пул меньше числа одновременных запросов, задержка растет за счет
+ожидания, а с пулом больше ядер Postgres - за счет самой БД.
+
+Нужны данные generate_data; ограничение частоты на время замера
+выключается.
+
+Запуск из каталога backend:
+    python -m loadtest.bench_pool --sizes 2 5 10 20 --concurrency 20 --requests 10
+"""
+
+import argparse
+import asyncio
+import time
+from typing import List
+
+import httpx
+from sqlalchemy import select
+
+from src.activitywatch.config import cfg
+from src.activitywatch.core.rate_limit import rate_limiter
+from src.activitywatch.core.security import create_access_token
+from src.activitywatch.database.db_manager import DatabaseManager
+from src.activitywatch.database.models import User
+from src.activitywatch.loader import db_manager, get_db_read_session
+from src.activitywatch.main import app
+
+from loadtest.generate_data import PREFIX
+from loadtest.load_driver import percentile
+
+
+async def find_user_token() -> str:
+    async with db_manager.get_session() as session:
+        user = (
+            await session.execute(
+                select(User).where(User.email.like(f"{PREFIX}%")).order_by(User.id).limit(1)
+            )
+        ).scalar_one_or_none()
+    if user is None:
+        raise SystemExit("Нет пользователей loadtest: сначала python -m loadtest.generate_data")
+    return create_access_token({"sub": user.email, "user_id": user.id, "type": "access"})
+
+
+async def run(pool_size: int, token: str, concurrency: int, requests: int, period: str) -> dict:
+    manager = DatabaseManager(
+        cfg.database.async_url,
+        pool_size=pool_size,
+        max_overflow=0,
+        pool_timeout=120,
+        statement_cache_size=cfg.database.statement_cache_size,
+        name=f"bench_{pool_size}",
+    )
+
+    async def session_override():
+        async with manager.get_session() as session:
+            yield session
+
+    app.dependency_overrides[get_db_read_session] = session_override
+    await manager.warm_up(pool_size)
+
+    latencies: List[float] = []
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(
+        transport=transport, base_url="http://bench", cookies={"token": token}
+    ) as client:
+
+        async def worker():
+            for _ in range(requests):
+                started = time.perf_counter()
+                response = await client.get("/api/statistics/summary", params={"period": period})
+                response.raise_for_status()
+                latencies.append((time.perf_counter() - started) * 1000)
+
+        started = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+        elapsed = time.perf_counter() - started
+
+    app.dependency_overrides.pop(get_db_read_session, None)
+    wait = manager.query_stats.pool_wait_ms.summary()
+    await manager.engine.dispose()
+
+    latencies.sort()
+    return {
+        "p50": percentile(latencies, 50),
+        "p99": percentile(latencies, 99),
+        "rps": len(latencies) / elapsed,
+        "wait_p99": wait["p99"],
+    }
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="Размер пула и задержка /summary")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[2, 5, 10, 20])
+    parser.add_argument("--concurrency", type=int, default=20)
+    parser.add_argument("--requests", type=int, default=10, help="Запросов на клиента")
+    parser.add_argument("--period", default="month")
+    args = parser.parse_args()
+
+    rate_limiter.enabled = False
+    token = await find_user_token()
+
+    print(f"одновременных запросов: {args.concurrency}")
+    for size in args.sizes:
+        result = await run(size, token, args.concurrency, args.requests, args.period)
+        print(
+            f"пул {size:3}  p50 {result['p50']:8.1f} мс  p99 {result['p99']:8.1f} мс  "
+            f"{result['rps']:6.1f} запр/с  ожидание пула p99 {result['wait_p99']} мс"
+        )
+
+    await db_manager.engine.dispose()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
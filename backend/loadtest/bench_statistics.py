@@ -0,0 +1,295 @@
+"""
+Микробенчмарк методов StatisticsCRUD на наборах данных разного размера.
+
+Для каждого набора (10k / 1m / 10m событий у одного пользователя) и
+каждого периода (7 / 30 / 90 / 365 дней) вызывается каждый метод
+StatisticsCRUD. Замеряются медиана и p95 времени вызова, количество SQL
+запросов, а для каждого запроса сохраняется план
+EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON) в каталог артефактов.
+
+Наборы создаются отдельными пользователями с префиксом loadbench_,
+чтобы не смешиваться с данными нагрузочного драйвера.
+
+Запуск из каталога backend:
+    python -m loadtest.bench_statistics --prepare --sizes 10k,1m
+    python -m loadtest.bench_statistics --sizes 10k,1m --save-baseline stats_baseline.json
+    python -m loadtest.bench_statistics --sizes 10k,1m --compare stats_baseline.json
+
+Регрессией считается рост медианы сверх допуска (и не меньше --min-delta-ms)
+или появление Seq Scan по таблице, которой не было в плане базовой линии.
+При регрессии код выхода 1.
+"""
+
+import argparse
+import asyncio
+import json
+import random
+import statistics
+import sys
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Set, Tuple
+
+import asyncpg
+from sqlalchemy import event
+
+from src.activitywatch.config import cfg
+from src.activitywatch.loader import db, db_manager
+
+from loadtest.generate_data import create_users_and_devices, load_events, reset
+from loadtest.load_driver import percentile
+
+BENCH_PREFIX = "loadbench_"
+
+SIZES = {"10k": 10_000, "1m": 1_000_000, "10m": 10_000_000}
+PERIODS = (7, 30, 90, 365)
+TREND_PERIODS = {7: "week", 30: "month"}
+
+# Метод StatisticsCRUD -> (вызов для user_id и days, поддерживаемые периоды)
+CASES: Dict[str, Tuple[Callable, Tuple[int, ...]]] = {
+    "get_overview_stats": (lambda s, user, days: s.get_overview_stats(user, days), PERIODS),
+    "get_daily_activity_chart": (
+        lambda s, user, days: s.get_daily_activity_chart(user, days), PERIODS
+    ),
+    "get_platform_distribution": (
+        lambda s, user, days: s.get_platform_distribution(user, days), PERIODS
+    ),
+    "get_top_apps": (lambda s, user, days: s.get_top_apps(user, 10, days), PERIODS),
+    "get_hourly_activity": (lambda s, user, days: s.get_hourly_activity(user, days), PERIODS),
+    "get_category_distribution": (
+        lambda s, user, days: s.get_category_distribution(user, days), PERIODS
+    ),
+    "get_trends": (
+        lambda s, user, days: s.get_trends(user, TREND_PERIODS[days]),
+        tuple(TREND_PERIODS),
+    ),
+}
+
+
+class StatementCapture:
+    """Собирает SQL запросы, отправленные движком, пока включен сбор."""
+
+    def __init__(self, engine):
+        self.enabled = False
+        self.statements: List[Tuple[str, tuple]] = []
+        event.listen(engine.sync_engine, "before_cursor_execute", self._on_execute)
+
+    def _on_execute(self, conn, cursor, statement, parameters, context, executemany):
+        if self.enabled:
+            self.statements.append((statement, tuple(parameters or ())))
+
+    def start(self):
+        self.statements = []
+        self.enabled = True
+
+    def stop(self) -> List[Tuple[str, tuple]]:
+        self.enabled = False
+        return self.statements
+
+
+def _fixture_prefix(size: str) -> str:
+    return f"{BENCH_PREFIX}{size}_"
+
+
+async def fixture_user(conn: asyncpg.Connection, size: str) -> Optional[int]:
+    return await conn.fetchval(
+        "SELECT id FROM users WHERE email = $1", f"{_fixture_prefix(size)}1@example.com"
+    )
+
+
+async def prepare(conn: asyncpg.Connection, sizes: List[str], years: float, devices: int):
+    """Создает недостающие наборы: один пользователь на набор."""
+    for size in sizes:
+        if await fixture_user(conn, size):
+            print(f"Набор {size} уже есть")
+            continue
+        print(f"Создание набора {size} ({SIZES[size]:,} событий)")
+        rng = random.Random(size)
+        device_rows = await create_users_and_devices(
+            conn, rng, 1, devices, prefix=_fixture_prefix(size)
+        )
+        await load_events(conn, rng, device_rows, SIZES[size], years, 50_000)
+    await conn.execute("ANALYZE users, devices, activity_events")
+
+
+def _plan_summary(plan: Dict) -> Dict:
+    """Время выполнения, буферы и сканирования из плана FORMAT JSON."""
+    scans: Set[str] = set()
+
+    def walk(node: Dict):
+        if "Scan" in node.get("Node Type", "") and node.get("Relation Name"):
+            scans.add(f"{node['Node Type']} on {node['Relation Name']}")
+        for child in node.get("Plans", []):
+            walk(child)
+
+    root = plan["Plan"]
+    walk(root)
+    return {
+        "execution_ms": plan.get("Execution Time"),
+        "planning_ms": plan.get("Planning Time"),
+        "shared_hit": root.get("Shared Hit Blocks", 0),
+        "shared_read": root.get("Shared Read Blocks", 0),
+        "scans": sorted(scans),
+    }
+
+
+async def explain(
+    conn: asyncpg.Connection, statements: List[Tuple[str, tuple]], artifact: Path
+) -> List[Dict]:
+    """Выполняет EXPLAIN ANALYZE для каждого запроса и сохраняет планы."""
+    plans = []
+    summaries = []
+    for statement, parameters in statements:
+        raw = await conn.fetchval(
+            f"EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON) {statement}", *parameters
+        )
+        plan = (json.loads(raw) if isinstance(raw, str) else raw)[0]
+        plans.append({"statement": statement, "parameters": [str(p) for p in parameters], "plan": plan})
+        summaries.append(_plan_summary(plan))
+
+    artifact.parent.mkdir(parents=True, exist_ok=True)
+    artifact.write_text(json.dumps(plans, indent=2, ensure_ascii=False))
+    return summaries
+
+
+async def bench_case(
+    capture: StatementCapture,
+    conn: asyncpg.Connection,
+    name: str,
+    user_id: int,
+    days: int,
+    repeats: int,
+    artifact: Path,
+) -> Optional[Dict]:
+    call, supported = CASES[name]
+    if days not in supported:
+        return None
+
+    # Прогрев и сбор запросов для EXPLAIN
+    capture.start()
+    await call(db.statistics, user_id, days)
+    statements = capture.stop()
+
+    timings = []
+    for _ in range(repeats):
+        started = time.perf_counter()
+        await call(db.statistics, user_id, days)
+        timings.append((time.perf_counter() - started) * 1000)
+    timings.sort()
+
+    plans = await explain(conn, statements, artifact)
+    return {
+        "median_ms": round(statistics.median(timings), 2),
+        "p95_ms": round(percentile(timings, 95), 2),
+        "min_ms": round(timings[0], 2),
+        "queries": len(statements),
+        "db_execution_ms": round(sum(p["execution_ms"] or 0 for p in plans), 2),
+        "shared_hit": sum(p["shared_hit"] for p in plans),
+        "shared_read": sum(p["shared_read"] for p in plans),
+        "scans": sorted({scan for p in plans for scan in p["scans"]}),
+    }
+
+
+def compare(current: Dict, baseline: Dict, tolerance: float, min_delta_ms: float) -> List[str]:
+    """Регрессии времени и новые Seq Scan относительно базовой линии."""
+    regressions = []
+    for key, base in baseline.get("results", {}).items():
+        stats = current["results"].get(key)
+        if not stats:
+            continue
+        delta = stats["median_ms"] - base["median_ms"]
+        if delta > min_delta_ms and stats["median_ms"] > base["median_ms"] * (1 + tolerance):
+            regressions.append(f"{key}: медиана {base['median_ms']} -> {stats['median_ms']} мс")
+        new_seq_scans = [
+            scan for scan in stats["scans"]
+            if scan.startswith("Seq Scan") and scan not in base.get("scans", [])
+        ]
+        if new_seq_scans:
+            regressions.append(f"{key}: новый план {', '.join(new_seq_scans)}")
+    return regressions
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="Бенчмарк StatisticsCRUD")
+    parser.add_argument("--sizes", default="10k,1m", help=f"Наборы через запятую: {', '.join(SIZES)}")
+    parser.add_argument("--periods", default=",".join(map(str, PERIODS)), help="Периоды в днях")
+    parser.add_argument("--methods", help="Только указанные методы через запятую")
+    parser.add_argument("--repeats", type=int, default=5)
+    parser.add_argument("--prepare", action="store_true", help="Создать недостающие наборы")
+    parser.add_argument("--reset", action="store_true", help="Удалить наборы перед созданием")
+    parser.add_argument("--years", type=float, default=1.5, help="Глубина истории наборов")
+    parser.add_argument("--devices", type=float, default=4, help="Устройств в наборе")
+    parser.add_argument("--artifacts", default="bench_artifacts", help="Каталог для планов")
+    parser.add_argument("--save-baseline", help="Сохранить результат как базовую линию")
+    parser.add_argument("--compare", help="Сравнить с базовой линией")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="Допуск регрессии (доля)")
+    parser.add_argument("--min-delta-ms", type=float, default=2.0, help="Порог шума, мс")
+    args = parser.parse_args()
+
+    sizes = [s.strip() for s in args.sizes.split(",") if s.strip()]
+    unknown = [s for s in sizes if s not in SIZES]
+    if unknown:
+        parser.error(f"Неизвестные наборы: {', '.join(unknown)}")
+    periods = [int(p) for p in args.periods.split(",")]
+    methods = args.methods.split(",") if args.methods else list(CASES)
+
+    artifacts = Path(args.artifacts)
+    capture = StatementCapture(db_manager.engine)
+    conn = await asyncpg.connect(cfg.database.url)
+    results: Dict[str, Dict] = {}
+    try:
+        if args.reset:
+            await reset(conn, BENCH_PREFIX)
+        if args.prepare:
+            await prepare(conn, sizes, args.years, args.devices)
+
+        for size in sizes:
+            user_id = await fixture_user(conn, size)
+            if user_id is None:
+                print(f"Набора {size} нет: запустите с --prepare")
+                sys.exit(2)
+            for name in methods:
+                for days in periods:
+                    key = f"{size}/{name}/{days}"
+                    stats = await bench_case(
+                        capture, conn, name, user_id, days, args.repeats,
+                        artifacts / size / f"{name}_{days}d.json",
+                    )
+                    if stats is None:
+                        continue
+                    results[key] = stats
+                    print(
+                        f"{key:<45} медиана {stats['median_ms']:>9.2f} мс  "
+                        f"p95 {stats['p95_ms']:>9.2f} мс  запросов {stats['queries']}  "
+                        f"буферов {stats['shared_hit'] + stats['shared_read']}"
+                    )
+    finally:
+        await conn.close()
+        await db_manager.engine.dispose()
+
+    report = {
+        "created_at": datetime.now(timezone.utc).isoformat(),
+        "params": {"repeats": args.repeats},
+        "results": results,
+    }
+    artifacts.mkdir(parents=True, exist_ok=True)
+    (artifacts / "results.json").write_text(json.dumps(report, indent=2, ensure_ascii=False))
+
+    if args.save_baseline:
+        Path(args.save_baseline).write_text(json.dumps(report, indent=2, ensure_ascii=False))
+        print(f"Базовая линия сохранена: {args.save_baseline}")
+
+    if args.compare:
+        baseline = json.loads(Path(args.compare).read_text())
+        regressions = compare(report, baseline, args.tolerance, args.min_delta_ms)
+        if regressions:
+            print("\nРегрессии:")
+            for line in regressions:
+                print(f"  {line}")
+            sys.exit(1)
+        print("\nРегрессий нет")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
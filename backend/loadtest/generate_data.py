@@ -0,0 +1,343 @@
+"""
+Генератор нагрузочных данных для локального PostgreSQL.
+
+Создает пользователей, устройства и события окон с реалистичным
+распределением: популярность приложений по закону Ципфа, суточный
+профиль активности (рабочие часы, обед, вечер), меньшая активность
+в выходные, многолетний период. События загружаются через COPY.
+
+Все созданные записи помечены префиксом loadtest_ и удаляются флагом --reset.
+
+Запуск из каталога backend:
+    python -m loadtest.generate_data --users 200 --devices-per-user 5 --events 10000000 --years 2
+"""
+
+import argparse
+import asyncio
+import json
+import random
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Iterator, List, Tuple
+
+import asyncpg
+
+from src.activitywatch.config import cfg
+from src.activitywatch.core.security import get_password_hash
+from src.activitywatch.database.models import DevicePlatform, WINDOW_EVENT_TYPE
+
+PREFIX = "loadtest_"
+PASSWORD = "loadtest-password"
+
+# Приложения в порядке популярности: (название, шаблон заголовка, есть ли URL)
+APPS = [
+    ("chrome", "{} - Google Chrome", True),
+    ("code", "{} - Visual Studio Code", False),
+    ("firefox", "{} — Mozilla Firefox", True),
+    ("slack", "Slack | {}", False),
+    ("telegram", "Telegram: {}", False),
+    ("terminal", "bash: ~/{}", False),
+    ("pycharm", "{} – PyCharm", False),
+    ("explorer", "Проводник: {}", False),
+    ("zoom", "Zoom Meeting {}", False),
+    ("outlook", "Входящие - {}", False),
+    ("spotify", "Spotify - {}", False),
+    ("excel", "{}.xlsx - Excel", False),
+    ("word", "{}.docx - Word", False),
+    ("discord", "Discord | {}", False),
+    ("teams", "Microsoft Teams - {}", False),
+    ("edge", "{} - Microsoft Edge", True),
+    ("notion", "Notion - {}", False),
+    ("figma", "{} – Figma", False),
+    ("vlc", "{} - VLC media player", False),
+    ("postman", "Postman - {}", False),
+    ("dbeaver", "DBeaver - {}", False),
+    ("obsidian", "{} - Obsidian", False),
+    ("steam", "Steam - {}", False),
+    ("whatsapp", "WhatsApp - {}", False),
+]
+TOPICS = ["project", "report", "inbox", "docs", "review", "planning", "music", "news", "chat", "main.py"]
+DOMAINS = ["github.com", "stackoverflow.com", "youtube.com", "docs.python.org", "mail.google.com", "habr.com"]
+
+# Вероятность активности по часам суток (UTC)
+HOURLY_PROFILE = [
+    0.02, 0.01, 0.01, 0.01, 0.01, 0.02, 0.05, 0.15,
+    0.45, 0.80, 0.90, 0.90, 0.55, 0.70, 0.90, 0.90,
+    0.85, 0.70, 0.45, 0.35, 0.35, 0.30, 0.15, 0.05,
+]
+WEEKEND_FACTOR = 0.35
+
+PLATFORMS = [
+    (DevicePlatform.WINDOWS, 0.55),
+    (DevicePlatform.MACOS, 0.20),
+    (DevicePlatform.LINUX, 0.15),
+    (DevicePlatform.ANDROID, 0.07),
+    (DevicePlatform.IOS, 0.03),
+]
+
+EVENT_COLUMNS = (
+    "device_id",
+    "event_id",
+    "bucket_id",
+    "event_type",
+    "timestamp",
+    "duration_seconds",
+    "app",
+    "window_title",
+    "url",
+    "data",
+    "created_at",
+)
+
+
+def _zipf_weights(n: int, s: float = 1.1) -> List[float]:
+    return [1 / (rank ** s) for rank in range(1, n + 1)]
+
+
+def expected_active_hours(days: int) -> float:
+    """Ожидаемое число активных часов устройства за период."""
+    weekly = sum(HOURLY_PROFILE) * (5 + 2 * WEEKEND_FACTOR)
+    return weekly * days / 7
+
+
+def generate_device_events(
+    rng: random.Random,
+    device_pk: int,
+    bucket_id: str,
+    start: datetime,
+    days: int,
+    events_target: int,
+) -> Iterator[Tuple]:
+    """
+    События одного устройства: по часам с суточным профилем, события
+    внутри часа идут подряд с логнормальной длительностью.
+    """
+    app_weights = _zipf_weights(len(APPS))
+    per_hour = max(1.0, events_target / max(1.0, expected_active_hours(days)))
+    event_id = 0
+    created_at = datetime.now(timezone.utc)
+
+    for day in range(days):
+        day_start = start + timedelta(days=day)
+        factor = WEEKEND_FACTOR if day_start.weekday() >= 5 else 1.0
+        for hour in range(24):
+            if rng.random() > HOURLY_PROFILE[hour] * factor:
+                continue
+
+            count = max(1, int(rng.gauss(per_hour, per_hour * 0.2)))
+            # Доля часа, занятая активностью
+            busy = 3600 * rng.uniform(0.5, 0.95)
+            raw = [rng.lognormvariate(0, 1) for _ in range(count)]
+            scale = busy / sum(raw)
+            offset = rng.uniform(0, 3600 - busy)
+            app_index = None
+
+            for weight in raw:
+                duration = weight * scale
+                # Переключения между приложениями случаются не на каждом событии
+                if app_index is None or rng.random() < 0.6:
+                    app_index = rng.choices(range(len(APPS)), app_weights)[0]
+                app, title_template, has_url = APPS[app_index]
+                topic = rng.choice(TOPICS)
+                title = title_template.format(topic)
+                url = f"https://{rng.choice(DOMAINS)}/{topic}" if has_url else None
+                data = {"app": app, "title": title}
+                if url:
+                    data["url"] = url
+
+                event_id += 1
+                timestamp = day_start + timedelta(hours=hour, seconds=offset)
+                offset += duration
+                yield (
+                    device_pk,
+                    str(event_id),
+                    bucket_id,
+                    WINDOW_EVENT_TYPE,
+                    timestamp,
+                    round(duration, 3),
+                    app,
+                    title,
+                    url,
+                    json.dumps(data),
+                    created_at,
+                )
+
+
+async def reset(conn: asyncpg.Connection, prefix: str = PREFIX):
+    """Удаляет ранее сгенерированные данные (каскадно с устройствами и событиями)."""
+    deleted = await conn.execute("DELETE FROM users WHERE email LIKE $1", f"{prefix}%")
+    print(f"Удалены данные прошлой генерации: {deleted}")
+
+
+async def create_users_and_devices(
+    conn: asyncpg.Connection,
+    rng: random.Random,
+    users: int,
+    devices_per_user: float,
+    prefix: str = PREFIX,
+) -> List[Tuple[int, str]]:
+    """
+    Создает пользователей и устройства.
+
+    Args:
+        prefix: Префикс email, device_id и hostname создаваемых записей
+
+    Returns:
+        List[Tuple[int, str]]: (id устройства, bucket_id окон)
+    """
+    password_hash = get_password_hash(PASSWORD)  # один хэш на всех: Argon2 медленный
+    user_ids = await conn.fetch(
+        """
+        INSERT INTO users (email, username, password_hash, is_active, is_verified, settings)
+        SELECT $1 || g || '@example.com', $1 || g, $2, true, true, '{}'
+        FROM generate_series(1, $3::int) AS g
+        RETURNING id
+        """,
+        prefix,
+        password_hash,
+        users,
+    )
+
+    rows = []
+    for user_index, record in enumerate(user_ids, start=1):
+        # Количество устройств у пользователя варьируется вокруг среднего
+        count = max(1, int(rng.gauss(devices_per_user, devices_per_user * 0.3)))
+        for device_index in range(1, count + 1):
+            platform = rng.choices(
+                [p for p, _ in PLATFORMS], [w for _, w in PLATFORMS]
+            )[0]
+            hostname = f"{prefix}host-{user_index}-{device_index}"
+            rows.append(
+                (
+                    record["id"],
+                    f"{prefix}{user_index}-{device_index}",
+                    hostname,
+                    platform.name,
+                    platform.value,
+                    hostname,
+                    platform.value,
+                )
+            )
+
+    devices = await conn.fetch(
+        """
+        INSERT INTO devices (user_id, device_id, device_name, platform, platform_name,
+                             hostname, system, is_active, sync_enabled, meta_data)
+        SELECT r.user_id, r.device_id, r.device_name, r.platform, r.platform_name,
+               r.hostname, r.system, true, true, '{}'
+        FROM unnest($1::int[], $2::text[], $3::text[], $4::text[], $5::text[],
+                    $6::text[], $7::text[])
+             AS r(user_id, device_id, device_name, platform, platform_name, hostname, system)
+        RETURNING id, hostname
+        """,
+        *[list(column) for column in zip(*rows)],
+    )
+    await conn.execute(
+        """
+        UPDATE users SET devices_count = d.count
+        FROM (SELECT user_id, count(*) AS count FROM devices GROUP BY user_id) AS d
+        WHERE d.user_id = users.id AND users.email LIKE $1 || '%'
+        """,
+        prefix,
+    )
+    return [(d["id"], f"aw-watcher-window_{d['hostname']}") for d in devices]
+
+
+async def load_events(
+    conn: asyncpg.Connection,
+    rng: random.Random,
+    devices: List[Tuple[int, str]],
+    events: int,
+    years: float,
+    chunk_size: int,
+):
+    """Загружает события всех устройств пачками через COPY."""
+    days = max(1, int(years * 365))
+    start = (datetime.now(timezone.utc) - timedelta(days=days)).replace(
+        hour=0, minute=0, second=0, microsecond=0
+    )
+    # Активность устройств неравномерна: часть устройств используется редко
+    shares = [rng.paretovariate(1.5) for _ in devices]
+    total_share = sum(shares)
+
+    loaded = 0
+    started = time.monotonic()
+    buffer = []
+    for (device_pk, bucket_id), share in zip(devices, shares):
+        target = int(events * share / total_share)
+        for row in generate_device_events(rng, device_pk, bucket_id, start, days, target):
+            buffer.append(row)
+            if len(buffer) >= chunk_size:
+                await conn.copy_records_to_table(
+                    "activity_events", records=buffer, columns=EVENT_COLUMNS
+                )
+                loaded += len(buffer)
+                buffer = []
+                rate = loaded / (time.monotonic() - started)
+                print(f"\rЗагружено {loaded:,} событий ({rate:,.0f}/с)", end="", flush=True)
+
+    if buffer:
+        await conn.copy_records_to_table("activity_events", records=buffer, columns=EVENT_COLUMNS)
+        loaded += len(buffer)
+    print(f"\rЗагружено {loaded:,} событий за {time.monotonic() - started:.0f} с")
+
+
+async def refresh_device_stats(conn: asyncpg.Connection, prefix: str = PREFIX):
+    """Пересчитывает device_stats устройств loadtest: COPY минует прием событий."""
+    await conn.execute(
+        """
+        INSERT INTO device_stats (
+            device_id, stats_date, today_seconds, total_events, first_event_at, last_event_at
+        )
+        SELECT d.id, (now() AT TIME ZONE 'UTC')::date,
+               COALESCE(sum(e.duration_seconds) FILTER (
+                   WHERE e.event_type = 'currentwindow'
+                     AND e.timestamp >= date_trunc('day', now() AT TIME ZONE 'UTC') AT TIME ZONE 'UTC'
+               ), 0),
+               count(e.id), min(e.timestamp), max(e.timestamp)
+        FROM devices d
+        LEFT JOIN activity_events e ON e.device_id = d.id
+        WHERE d.device_id LIKE $1 || '%'
+        GROUP BY d.id
+        ON CONFLICT (device_id) DO UPDATE SET
+            stats_date = excluded.stats_date,
+            today_seconds = excluded.today_seconds,
+            total_events = excluded.total_events,
+            first_event_at = excluded.first_event_at,
+            last_event_at = excluded.last_event_at
+        """,
+        prefix,
+    )
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="Генератор нагрузочных данных")
+    parser.add_argument("--users", type=int, default=200)
+    parser.add_argument("--devices-per-user", type=float, default=5)
+    parser.add_argument("--events", type=int, default=1_000_000, help="Всего событий")
+    parser.add_argument("--years", type=float, default=1.0, help="Глубина истории в годах")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--chunk-size", type=int, default=50_000)
+    parser.add_argument("--reset", action="store_true", help="Удалить данные прошлой генерации")
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    conn = await asyncpg.connect(cfg.database.url)
+    try:
+        if args.reset:
+            await reset(conn)
+
+        devices = await create_users_and_devices(conn, rng, args.users, args.devices_per_user)
+        print(f"Создано пользователей: {args.users}, устройств: {len(devices)}")
+
+        await load_events(conn, rng, devices, args.events, args.years, args.chunk_size)
+        await refresh_device_stats(conn)
+
+        print("ANALYZE...")
+        await conn.execute("ANALYZE users, devices, device_stats, activity_events")
+    finally:
+        await conn.close()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,394 @@
+"""
+Нагрузочный драйвер: смешанный трафик приема событий и дашборда.
+
+Устройства и пользователи берутся из данных generate_data (префикс loadtest_).
+Каждый виртуальный клиент в цикле выбирает операцию:
+    ingest    - handshake протокола v2 (один раз на сессию устройства)
+                и receive_batch с новыми событиями
+    dashboard - GET одного из эндпоинтов /api/statistics со случайным периодом
+
+По каждому эндпоинту считаются p50/p95/p99, пропускная способность и ошибки.
+Параллельно снимается загрузка пула: число соединений сервера в
+pg_stat_activity относительно pool_size + max_overflow.
+
+Результат сохраняется в файл базовой линии и сравнивается с ним:
+    python -m loadtest.load_driver --duration 60 --concurrency 50 --save-baseline baseline.json
+    python -m loadtest.load_driver --duration 60 --concurrency 50 --compare baseline.json
+
+При регрессии p95 или пропускной способности сверх допуска код выхода 1.
+"""
+
+import argparse
+import asyncio
+import json
+import random
+import sys
+import time
+from collections import defaultdict
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List, Optional, Tuple
+
+import asyncpg
+import httpx
+
+from src.activitywatch.config import cfg
+from src.activitywatch.core.security import create_access_token
+from src.activitywatch.database.models import WINDOW_EVENT_TYPE
+
+from loadtest.generate_data import APPS, PREFIX, TOPICS
+
+# Эндпоинты дашборда: (метка, путь, генератор параметров, вес)
+DASHBOARD = [
+    ("overview", "/api/statistics/overview", lambda r: {"days": r.choice([1, 7, 30])}, 20),
+    ("daily-chart", "/api/statistics/daily-chart", lambda r: {"days": r.choice([7, 30])}, 15),
+    ("top-apps", "/api/statistics/top-apps", lambda r: {"days": r.choice([7, 30]), "limit": 10}, 15),
+    ("summary", "/api/statistics/summary", lambda r: {"period": r.choice(["week", "month", "quarter", "year"])}, 15),
+    ("hourly-heatmap", "/api/statistics/hourly-heatmap", lambda r: {"days": r.choice([7, 30])}, 10),
+    ("platform-distribution", "/api/statistics/platform-distribution", lambda r: {"days": 30}, 5),
+    ("category-distribution", "/api/statistics/category-distribution", lambda r: {"days": r.choice([7, 30])}, 5),
+    ("trends", "/api/statistics/trends", lambda r: {"period": r.choice(["week", "month"])}, 5),
+    ("all-apps", "/api/statistics/all-apps", lambda r: {"period": r.choice(["week", "month"])}, 5),
+    ("daily-breakdown", None, None, 5),
+]
+
+
+def percentile(sorted_values: List[float], q: float) -> float:
+    """Перцентиль по методу ближайшего ранга."""
+    if not sorted_values:
+        return 0.0
+    rank = max(0, min(len(sorted_values) - 1, int(round(q / 100 * len(sorted_values))) - 1))
+    return sorted_values[rank]
+
+
+class Recorder:
+    """Задержки и ошибки по эндпоинтам."""
+
+    def __init__(self):
+        self.latencies: Dict[str, List[float]] = defaultdict(list)
+        self.errors: Dict[str, int] = defaultdict(int)
+        self.statuses: Dict[str, Dict[int, int]] = defaultdict(lambda: defaultdict(int))
+
+    def record(self, endpoint: str, seconds: float, status: Optional[int]):
+        self.latencies[endpoint].append(seconds)
+        if status is None or status >= 400:
+            self.errors[endpoint] += 1
+        self.statuses[endpoint][status or 0] += 1
+
+    def report(self, duration: float) -> Dict[str, Dict]:
+        result = {}
+        for endpoint, values in sorted(self.latencies.items()):
+            values = sorted(values)
+            result[endpoint] = {
+                "requests": len(values),
+                "errors": self.errors[endpoint],
+                "rps": round(len(values) / duration, 2),
+                "p50_ms": round(percentile(values, 50) * 1000, 1),
+                "p95_ms": round(percentile(values, 95) * 1000, 1),
+                "p99_ms": round(percentile(values, 99) * 1000, 1),
+                "max_ms": round(values[-1] * 1000, 1),
+                "statuses": dict(self.statuses[endpoint]),
+            }
+        return result
+
+
+class PoolSampler:
+    """
+    Периодически снимает число соединений сервера с БД.
+
+    Пул приложения изнутри процесса не виден, поэтому занятость
+    оценивается по pg_stat_activity: соединения с базой, кроме самого
+    сэмплера, в состоянии active / idle in transaction считаются занятыми.
+    """
+
+    def __init__(self, conn: asyncpg.Connection, capacity: int, interval: float = 0.5):
+        self.conn = conn
+        self.capacity = capacity
+        self.interval = interval
+        self.samples: List[Tuple[int, int]] = []
+
+    async def run(self, stop: asyncio.Event):
+        while not stop.is_set():
+            row = await self.conn.fetchrow(
+                """
+                SELECT count(*) AS total,
+                       count(*) FILTER (WHERE state IN ('active', 'idle in transaction')) AS busy
+                FROM pg_stat_activity
+                WHERE datname = current_database() AND pid <> pg_backend_pid()
+                """
+            )
+            self.samples.append((row["total"], row["busy"]))
+            try:
+                await asyncio.wait_for(stop.wait(), self.interval)
+            except asyncio.TimeoutError:
+                pass
+
+    def report(self) -> Dict:
+        if not self.samples:
+            return {}
+        busy = sorted(b for _, b in self.samples)
+        return {
+            "capacity": self.capacity,
+            "connections_max": max(t for t, _ in self.samples),
+            "busy_p50": percentile(busy, 50),
+            "busy_p95": percentile(busy, 95),
+            "busy_max": busy[-1],
+            "saturation_p95": round(percentile(busy, 95) / self.capacity, 3),
+            "saturated_share": round(
+                sum(1 for b in busy if b >= self.capacity) / len(busy), 3
+            ),
+        }
+
+
+class VirtualDevice:
+    """Устройство, отправляющее новые события по протоколу v2."""
+
+    def __init__(self, device_id: str, hostname: str, rng: random.Random):
+        self.device_id = device_id
+        self.bucket_id = f"aw-watcher-window_{hostname}"
+        self.rng = rng
+        self.session_id: Optional[int] = None
+        self.lock = asyncio.Lock()
+        self.sequence = 0
+        self.last_timestamp = datetime.now(timezone.utc)
+
+    def next_events(self, count: int) -> List[Dict]:
+        events = []
+        for _ in range(count):
+            self.sequence += 1
+            duration = round(self.rng.lognormvariate(2, 1), 3)
+            app, title_template, _ = self.rng.choice(APPS)
+            events.append(
+                {
+                    # Уникально между запусками драйвера
+                    "id": f"lt-{int(time.time())}-{self.sequence}",
+                    "timestamp": self.last_timestamp.isoformat(),
+                    "duration": duration,
+                    "data": {"app": app, "title": title_template.format(self.rng.choice(TOPICS))},
+                }
+            )
+            self.last_timestamp += timedelta(seconds=duration)
+        return events
+
+
+class LoadDriver:
+    def __init__(self, args, devices: List[asyncpg.Record], users: List[int]):
+        self.args = args
+        self.rng = random.Random(args.seed)
+        self.devices = [VirtualDevice(d["device_id"], d["hostname"], self.rng) for d in devices]
+        self.tokens = {
+            user["id"]: create_access_token(
+                {"sub": user["email"], "user_id": user["id"], "type": "access"},
+                expires_delta=timedelta(hours=12),
+            )
+            for user in users
+        }
+        self.user_ids = list(self.tokens)
+        self.recorder = Recorder()
+        self.client: Optional[httpx.AsyncClient] = None
+        self.next_slot = 0.0
+
+    async def _timed(self, endpoint: str, method: str, url: str, **kwargs) -> Optional[httpx.Response]:
+        started = time.perf_counter()
+        try:
+            response = await self.client.request(method, url, **kwargs)
+        except httpx.HTTPError:
+            self.recorder.record(endpoint, time.perf_counter() - started, None)
+            return None
+        self.recorder.record(endpoint, time.perf_counter() - started, response.status_code)
+        return response
+
+    async def ingest(self):
+        device = self.rng.choice(self.devices)
+        # Одно устройство не шлет пачки параллельно, как и настоящий клиент
+        async with device.lock:
+            if device.session_id is None:
+                response = await self._timed(
+                    "POST /tracker/handshake",
+                    "POST",
+                    "/tracker/handshake",
+                    json={"device_id": device.device_id, "buckets": [device.bucket_id]},
+                )
+                if response is None or response.status_code != 200:
+                    return
+                device.session_id = response.json()["session_id"]
+
+            response = await self._timed(
+                "POST /tracker/receive_batch",
+                "POST",
+                "/tracker/receive_batch",
+                json={
+                    "session_id": device.session_id,
+                    "bucket_id": device.bucket_id,
+                    "bucket_type": WINDOW_EVENT_TYPE,
+                    "events": device.next_events(self.args.batch_size),
+                },
+            )
+            if response is not None and response.status_code == 410:
+                device.session_id = None
+
+    async def dashboard(self):
+        user_id = self.rng.choice(self.user_ids)
+        label, path, params, _ = self.rng.choices(DASHBOARD, [d[3] for d in DASHBOARD])[0]
+        if path is None:
+            day = datetime.now(timezone.utc).date() - timedelta(days=self.rng.randint(0, 30))
+            path, query = f"/api/statistics/daily-breakdown/{day.isoformat()}", {}
+        else:
+            query = params(self.rng)
+        await self._timed(
+            f"GET /api/statistics/{label}",
+            "GET",
+            path,
+            params=query,
+            headers={"Cookie": f"token={self.tokens[user_id]}"},
+        )
+
+    async def _wait_slot(self):
+        """Открытая модель нагрузки: запросы не чаще --rate в секунду."""
+        if not self.args.rate:
+            return
+        now = time.monotonic()
+        slot = max(now, self.next_slot)
+        self.next_slot = slot + 1 / self.args.rate
+        if slot > now:
+            await asyncio.sleep(slot - now)
+
+    async def worker(self, deadline: float):
+        while time.monotonic() < deadline:
+            await self._wait_slot()
+            if self.rng.random() < self.args.ingest_share:
+                await self.ingest()
+            else:
+                await self.dashboard()
+
+    async def run(self, duration: float) -> float:
+        limits = httpx.Limits(max_connections=self.args.concurrency)
+        async with httpx.AsyncClient(
+            base_url=self.args.url, timeout=self.args.timeout, limits=limits
+        ) as self.client:
+            started = time.monotonic()
+            deadline = started + duration
+            await asyncio.gather(*(self.worker(deadline) for _ in range(self.args.concurrency)))
+            return time.monotonic() - started
+
+
+def compare(current: Dict, baseline: Dict, tolerance: float) -> List[str]:
+    """Регрессии относительно базовой линии: рост p95 и падение rps сверх допуска."""
+    regressions = []
+    for endpoint, base in baseline.get("endpoints", {}).items():
+        stats = current["endpoints"].get(endpoint)
+        if not stats:
+            continue
+        if base["p95_ms"] and stats["p95_ms"] > base["p95_ms"] * (1 + tolerance):
+            regressions.append(
+                f"{endpoint}: p95 {base['p95_ms']} -> {stats['p95_ms']} мс"
+            )
+        if base["rps"] and stats["rps"] < base["rps"] * (1 - tolerance):
+            regressions.append(f"{endpoint}: rps {base['rps']} -> {stats['rps']}")
+    return regressions
+
+
+def print_report(result: Dict):
+    print(f"\n{'эндпоинт':<45} {'запросов':>8} {'ошибок':>6} {'rps':>8} "
+          f"{'p50':>8} {'p95':>8} {'p99':>8}")
+    for endpoint, s in result["endpoints"].items():
+        print(
+            f"{endpoint:<45} {s['requests']:>8} {s['errors']:>6} {s['rps']:>8} "
+            f"{s['p50_ms']:>8} {s['p95_ms']:>8} {s['p99_ms']:>8}"
+        )
+    print(f"\nВсего: {result['total_rps']} запросов/с, {result['events_per_sec']} событий/с")
+    pool = result.get("pool")
+    if pool:
+        print(
+            f"Пул БД: занято p95 {pool['busy_p95']}/{pool['capacity']} "
+            f"(макс. {pool['busy_max']}, соединений {pool['connections_max']}), "
+            f"в насыщении {pool['saturated_share'] * 100:.0f}% времени"
+        )
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="Нагрузочный драйвер сервера")
+    parser.add_argument("--url", default="http://localhost:8000")
+    parser.add_argument("--duration", type=float, default=60, help="Длительность, сек")
+    parser.add_argument("--warmup", type=float, default=5, help="Прогрев без замера, сек")
+    parser.add_argument("--concurrency", type=int, default=50, help="Виртуальных клиентов")
+    parser.add_argument("--rate", type=float, help="Ограничение запросов в секунду")
+    parser.add_argument("--ingest-share", type=float, default=0.7, help="Доля операций приема")
+    parser.add_argument("--batch-size", type=int, default=100, help="Событий в receive_batch")
+    parser.add_argument("--devices", type=int, default=500, help="Устройств в нагрузке")
+    parser.add_argument("--timeout", type=float, default=30)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--save-baseline", help="Сохранить результат как базовую линию")
+    parser.add_argument("--compare", help="Сравнить с базовой линией")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="Допуск регрессии (доля)")
+    args = parser.parse_args()
+
+    conn = await asyncpg.connect(cfg.database.url)
+    try:
+        devices = await conn.fetch(
+            "SELECT device_id, hostname FROM devices WHERE device_id LIKE $1 "
+            "ORDER BY random() LIMIT $2",
+            f"{PREFIX}%",
+            args.devices,
+        )
+        users = await conn.fetch(
+            "SELECT id, email FROM users WHERE email LIKE $1", f"{PREFIX}%"
+        )
+        if not devices or not users:
+            print("Нет данных loadtest_: сначала запустите loadtest.generate_data")
+            sys.exit(2)
+
+        driver = LoadDriver(args, devices, users)
+        if args.warmup:
+            await driver.run(args.warmup)
+            driver.recorder = Recorder()
+
+        sampler = PoolSampler(conn, cfg.database.pool_size + cfg.database.max_overflow)
+        stop = asyncio.Event()
+        sampling = asyncio.create_task(sampler.run(stop))
+        elapsed = await driver.run(args.duration)
+        stop.set()
+        await sampling
+    finally:
+        await conn.close()
+
+    endpoints = driver.recorder.report(elapsed)
+    batches = endpoints.get("POST /tracker/receive_batch", {})
+    result = {
+        "params": {
+            "duration": args.duration,
+            "concurrency": args.concurrency,
+            "rate": args.rate,
+            "ingest_share": args.ingest_share,
+            "batch_size": args.batch_size,
+            "devices": len(devices),
+            "users": len(users),
+        },
+        "created_at": datetime.now(timezone.utc).isoformat(),
+        "total_rps": round(sum(s["requests"] for s in endpoints.values()) / elapsed, 2),
+        "events_per_sec": round(batches.get("rps", 0) * args.batch_size, 1),
+        "endpoints": endpoints,
+        "pool": sampler.report(),
+    }
+    print_report(result)
+
+    if args.save_baseline:
+        with open(args.save_baseline, "w") as f:
+            json.dump(result, f, indent=2, ensure_ascii=False)
+        print(f"Базовая линия сохранена: {args.save_baseline}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        if baseline.get("params") != result["params"]:
+            print("Внимание: параметры запуска отличаются от базовой линии")
+        regressions = compare(result, baseline, args.tolerance)
+        if regressions:
+            print("\nРегрессии:")
+            for line in regressions:
+                print(f"  {line}")
+            sys.exit(1)
+        print("\nРегрессий нет")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
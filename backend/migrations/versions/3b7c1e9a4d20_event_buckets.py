@@ -0,0 +1,32 @@
+"""event buckets
+
+Revision ID: 3b7c1e9a4d20
+Revises: 062bf198b680
+Create Date: 2026-10-19 09:12:31.402117
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '3b7c1e9a4d20'
+down_revision: Union[str, Sequence[str], None] = '062bf198b680'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('activity_events', sa.Column('bucket_id', sa.String(length=255), nullable=True, comment='ID bucket ActivityWatch'))
+    op.add_column('activity_events', sa.Column('event_type', sa.String(length=64), server_default='currentwindow', nullable=False, comment='Тип bucket ActivityWatch (currentwindow, afkstatus, ...)'))
+    op.create_index('ix_events_device_type_time', 'activity_events', ['device_id', 'event_type', 'timestamp'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_events_device_type_time', table_name='activity_events')
+    op.drop_column('activity_events', 'event_type')
+    op.drop_column('activity_events', 'bucket_id')
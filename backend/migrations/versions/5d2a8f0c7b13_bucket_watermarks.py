@@ -0,0 +1,27 @@
+"""bucket watermarks
+
+Revision ID: 5d2a8f0c7b13
+Revises: 3b7c1e9a4d20
+Create Date: 2026-10-19 11:40:05.218364
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = '5d2a8f0c7b13'
+down_revision: Union[str, Sequence[str], None] = '3b7c1e9a4d20'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_index('ix_events_device_bucket_time', 'activity_events', ['device_id', 'bucket_id', 'timestamp'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_events_device_bucket_time', table_name='activity_events')
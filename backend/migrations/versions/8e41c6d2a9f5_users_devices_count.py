@@ -0,0 +1,35 @@
+"""users devices count
+
+Revision ID: 8e41c6d2a9f5
+Revises: 5d2a8f0c7b13
+Create Date: 2026-10-19 14:05:47.631208
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '8e41c6d2a9f5'
+down_revision: Union[str, Sequence[str], None] = '5d2a8f0c7b13'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('users', sa.Column('devices_count', sa.Integer(), server_default=sa.text('0'), nullable=False, comment='Количество устройств (поддерживается DevicesCRUD)'))
+    op.execute(
+        """
+        UPDATE users SET devices_count = d.count
+        FROM (SELECT user_id, count(*) AS count FROM devices GROUP BY user_id) AS d
+        WHERE d.user_id = users.id
+        """
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_column('users', 'devices_count')
@@ -0,0 +1,69 @@
+"""device stats
+
+Revision ID: c4f7a2e91b36
+Revises: 8e41c6d2a9f5
+Create Date: 2026-10-19 16:20:12.904317
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c4f7a2e91b36'
+down_revision: Union[str, Sequence[str], None] = '8e41c6d2a9f5'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('device_stats',
+    sa.Column('device_id', sa.Integer(), nullable=False, comment='ID устройства'),
+    sa.Column('stats_date', sa.Date(), nullable=False, comment='День (UTC), к которому относится today_seconds'),
+    sa.Column('today_seconds', sa.Float(), server_default=sa.text('0'), nullable=False, comment='Время активности окон за stats_date, секунды'),
+    sa.Column('total_events', sa.BigInteger(), server_default=sa.text('0'), nullable=False, comment='Всего сохраненных событий'),
+    sa.Column('first_event_at', sa.DateTime(timezone=True), nullable=True, comment='Время самого раннего события'),
+    sa.Column('last_event_at', sa.DateTime(timezone=True), nullable=True, comment='Время самого позднего события'),
+    sa.Column('last_sync_session_id', sa.Integer(), nullable=True, comment='Последняя сессия синхронизации'),
+    sa.ForeignKeyConstraint(['device_id'], ['devices.id'], ondelete='CASCADE'),
+    sa.ForeignKeyConstraint(['last_sync_session_id'], ['sync_sessions.id'], ondelete='SET NULL'),
+    sa.PrimaryKeyConstraint('device_id'),
+    comment='Сводка по устройству, поддерживаемая приемом событий'
+    )
+    op.execute(
+        """
+        INSERT INTO device_stats (
+            device_id, stats_date, today_seconds, total_events,
+            first_event_at, last_event_at, last_sync_session_id
+        )
+        SELECT d.id, (now() AT TIME ZONE 'UTC')::date,
+               COALESCE(e.today_seconds, 0), COALESCE(e.total_events, 0),
+               e.first_event_at, e.last_event_at, s.last_sync_session_id
+        FROM devices d
+        LEFT JOIN (
+            SELECT device_id,
+                   count(*) AS total_events,
+                   min(timestamp) AS first_event_at,
+                   max(timestamp) AS last_event_at,
+                   sum(duration_seconds) FILTER (
+                       WHERE event_type = 'currentwindow'
+                         AND timestamp >= date_trunc('day', now() AT TIME ZONE 'UTC') AT TIME ZONE 'UTC'
+                   ) AS today_seconds
+            FROM activity_events
+            GROUP BY device_id
+        ) AS e ON e.device_id = d.id
+        LEFT JOIN (
+            SELECT device_id, max(id) AS last_sync_session_id
+            FROM sync_sessions
+            GROUP BY device_id
+        ) AS s ON s.device_id = d.id
+        """
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_table('device_stats')
@@ -0,0 +1,59 @@
+"""activity rollups and archive
+
+Revision ID: e7b3d95c2a48
+Revises: c4f7a2e91b36
+Create Date: 2026-10-19 18:02:41.517930
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e7b3d95c2a48'
+down_revision: Union[str, Sequence[str], None] = 'c4f7a2e91b36'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('activity_rollups_hourly',
+    sa.Column('device_id', sa.Integer(), nullable=False, comment='ID устройства'),
+    sa.Column('event_type', sa.String(length=64), nullable=False, comment='Тип bucket ActivityWatch'),
+    sa.Column('hour', sa.DateTime(timezone=True), nullable=False, comment='Начало часа (по времени событий)'),
+    sa.Column('app', sa.String(length=255), nullable=False, comment='Название приложения'),
+    sa.Column('duration_seconds', sa.Float(), nullable=False, comment='Суммарная длительность событий, секунды'),
+    sa.Column('event_count', sa.Integer(), nullable=False, comment='Количество событий'),
+    sa.ForeignKeyConstraint(['device_id'], ['devices.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('device_id', 'event_type', 'hour', 'app'),
+    comment='Почасовые итоги событий старше срока хранения'
+    )
+    op.create_table('activity_events_archive',
+    sa.Column('id', sa.Integer(), autoincrement=False, nullable=False, comment='ID события в activity_events'),
+    sa.Column('device_id', sa.Integer(), nullable=False, comment='ID устройства'),
+    sa.Column('event_id', sa.String(length=255), nullable=False),
+    sa.Column('bucket_id', sa.String(length=255), nullable=True),
+    sa.Column('event_type', sa.String(length=64), nullable=False),
+    sa.Column('timestamp', sa.DateTime(timezone=True), nullable=False),
+    sa.Column('duration_seconds', sa.Float(), nullable=False),
+    sa.Column('app', sa.String(length=255), nullable=False),
+    sa.Column('window_title', sa.Text(), nullable=True),
+    sa.Column('url', sa.Text(), nullable=True),
+    sa.Column('data', sa.JSON(), nullable=False),
+    sa.Column('created_at', sa.DateTime(timezone=True), nullable=False),
+    sa.Column('archived_at', sa.DateTime(timezone=True), server_default=sa.text('CURRENT_TIMESTAMP'), nullable=False, comment='Время переноса в архив'),
+    sa.ForeignKeyConstraint(['device_id'], ['devices.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('id'),
+    comment='Архив событий активности старше срока хранения'
+    )
+    op.create_index('ix_events_archive_device_time', 'activity_events_archive', ['device_id', 'timestamp'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_events_archive_device_time', table_name='activity_events_archive')
+    op.drop_table('activity_events_archive')
+    op.drop_table('activity_rollups_hourly')
@@ -12,7 +12,10 @@ from src.activitywatch.schemas.auth.schema import (
     UserRegister,
     UserLogin,
 )
-from src.activitywatch.core.security import create_access_token, decode_access_token
+from src.activitywatch.core.security import (
+    create_access_token,
+    get_current_user as get_principal,
+)
 from src.activitywatch.config import cfg
 
 router = APIRouter(prefix="/auth", tags=["authentication"])
@@ -245,75 +248,15 @@ async def login(user_data: UserLogin, response: Response):
 @router.post("/me")
 async def get_current_user(request: Request):
     """Получение информации о текущем пользователе через куки"""
-    try:
-        # Получаем токен из куки
-        token = request.cookies.get("token")
-      
-
-        if not token:
-            raise HTTPException(
-                status_code=status.HTTP_401_UNAUTHORIZED, detail="Не авторизован"
-            )
-
-        # Декодируем токен
-        payload = decode_access_token(token)
-        if not payload:
-            raise HTTPException(
-                status_code=status.HTTP_401_UNAUTHORIZED,
-                detail="Неверный или истекший токен",
-            )
-
-    
-
-        user_id = payload.get("user_id")
-        token_type = payload.get("type")
-
-        if not user_id:
-
-            raise HTTPException(
-                status_code=status.HTTP_401_UNAUTHORIZED,
-                detail="Неверный токен: отсутствует user_id",
-            )
-
-        if token_type != "access":
-            print(f"Неправильный тип токена: {token_type}")
-            raise HTTPException(
-                status_code=status.HTTP_401_UNAUTHORIZED, detail="Неверный тип токена"
-            )
-
-  
-
-        user = await db.users.get_user_by_id(user_id)
-
-        if not user:
-
-            raise HTTPException(
-                status_code=status.HTTP_404_NOT_FOUND, detail="Пользователь не найден"
-            )
-
-    
-
-        return {
-            "success": True,
-            "id": user.id,
-            "email": user.email,
-            "username": user.username,
-            "is_verified": user.is_verified,
-            "created_at": user.created_at.isoformat() if user.created_at else None,
-        }
-
-    except HTTPException as he:
-        print(f"HTTP Exception в /me: {he.detail}")
-        raise he
-    except Exception as e:
-        print(f"Ошибка в /me: {str(e)}")
-        import traceback
-
-        traceback.print_exc()
-        raise HTTPException(
-            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            detail="Ошибка сервера при получении данных пользователя",
-        )
+    user = await get_principal(request)
+    return {
+        "success": True,
+        "id": user["id"],
+        "email": user["email"],
+        "username": user["username"],
+        "is_verified": user["is_verified"],
+        "created_at": user["created_at"].isoformat() if user["created_at"] else None,
+    }
 
 
 @router.post("/logout")
@@ -0,0 +1,146 @@
+import asyncio
+import threading
+from typing import Any, Dict, Optional
+
+from fastapi import APIRouter, Depends, HTTPException, Query
+
+from src.activitywatch.core.profiling import (
+    MAX_PROFILE_SECONDS,
+    SamplingProfiler,
+    memory_snapshots,
+    profile_lock,
+    request_profiles,
+)
+from src.activitywatch.core.security import get_admin_user
+from src.activitywatch.loader import db_manager
+
+router = APIRouter(prefix="/debug", tags=["debug"])
+
+
+@router.get("/db-stats")
+async def get_db_stats(admin: dict = Depends(get_admin_user)) -> Dict[str, Any]:
+    """
+    Статистика SQL запросов по маршрутам: гистограммы времени (мс),
+    строк и запросов на HTTP запрос, ожидание пула и последние
+    медленные запросы.
+    """
+    pool = db_manager.engine.sync_engine.pool
+    return {
+        **db_manager.query_stats.snapshot(),
+        "pool": {
+            "size": pool.size(),
+            "checked_out": pool.checkedout(),
+            "overflow": pool.overflow(),
+        },
+    }
+
+
+@router.post("/db-stats/reset")
+async def reset_db_stats(admin: dict = Depends(get_admin_user)) -> Dict[str, Any]:
+    """Сбрасывает накопленную статистику SQL запросов"""
+    db_manager.query_stats.reset()
+    return {"status": "reset"}
+
+
+@router.post("/profile")
+async def profile_event_loop(
+    seconds: float = Query(10, gt=0, le=MAX_PROFILE_SECONDS),
+    interval_ms: float = Query(5, ge=1, le=100),
+    format: str = Query("speedscope", pattern="^(speedscope|collapsed)$"),
+    admin: dict = Depends(get_admin_user),
+) -> Dict[str, Any]:
+    """
+    Сэмплирующий профиль цикла событий за seconds секунд.
+
+    speedscope - JSON для https://www.speedscope.app, collapsed - стеки
+    для flamegraph.pl. Одновременно выполняется одно профилирование.
+    """
+    if not profile_lock.acquire(blocking=False):
+        raise HTTPException(409, "Профилирование уже выполняется")
+    try:
+        profiler = SamplingProfiler(
+            threading.get_ident(), interval=interval_ms / 1000
+        ).start()
+        await asyncio.sleep(seconds)
+        profile = await asyncio.to_thread(profiler.stop, f"event loop {seconds:g}s")
+    finally:
+        profile_lock.release()
+    return profile.to_dict(format)
+
+
+@router.get("/profiles")
+async def list_request_profiles(admin: dict = Depends(get_admin_user)):
+    """Профили отдельных запросов (заголовок X-Profile), новые первыми"""
+    return request_profiles.list()
+
+
+@router.get("/profiles/{profile_id}")
+async def get_request_profile(
+    profile_id: str,
+    format: str = Query("speedscope", pattern="^(speedscope|collapsed)$"),
+    admin: dict = Depends(get_admin_user),
+) -> Dict[str, Any]:
+    profile = request_profiles.get(profile_id)
+    if profile is None:
+        raise HTTPException(404, "Профиль не найден")
+    return profile.to_dict(format)
+
+
+@router.post("/tracemalloc/start")
+async def start_tracemalloc(
+    frames: int = Query(1, ge=1, le=50), admin: dict = Depends(get_admin_user)
+) -> Dict[str, Any]:
+    """Включает трассировку выделений памяти (замедляет выделения)"""
+    return memory_snapshots.start(frames)
+
+
+@router.post("/tracemalloc/stop")
+async def stop_tracemalloc(admin: dict = Depends(get_admin_user)) -> Dict[str, Any]:
+    """Выключает трассировку и удаляет снимки"""
+    return memory_snapshots.stop()
+
+
+@router.post("/tracemalloc/snapshot")
+async def take_tracemalloc_snapshot(
+    limit: int = Query(20, ge=1, le=500),
+    key_type: str = Query("lineno", pattern="^(lineno|filename|traceback)$"),
+    admin: dict = Depends(get_admin_user),
+) -> Dict[str, Any]:
+    """Снимок выделений памяти и самые крупные места выделения"""
+    try:
+        snapshot_id = memory_snapshots.take()
+    except RuntimeError as e:
+        raise HTTPException(409, str(e))
+    return {
+        "id": snapshot_id,
+        **memory_snapshots.status(),
+        "top": memory_snapshots.top(snapshot_id, limit, key_type),
+    }
+
+
+@router.get("/tracemalloc/diff")
+async def diff_tracemalloc_snapshots(
+    base: str,
+    target: Optional[str] = None,
+    limit: int = Query(20, ge=1, le=500),
+    key_type: str = Query("lineno", pattern="^(lineno|filename|traceback)$"),
+    admin: dict = Depends(get_admin_user),
+) -> Dict[str, Any]:
+    """
+    Рост памяти между снимками base и target.
+    Без target снимается новый снимок.
+    """
+    if base not in memory_snapshots.snapshots:
+        raise HTTPException(404, "Снимок base не найден")
+    if target is None:
+        try:
+            target = memory_snapshots.take()
+        except RuntimeError as e:
+            raise HTTPException(409, str(e))
+    elif target not in memory_snapshots.snapshots:
+        raise HTTPException(404, "Снимок target не найден")
+    return {
+        "base": base,
+        "target": target,
+        "diff": memory_snapshots.diff(base, target, limit, key_type),
+    }
@@ -104,7 +104,7 @@ async def get_device_tokens(
             status_code=status.HTTP_404_NOT_FOUND, detail="Устройство не найдено"
         )
 
-    tokens = await db.api_tokens.get_device_tokens(device_id, current_user["id"])
+    tokens = await db.tokens.get_device_tokens(device_id, current_user["id"])
     return tokens
 
 
@@ -122,7 +122,7 @@ async def revoke_token(
             status_code=status.HTTP_404_NOT_FOUND, detail="Устройство не найдено"
         )
 
-    success = await db.api_tokens.revoke_token(token_id, current_user["id"])
+    success = await db.tokens.revoke_token(token_id, current_user["id"], device_id)
 
     if not success:
         raise HTTPException(
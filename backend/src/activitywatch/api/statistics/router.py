@@ -1,28 +1,28 @@
-import asyncio
 from fastapi import APIRouter, Depends, HTTPException, Query
 from fastapi.responses import JSONResponse
+from sqlalchemy.ext.asyncio import AsyncSession
 from typing import Optional, List, Dict, Any
 from datetime import datetime, timedelta, timezone
 import logging
 
+from src.activitywatch.core.rate_limit import limit_statistics
 from src.activitywatch.core.security import get_current_user
 from src.activitywatch.database.db_manager import DatabaseManager
-from src.activitywatch.loader import db
+from src.activitywatch.loader import db, get_db_read_session
 from aiocache import cached
 from aiocache.serializers import JsonSerializer
 import time
-import asyncio
-from datetime import datetime, timezone
-from typing import Dict, Any
-from fastapi import Query, HTTPException
-import logging
 
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 logger.setLevel(logging.INFO) 
 
 
-router = APIRouter(prefix="/api/statistics", tags=["statistics"])
+router = APIRouter(
+    prefix="/api/statistics",
+    tags=["statistics"],
+    dependencies=[Depends(limit_statistics)],
+)
 
 
 @router.get("/overview")
@@ -221,6 +221,7 @@ async def get_detailed_daily_stats(
 async def get_complete_summary(
     period: str = Query("week", description="Период: week, month, quarter, year"),
     current_user: Dict = Depends(get_current_user),
+    session: AsyncSession = Depends(get_db_read_session),
 ) -> Dict[str, Any]:
     
     overall_start = time.time()
@@ -231,46 +232,19 @@ async def get_complete_summary(
     days = days_map.get(period.lower(), 7)
 
     try:
-        # Вспомогательная функция для замера времени выполнения корутины
-        async def timed_task(coro, task_name: str):
-            task_start = time.time()
-            logger.debug(f"Задача '{task_name}' стартовала")
-            try:
-                result = await coro
-                elapsed = time.time() - task_start
-                logger.info(f"Задача '{task_name}' завершена за {elapsed:.3f} с")
-                return result
-            except Exception as e:
-                elapsed = time.time() - task_start
-                logger.error(f"Задача '{task_name}' упала через {elapsed:.3f} с: {e}")
-                raise
-
-        # Собираем задачи без изменения существующих вызовов (сессии создаются внутри методов)
-        tasks = [
-            timed_task(db.statistics.get_overview_stats(user_id, days), "overview_stats"),
-            timed_task(db.statistics.get_daily_activity_chart(user_id, days), "daily_activity_chart"),
-            timed_task(db.statistics.get_platform_distribution(user_id, days), "platform_distribution"),
-            timed_task(db.statistics.get_top_apps(user_id, 5, days), "top_apps"),
-            timed_task(db.statistics.get_trends(user_id, period), "trends"),
-            timed_task(db.statistics.get_category_distribution(user_id, days), "category_distribution"),
-            timed_task(db.statistics.get_hourly_activity(user_id, days), "hourly_activity"),
-        ]
-
-        # Параллельный запуск
-        results = await asyncio.gather(*tasks)
-        (
-            overview,
-            chart_data,
-            platform_dist,
-            top_apps,
-            trends,
-            categories,
-            heatmap,
-        ) = results
+        # Все запросы идут в одной сессии запроса, то есть через одно
+        # соединение пула (реплики, если есть) и последовательно: раньше
+        # семь параллельных сессий занимали семь соединений на каждую сводку
+        overview = await db.statistics.get_overview_stats(user_id, days, session=session)
+        chart_data = await db.statistics.get_daily_activity_chart(user_id, days, session=session)
+        platform_dist = await db.statistics.get_platform_distribution(user_id, days, session=session)
+        top_apps = await db.statistics.get_top_apps(user_id, 5, days, session=session)
+        trends = await db.statistics.get_trends(user_id, period, session=session)
+        categories = await db.statistics.get_category_distribution(user_id, days, session=session)
+        heatmap = await db.statistics.get_hourly_activity(user_id, days, session=session)
 
         total_elapsed = time.time() - overall_start
         logger.info(f"Полная сводка сформирована за {total_elapsed:.3f} с")
-        print(results)
         return {
             "success": True,
             "period": period,
@@ -1,30 +1,176 @@
 import json
-from datetime import datetime, date, timezone
+import logging
 from typing import Optional
 from fastapi import APIRouter, Request, Depends, HTTPException
 from sqlalchemy.ext.asyncio import AsyncSession
+from src.activitywatch.core.metrics import (
+    ingest_background_backlog,
+    ingest_events_deduplicated,
+    ingest_events_failed,
+    ingest_events_inserted,
+    ingest_events_received,
+)
+from src.activitywatch.core.rate_limit import limit_ingest
+from src.activitywatch.core.security import get_current_device
 from src.activitywatch.database.models import SyncStatus, Device
-from src.activitywatch.loader import db
+from src.activitywatch.loader import db, get_db_session
 from fastapi import BackgroundTasks, Request
 
+logger = logging.getLogger(__name__)
+
 router = APIRouter(prefix="/tracker", tags=["отслеживание активностей"])
 
+PROTOCOL_VERSION = 2
+
+
+def _format_watermark(watermark: Optional[dict]) -> Optional[dict]:
+    if not watermark:
+        return None
+    return {
+        "timestamp": watermark["timestamp"].isoformat(),
+        "event_id": watermark["event_id"],
+    }
+
+
+def _count_ingest(endpoint: str, received: int, inserted: int):
+    ingest_events_received.inc(received, endpoint)
+    ingest_events_inserted.inc(inserted, endpoint)
+    ingest_events_deduplicated.inc(received - inserted, endpoint)
+
+
+def _check_device(device: dict, device_identifier: Optional[str]):
+    """Устройство из тела запроса должно совпадать с устройством токена."""
+    if not device_identifier:
+        raise HTTPException(400, "device_id required")
+    if device["device_identifier"] is None:
+        raise HTTPException(404, "Device not registered")
+    if device["device_identifier"] != device_identifier:
+        raise HTTPException(403, "Token does not belong to this device")
+
+
+@router.post("/handshake")
+async def handshake(
+    request: Request,
+    device: dict = Depends(get_current_device),
+    session: AsyncSession = Depends(get_db_session),
+):
+    """
+    Открывает сессию синхронизации протокола v2 (Authorization: Bearer).
+    Возвращает id сессии и водяные отметки сохраненных событий по buckets,
+    с которых клиент продолжает отправку.
+    """
+    data = await request.json()
+    _check_device(device, data.get("device_id"))
+    device_pk = device["device_id"]
+
+    # Повторное рукопожатие заменяет прежнюю сессию устройства
+    previous_sessions = await db.sync.get_open_v2_sessions(device_pk, session=session)
+    sync_session = await db.sync.create_sync_session(
+        device_id=device_pk,
+        status=SyncStatus.IN_PROGRESS,
+        meta_data={
+            "source": "activitywatch",
+            "protocol": PROTOCOL_VERSION,
+            "device_info": data.get("device_info") or {},
+        },
+        session=session,
+    )
+    watermarks = await db.activity.get_bucket_watermarks(
+        device_pk, data.get("buckets") or [], session=session
+    )
+    await session.commit()
+    db.presence.touch_device(device_pk)
+    for previous_id in previous_sessions:
+        db.sync.close_session(previous_id)
+
+    return {
+        "protocol": PROTOCOL_VERSION,
+        "session_id": sync_session.id,
+        "watermarks": {
+            bucket_id: _format_watermark(watermark)
+            for bucket_id, watermark in watermarks.items()
+        },
+    }
+
+
+@router.post("/receive_batch")
+async def receive_batch(
+    request: Request,
+    device: dict = Depends(get_current_device),
+    session: AsyncSession = Depends(get_db_session),
+):
+    """
+    Прием пачки событий в рамках сессии протокола v2 (Authorization: Bearer).
+    События сохраняются до ответа: водяная отметка в ответе означает,
+    что события до нее включительно зафиксированы в БД. Счетчик событий
+    сессии и last_seen устройства записываются отложенно (db.presence).
+    """
+    data = await request.json()
+    try:
+        session_id = int(data.get("session_id"))
+    except (TypeError, ValueError):
+        raise HTTPException(400, "session_id required")
+
+    owner = await db.sync.get_open_session_device(session_id, session=session)
+    if owner is None:
+        raise HTTPException(410, "Unknown or closed sync session")
+    device_id, user_id = owner
+    if device["device_id"] != device_id:
+        raise HTTPException(403, "Sync session belongs to another device")
+
+    events_data = data.get("events", [])
+    await limit_ingest(device_id, user_id, len(events_data))
+    inserted, watermark = await db.activity.ingest_batch(
+        device_id=device_id,
+        sync_session_id=session_id,
+        events_data=events_data,
+        bucket_id=data.get("bucket_id"),
+        event_type=data.get("bucket_type"),
+        session=session,
+    )
+    await session.commit()
+    db.presence.touch_device(device_id)
+    db.presence.add_session_events(session_id, inserted)
+    _count_ingest("receive_batch", len(events_data), inserted)
+
+    return {
+        "status": "committed",
+        "events_count": len(events_data),
+        "inserted": inserted,
+        "watermark": _format_watermark(watermark),
+    }
+
 
 @router.post("/receive_incremental")
-async def receive_incremental(request: Request, background_tasks: BackgroundTasks):
+async def receive_incremental(
+    request: Request,
+    background_tasks: BackgroundTasks,
+    device: dict = Depends(get_current_device),
+):
+    """
+    Прием событий протокола v1 с токеном устройства (Authorization: Bearer).
+    Токен проверяется по кэшу, без обращения к БД в установившемся режиме.
+    """
     data = await request.json()
     device_id = data.get("device_id")
     if not device_id:
         raise HTTPException(400, "device_id required")
 
-    # Проверяем устройство (быстро, с кэшем)
-    device = await db.devices.find_device_by_identifier(device_id)
-    if not device:
+    if device["device_identifier"] is None:
         return {"status": "error", "message": "Device not registered"}
+    if device["device_identifier"] != device_id:
+        raise HTTPException(403, "Token does not belong to this device")
+    await limit_ingest(device["device_id"], device["user_id"], len(data.get("events", [])))
+    db.presence.touch_device(device["device_id"])
 
     # Передаём данные в фоновую задачу
+    ingest_background_backlog.inc()
     background_tasks.add_task(
-        process_events_batch, device_id=device.id, events_data=data.get("events", [])
+        process_events_batch,
+        device_id=device["device_id"],
+        events_data=data.get("events", []),
+        bucket_id=data.get("bucket_id"),
+        event_type=data.get("bucket_type"),
     )
 
     # Сразу отвечаем клиенту
@@ -35,72 +181,78 @@ async def receive_incremental(request: Request, background_tasks: BackgroundTask
     }
 
 
-async def process_events_batch(device_id: int, events_data: list):
+async def process_events_batch(
+    device_id: int,
+    events_data: list,
+    bucket_id: Optional[str] = None,
+    event_type: Optional[str] = None,
+):
     """Фоновая вставка данных"""
     try:
-        await db.activity.create_events_batch(
+        created = await db.activity.create_events_batch(
             device_id=device_id,
             sync_session_id=None,  # или создайте сессию внутри
             events_data=events_data,
+            bucket_id=bucket_id,
+            event_type=event_type,
         )
-    except Exception as e:
-        pass
+        _count_ingest("receive_incremental", len(events_data), len(created))
+    except Exception:
+        # Клиенту уже ответили "accepted": ошибка видна только в логе и метрике
+        ingest_events_failed.inc(len(events_data), "receive_incremental")
+        logger.exception(
+            "Фоновая вставка %s событий устройства %s не удалась", len(events_data), device_id
+        )
+    finally:
+        ingest_background_backlog.dec()
 
 
 @router.post("/receive_daily_summary")
 async def receive_daily_summary(
     request: Request,
+    device: dict = Depends(get_current_device),
+    session: AsyncSession = Depends(get_db_session),
 ):
-    try:
-        data = await request.json()
-        print(
-            f"📥 Получены инкрементальные данные: {len(data.get('events', []))} событий"
-        )
-
-        device_info = data.get("device_info", {})
-        device_identifier = device_info.get("device_id") or device_info.get("hostname")
-
-        if not device_identifier:
-            raise HTTPException(
-                status_code=400, detail="Device identifier not found in request"
-            )
-
-        # Находим устройство в БД
-        device = await db.devices.find_device_by_identifier(device_identifier)
-        if not device:
-            print(f"⚠️  Устройство не найдено: {device_identifier}")
-            return {
-                "status": "error",
-                "message": f"Device {device_identifier} not registered",
-            }
-
-        print(f"✅ Найдено устройство: {device.device_name} (ID: {device.id})")
-
-        sync_session = await db.sync.create_sync_session(
-            device_id=device.id, status=SyncStatus.IN_PROGRESS
-        )
+    """
+    Прием дневной сводки с токеном устройства (Authorization: Bearer).
+    Устройство определяется по токену; device_id в теле, если передан,
+    должен с ним совпадать. device_info.device_id - имя хоста, а не
+    идентификатор регистрации, и для проверки не используется.
+    Ошибка сохранения возвращается как 5xx, чтобы клиент повторил отправку.
+    """
+    data = await request.json()
+    events_data = data.get("events", [])
+    logger.info("Дневная сводка: получено %s событий", len(events_data))
 
-        print(f"📊 Создана сессия синхронизации: {sync_session.id}")
+    if data.get("device_id") is not None:
+        _check_device(device, data["device_id"])
+    device_pk = device["device_id"]
+    await limit_ingest(device_pk, device["user_id"], len(events_data))
 
-        # Сохраняем события
-        events_data = data.get("events", [])
-        events = await db.activity.create_events_batch(
-            device_id=device.id,
-            sync_session_id=sync_session.id,
-            events_data=events_data,
-        )
-
-        print(f"💾 Сохранено событий: {len(events)}")
-        device.last_seen = datetime.now(timezone.utc)
+    sync_session = await db.sync.create_sync_session(
+        device_id=device_pk, status=SyncStatus.IN_PROGRESS, session=session
+    )
 
-        return {
-            "status": "success",
-            "message": f"Saved {len(events)} events",
-            "device_id": device.id,
-            "sync_session_id": sync_session.id,
-            "events_count": len(events),
-        }
+    # Сохраняем события
+    events = await db.activity.create_events_batch(
+        device_id=device_pk,
+        sync_session_id=sync_session.id,
+        events_data=events_data,
+        session=session,
+    )
+    await session.commit()
+    db.presence.touch_device(device_pk)
+    db.presence.finish_session(sync_session.id, len(events))
+    _count_ingest("receive_daily_summary", len(events_data), len(events))
+    logger.info(
+        "Дневная сводка устройства %s: сохранено %s событий (сессия %s)",
+        device_pk, len(events), sync_session.id,
+    )
 
-    except Exception as e:
-        print(f"❌ Ошибка при сохранении данных: {e}")
-        return {"status": "error", "message": str(e)}
+    return {
+        "status": "success",
+        "message": f"Saved {len(events)} events",
+        "device_id": device_pk,
+        "sync_session_id": sync_session.id,
+        "events_count": len(events),
+    }
@@ -21,6 +21,20 @@ class DatabaseConfig(BaseModel):
     pool_size: int = 20
     max_overflow: int = 40
     pool_timeout: int = 30
+    # Соединений, открываемых при запуске приложения (0 - без прогрева)
+    pool_warmup: int = 5
+    # Кэш подготовленных запросов asyncpg на соединение; 0 за pgbouncer
+    statement_cache_size: int = 100
+    slow_query_ms: int = 200
+    # Период записи last_seen устройств и счетчиков сессий синхронизации
+    presence_flush_seconds: float = 5
+    # Реплики для чтения статистики: postgresql+asyncpg://... (JSON-список).
+    # Отстающая больше replica_max_lag_seconds реплика не используется
+    replica_urls: List[str] = []
+    replica_max_lag_seconds: float = 10
+    replica_check_interval_seconds: float = 5
+    # Ожидание соединения реплики, после которого чтение идет на мастер
+    replica_pool_timeout_seconds: float = 1
 
     @property
     def url(self) -> str:
@@ -44,6 +58,13 @@ class AppConfig(BaseModel):
     port: int = 8000
     secret_key: str = ""
     cors_origins: List[str] = ["http://localhost:3000"]
+    # Профилирование запросов по заголовку X-Profile (только администратор)
+    profiling_enabled: bool = False
+    profile_routes: List[str] = [
+        "GET /api/statistics/summary",
+        "GET /api/statistics/overview",
+        "POST /tracker/receive_batch",
+    ]
 
     @field_validator("secret_key")
     def validate_secret_key(cls, v: str) -> str:
@@ -69,8 +90,27 @@ class SecurityConfig(BaseModel):
     access_token_expire_minutes: int = 30
     refresh_token_expire_days: int = 7
     bcrypt_rounds: int = 12
+    # Ограничение частоты (core.rate_limit): per_minute и per_hour -
+    # запросы статистики пользователя, ingest_* - события на приеме
+    rate_limit_enabled: bool = True
+    rate_limit_backend: str = "memory"  # memory, redis (общий для воркеров)
     rate_limit_per_minute: int = 60
     rate_limit_per_hour: int = 1000
+    ingest_events_per_second_device: float = 1000
+    ingest_events_burst_device: int = 20000
+    ingest_events_per_second_user: float = 3000
+    ingest_events_burst_user: int = 50000
+    # Кэш пользователей по JWT в get_current_user
+    principal_cache_size: int = 10000
+    principal_cache_ttl_seconds: int = 300
+    # Кэш токенов устройств на приеме событий
+    device_token_cache_size: int = 10000
+    device_token_cache_ttl_seconds: int = 300
+    device_token_negative_ttl_seconds: int = 30
+    # Потоки для Argon2: по умолчанию половина ядер, остальные - циклу событий
+    password_hash_workers: int = Field(
+        default_factory=lambda: max(1, (os.cpu_count() or 2) // 2)
+    )
 
     @field_validator("jwt_secret_key")
     def validate_jwt_secret(cls, v: str) -> str:
@@ -121,6 +161,29 @@ class LoggingConfig(BaseModel):
         return v.upper()
 
 
+class RetentionConfig(BaseModel):
+    """Срок хранения сырых событий и перенос старых в почасовые итоги"""
+
+    # Дней хранения activity_events; 0 - хранить всегда. Пользователь
+    # переопределяет срок ключом retention_days в users.settings
+    raw_days: int = 0
+    mode: str = "delete"  # delete, archive (копия в activity_events_archive)
+    # Событий в одной транзакции переноса и пауза между транзакциями
+    batch_size: int = 5000
+    batch_pause_ms: int = 50
+    # Запуск в процессе приложения раз в interval_minutes; иначе по расписанию:
+    # python -m src.activitywatch.database.retention
+    run_in_app: bool = False
+    interval_minutes: int = 60
+
+    @field_validator("mode")
+    def validate_mode(cls, v: str) -> str:
+        """Проверяем режим переноса"""
+        if v not in ("delete", "archive"):
+            raise ValueError("Retention mode must be delete or archive")
+        return v
+
+
 class AdminAuthConfig(BaseModel):
     login: str = "admin"
     password: str = "admin123"
@@ -197,6 +260,7 @@ class Config(BaseSettings):
     security: SecurityConfig = SecurityConfig()
     redis: RedisConfig = RedisConfig()
     logging: LoggingConfig = LoggingConfig()
+    retention: RetentionConfig = RetentionConfig()
     admin: AdminAuthConfig = AdminAuthConfig()
     activitywatch: ActivityWatchConfig = ActivityWatchConfig()
     email: EmailConfig = EmailConfig()
@@ -0,0 +1,138 @@
+import asyncio
+import logging
+import time
+from typing import Awaitable, Callable, Dict, List, Tuple
+
+from src.activitywatch.core.metrics import (
+    job_duration,
+    job_failures,
+    job_last_success,
+    job_rows,
+    job_rows_per_second,
+)
+
+logger = logging.getLogger(__name__)
+
+
+class JobProgress:
+    """
+    Ход одного запуска задачи: обработанные строки и скорость.
+
+    Задача вызывает add() после каждой порции; раз в log_interval секунд
+    в лог пишется число строк и скорость, метрика job_rows_total растет
+    сразу, а не в конце запуска.
+
+    Args:
+        job: Имя задачи (метка метрик)
+        log_interval: Период записи хода в лог, секунды
+    """
+
+    def __init__(self, job: str, log_interval: float = 10):
+        self.job = job
+        self.log_interval = log_interval
+        self.rows = 0
+        self.started = time.monotonic()
+        self._logged = self.started
+
+    def add(self, rows: int) -> None:
+        self.rows += rows
+        job_rows.inc(rows, self.job)
+        now = time.monotonic()
+        if now - self._logged >= self.log_interval:
+            self._logged = now
+            logger.info(
+                "%s: обработано %s строк, %.0f строк/с", self.job, self.rows, self.rows_per_second
+            )
+
+    @property
+    def elapsed(self) -> float:
+        return time.monotonic() - self.started
+
+    @property
+    def rows_per_second(self) -> float:
+        elapsed = self.elapsed
+        return self.rows / elapsed if elapsed > 0 else 0.0
+
+    def report(self) -> Dict:
+        return {
+            "job": self.job,
+            "rows": self.rows,
+            "seconds": round(self.elapsed, 3),
+            "rows_per_second": round(self.rows_per_second, 1),
+        }
+
+
+Job = Callable[[JobProgress], Awaitable[None]]
+
+
+class JobRunner:
+    """
+    Периодические фоновые задачи в цикле событий приложения.
+
+    Задача - корутина job(progress); следующий запуск начинается через
+    interval после окончания предыдущего, поэтому запуски одной задачи
+    не пересекаются. Ошибка запуска пишется в лог и в job_failures_total
+    и не останавливает расписание.
+    """
+
+    def __init__(self):
+        self._jobs: Dict[str, Tuple[Job, float]] = {}
+        self._tasks: List[asyncio.Task] = []
+
+    def register(self, name: str, job: Job, interval_seconds: float) -> None:
+        self._jobs[name] = (job, interval_seconds)
+
+    async def run_once(self, name: str) -> Dict:
+        """
+        Один запуск задачи name.
+
+        Returns:
+            Dict: rows, seconds и rows_per_second запуска
+
+        Raises:
+            KeyError: Задача не зарегистрирована
+        """
+        job, _ = self._jobs[name]
+        progress = JobProgress(name)
+        try:
+            await job(progress)
+        except Exception:
+            job_failures.inc(1, name)
+            raise
+        finally:
+            job_duration.observe(progress.elapsed, name)
+
+        report = progress.report()
+        job_rows_per_second.set(report["rows_per_second"], name)
+        job_last_success.set(time.time(), name)
+        logger.info(
+            "%s: завершено, %s строк за %s с (%s строк/с)",
+            name, report["rows"], report["seconds"], report["rows_per_second"],
+        )
+        return report
+
+    def start(self) -> None:
+        """Запустить расписание всех зарегистрированных задач."""
+        if self._tasks:
+            return
+
+        async def schedule(name: str, interval: float):
+            while True:
+                await asyncio.sleep(interval)
+                try:
+                    await self.run_once(name)
+                except Exception:
+                    logger.exception("Задача %s завершилась с ошибкой", name)
+
+        for name, (_, interval) in self._jobs.items():
+            self._tasks.append(asyncio.create_task(schedule(name, interval)))
+
+    async def stop(self) -> None:
+        """Остановить расписание; прерванный запуск откатывает свою транзакцию."""
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+
+job_runner = JobRunner()
@@ -0,0 +1,326 @@
+from bisect import bisect_left
+from contextvars import ContextVar
+from typing import Dict, List, Optional, Sequence, Tuple
+
+# Маршрут текущего запроса ("GET /api/statistics/summary"), которым
+# помечаются SQL запросы и метрики; вне HTTP запроса - "-"
+current_route: ContextVar[str] = ContextVar("current_route", default="-")
+
+# Границы корзин гистограмм времени, миллисекунды
+LATENCY_BUCKETS_MS = (1, 2.5, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000)
+# Те же границы в секундах - единицах Prometheus
+LATENCY_BUCKETS_SECONDS = tuple(bound / 1000 for bound in LATENCY_BUCKETS_MS)
+# Границы корзин для количеств (строк, запросов на HTTP запрос)
+COUNT_BUCKETS = (0, 1, 2, 5, 10, 25, 50, 100, 250, 1000, 10000, 100000)
+# Границы корзин размеров тел запросов и ответов, байты
+SIZE_BUCKETS = (100, 1000, 10_000, 100_000, 1_000_000, 10_000_000)
+
+
+class Histogram:
+    """
+    Гистограмма с фиксированными корзинами.
+
+    Наблюдение - один bisect и два сложения, поэтому гистограммы можно
+    обновлять на каждом запросе. Перцентили оцениваются верхней
+    границей корзины, в которую попадает перцентиль.
+    """
+
+    __slots__ = ("bounds", "counts", "count", "sum", "max")
+
+    def __init__(self, bounds: Sequence[float] = LATENCY_BUCKETS_MS):
+        self.bounds = tuple(bounds)
+        # Последняя корзина - значения больше верхней границы
+        self.counts = [0] * (len(self.bounds) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+    def observe(self, value: float):
+        self.counts[bisect_left(self.bounds, value)] += 1
+        self.count += 1
+        self.sum += value
+        if value > self.max:
+            self.max = value
+
+    def quantile(self, q: float) -> Optional[float]:
+        """Оценка перцентиля q (0..1) по корзинам."""
+        if not self.count:
+            return None
+        rank = q * self.count
+        cumulative = 0
+        for index, count in enumerate(self.counts):
+            cumulative += count
+            if cumulative >= rank and count:
+                return self.bounds[index] if index < len(self.bounds) else self.max
+        return self.max
+
+    def summary(self) -> Dict[str, Optional[float]]:
+        return {
+            "count": self.count,
+            "avg": round(self.sum / self.count, 3) if self.count else None,
+            "p50": self.quantile(0.5),
+            "p95": self.quantile(0.95),
+            "p99": self.quantile(0.99),
+            "max": round(self.max, 3),
+        }
+
+
+LabelValues = Tuple[str, ...]
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(str(value))}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Metric:
+    """Семейство метрик Prometheus с метками."""
+
+    type_name = "untyped"
+
+    def __init__(self, name: str, documentation: str, labels: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.label_names = tuple(labels)
+
+    def header(self) -> List[str]:
+        return [
+            f"# HELP {self.name} {self.documentation}",
+            f"# TYPE {self.name} {self.type_name}",
+        ]
+
+    def render(self) -> List[str]:
+        raise NotImplementedError
+
+
+class Counter(Metric):
+    """Монотонный счетчик."""
+
+    type_name = "counter"
+
+    def __init__(self, name: str, documentation: str, labels: Sequence[str] = ()):
+        super().__init__(name, documentation, labels)
+        self.values: Dict[LabelValues, float] = {}
+
+    def inc(self, amount: float = 1, *labels: str):
+        self.values[labels] = self.values.get(labels, 0) + amount
+
+    def render(self) -> List[str]:
+        lines = self.header()
+        for labels, value in sorted(self.values.items()):
+            lines.append(f"{self.name}{_format_labels(self.label_names, labels)} {_format_value(value)}")
+        return lines
+
+
+class Gauge(Counter):
+    """Значение, которое может расти и уменьшаться."""
+
+    type_name = "gauge"
+
+    def dec(self, amount: float = 1, *labels: str):
+        self.inc(-amount, *labels)
+
+    def set(self, value: float, *labels: str):
+        self.values[labels] = value
+
+
+class HistogramMetric(Metric):
+    """Гистограммы Prometheus по значениям меток."""
+
+    type_name = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labels: Sequence[str] = (),
+        bounds: Sequence[float] = LATENCY_BUCKETS_SECONDS,
+    ):
+        super().__init__(name, documentation, labels)
+        self.bounds = tuple(bounds)
+        self.histograms: Dict[LabelValues, Histogram] = {}
+
+    def labels(self, *labels: str) -> Histogram:
+        histogram = self.histograms.get(labels)
+        if histogram is None:
+            histogram = self.histograms[labels] = Histogram(self.bounds)
+        return histogram
+
+    def observe(self, value: float, *labels: str):
+        self.labels(*labels).observe(value)
+
+    def render(self) -> List[str]:
+        lines = self.header()
+        for labels, histogram in sorted(self.histograms.items()):
+            cumulative = 0
+            for bound, count in zip(self.bounds + (float("inf"),), histogram.counts):
+                cumulative += count
+                le = _format_labels(self.label_names, labels, f'le="{_format_value(bound)}"')
+                lines.append(f"{self.name}_bucket{le} {cumulative}")
+            label_text = _format_labels(self.label_names, labels)
+            lines.append(f"{self.name}_sum{label_text} {_format_value(histogram.sum)}")
+            lines.append(f"{self.name}_count{label_text} {histogram.count}")
+        return lines
+
+
+class MetricsRegistry:
+    """
+    Реестр метрик процесса и их вывод в текстовом формате Prometheus.
+
+    Метрики обновляются из одного цикла событий, поэтому блокировки
+    не нужны. Помимо зарегистрированных метрик при выводе вызываются
+    коллекторы - функции, снимающие значения в момент запроса
+    (например, состояние пула соединений).
+    """
+
+    def __init__(self):
+        self.metrics: Dict[str, Metric] = {}
+        self.collectors = []
+
+    def register(self, metric: Metric) -> Metric:
+        self.metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, documentation: str, labels: Sequence[str] = ()) -> Counter:
+        return self.register(Counter(name, documentation, labels))
+
+    def gauge(self, name: str, documentation: str, labels: Sequence[str] = ()) -> Gauge:
+        return self.register(Gauge(name, documentation, labels))
+
+    def histogram(
+        self,
+        name: str,
+        documentation: str,
+        labels: Sequence[str] = (),
+        bounds: Sequence[float] = LATENCY_BUCKETS_SECONDS,
+    ) -> HistogramMetric:
+        return self.register(HistogramMetric(name, documentation, labels, bounds))
+
+    def add_collector(self, collector):
+        """collector() -> Iterable[Metric], вызывается при каждом выводе"""
+        self.collectors.append(collector)
+
+    def render(self) -> str:
+        lines: List[str] = []
+        for metric in self.metrics.values():
+            lines.extend(metric.render())
+        for collector in self.collectors:
+            for metric in collector():
+                lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+registry = MetricsRegistry()
+
+# HTTP
+http_requests_total = registry.counter(
+    "http_requests_total", "HTTP запросы по маршруту и статусу", ("route", "status")
+)
+http_request_duration = registry.histogram(
+    "http_request_duration_seconds", "Время обработки HTTP запроса", ("route",)
+)
+http_requests_in_flight = registry.gauge(
+    "http_requests_in_flight", "HTTP запросы в обработке"
+)
+http_request_size = registry.histogram(
+    "http_request_size_bytes", "Размер тела HTTP запроса", ("route",), SIZE_BUCKETS
+)
+http_response_size = registry.histogram(
+    "http_response_size_bytes", "Размер тела HTTP ответа", ("route",), SIZE_BUCKETS
+)
+
+# Пул соединений БД; размер и занятость пула снимает коллектор DatabaseManager
+db_pool_wait = registry.histogram(
+    "db_pool_wait_seconds", "Ожидание соединения из пула", ("pool",)
+)
+db_pool_timeouts = registry.counter(
+    "db_pool_timeouts_total", "Запросы соединения, не дождавшиеся pool_timeout", ("pool",)
+)
+
+# Прием событий
+ingest_events_received = registry.counter(
+    "ingest_events_received_total", "Принятые от клиентов события", ("endpoint",)
+)
+ingest_events_inserted = registry.counter(
+    "ingest_events_inserted_total", "Сохраненные новые события", ("endpoint",)
+)
+ingest_events_deduplicated = registry.counter(
+    "ingest_events_deduplicated_total",
+    "События, отброшенные как уже сохраненные или повторные",
+    ("endpoint",),
+)
+ingest_events_failed = registry.counter(
+    "ingest_events_failed_total",
+    "События, которые не удалось сохранить из-за ошибки",
+    ("endpoint",),
+)
+ingest_background_backlog = registry.gauge(
+    "ingest_background_tasks", "Фоновые задачи вставки событий в очереди и в работе"
+)
+
+# Ограничение частоты
+rate_limit_rejected = registry.counter(
+    "rate_limit_rejected_total", "Запросы, отклоненные с 429, по бюджету", ("rule",)
+)
+
+# Аутентификация
+auth_principal_cache = registry.counter(
+    "auth_principal_cache_total",
+    "Обращения к кэшу пользователей по JWT (hit, miss, expired)",
+    ("result",),
+)
+auth_device_token_cache = registry.counter(
+    "auth_device_token_cache_total",
+    "Обращения к кэшу токенов устройств (hit, negative_hit, miss)",
+    ("result",),
+)
+password_hash_queue_time = registry.histogram(
+    "password_hash_queue_seconds",
+    "Ожидание свободного потока Argon2 (hash, verify)",
+    ("operation",),
+)
+password_hash_duration = registry.histogram(
+    "password_hash_duration_seconds",
+    "Время вычисления Argon2 в потоке (hash, verify)",
+    ("operation",),
+)
+password_hash_in_flight = registry.gauge(
+    "password_hash_in_flight", "Операции Argon2 в очереди и в работе"
+)
+
+# Отложенная запись присутствия (database.presence)
+presence_flush_rows = registry.counter(
+    "presence_flush_rows_total", "Строки, записанные сбросом присутствия", ("table",)
+)
+presence_flush_errors = registry.counter(
+    "presence_flush_errors_total", "Неудачные сбросы присутствия (повторяются)"
+)
+presence_flush_duration = registry.histogram(
+    "presence_flush_duration_seconds", "Время сброса присутствия в БД"
+)
+
+# Фоновые задачи (core.jobs): строки и время по каждому запуску
+JOB_DURATION_BUCKETS_SECONDS = (1, 5, 15, 60, 300, 900, 1800, 3600, 7200)
+job_rows = registry.counter("job_rows_total", "Строки, обработанные задачей", ("job",))
+job_failures = registry.counter("job_failures_total", "Запуски задачи с ошибкой", ("job",))
+job_duration = registry.histogram(
+    "job_duration_seconds", "Время запуска задачи", ("job",), JOB_DURATION_BUCKETS_SECONDS
+)
+job_rows_per_second = registry.gauge(
+    "job_rows_per_second", "Скорость последнего запуска задачи, строк в секунду", ("job",)
+)
+job_last_success = registry.gauge(
+    "job_last_success_timestamp_seconds", "Время окончания последнего успешного запуска", ("job",)
+)
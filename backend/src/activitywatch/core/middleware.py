@@ -0,0 +1,205 @@
+import threading
+import time
+from http.cookies import SimpleCookie
+from typing import Dict, Iterable, Tuple
+
+from starlette.routing import Match
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from src.activitywatch.core.metrics import (
+    current_route,
+    http_request_duration,
+    http_request_size,
+    http_requests_in_flight,
+    http_requests_total,
+    http_response_size,
+)
+from src.activitywatch.config import cfg
+from src.activitywatch.core.profiling import ProfileStore, SamplingProfiler
+from src.activitywatch.core.security import decode_access_token
+from src.activitywatch.database.query_stats import QueryStats, count_queries
+
+QUERY_COUNT_HEADER = b"x-db-queries"
+CHECKOUT_COUNT_HEADER = b"x-db-checkouts"
+PROFILE_REQUEST_HEADER = b"x-profile"
+PROFILE_ID_HEADER = b"x-profile-id"
+
+# (приложение, метод, путь) -> шаблон маршрута; пути с параметрами
+# неограниченны, поэтому кэш очищается при переполнении
+_route_cache: Dict[Tuple[int, str, str], str] = {}
+ROUTE_CACHE_SIZE = 10000
+
+
+def resolve_route(scope: Scope) -> str:
+    """
+    Шаблон маршрута запроса ("GET /api/statistics/daily-breakdown/{date}").
+
+    Используется шаблон, а не путь, чтобы метки метрик не зависели
+    от параметров пути. Перебор маршрутов дорог относительно остальной
+    работы middleware, поэтому результат кэшируется по пути.
+    """
+    app = scope.get("app")
+    key = (id(app), scope["method"], scope["path"])
+    route_name = _route_cache.get(key)
+    if route_name is not None:
+        return route_name
+
+    route_name = f"{scope['method']} <unmatched>"
+    for route in getattr(app, "routes", ()):
+        match, _ = route.matches(scope)
+        if match != Match.NONE and hasattr(route, "path"):
+            route_name = f"{scope['method']} {route.path}"
+            break
+
+    if len(_route_cache) >= ROUTE_CACHE_SIZE:
+        _route_cache.clear()
+    _route_cache[key] = route_name
+    return route_name
+
+
+class RouteContextMiddleware:
+    """
+    Помечает запрос маршрутом и считает его SQL запросы.
+
+    Маршрут записывается в current_route, по нему группируется
+    статистика SQL запросов; после ответа количество запросов и взятий
+    соединения из пула учитывается в статистике маршрута.
+    С expose_query_count ответ получает заголовки X-DB-Queries и
+    X-DB-Checkouts (для отладки и тестов).
+    """
+
+    def __init__(self, app: ASGIApp, query_stats: QueryStats, expose_query_count: bool = False):
+        self.app = app
+        self.query_stats = query_stats
+        self.expose_query_count = expose_query_count
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        route = resolve_route(scope)
+        token = current_route.set(route)
+        try:
+            with count_queries() as counter:
+
+                async def send_wrapper(message: Message):
+                    if self.expose_query_count and message["type"] == "http.response.start":
+                        headers = list(message.get("headers", []))
+                        headers.append((QUERY_COUNT_HEADER, str(counter.count).encode()))
+                        headers.append((CHECKOUT_COUNT_HEADER, str(counter.checkouts).encode()))
+                        message = {**message, "headers": headers}
+                    await send(message)
+
+                await self.app(scope, receive, send_wrapper)
+            self.query_stats.record_request(route, counter.count, counter.checkouts)
+        finally:
+            current_route.reset(token)
+
+
+class MetricsMiddleware:
+    """
+    HTTP метрики: время обработки, запросы в работе, размеры тел и статусы.
+
+    Маршрут берется из current_route, поэтому middleware подключается
+    внутри RouteContextMiddleware. На запрос приходится несколько
+    сложений и два bisect по гистограммам.
+    """
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        route = current_route.get()
+        started = time.perf_counter()
+        request_size = 0
+        response_size = 0
+        status = 500
+
+        async def receive_wrapper() -> Message:
+            nonlocal request_size
+            message = await receive()
+            if message["type"] == "http.request":
+                request_size += len(message.get("body", b""))
+            return message
+
+        async def send_wrapper(message: Message):
+            nonlocal response_size, status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            elif message["type"] == "http.response.body":
+                response_size += len(message.get("body", b""))
+            await send(message)
+
+        http_requests_in_flight.inc()
+        try:
+            await self.app(scope, receive_wrapper, send_wrapper)
+        finally:
+            http_requests_in_flight.dec()
+            http_request_duration.observe(time.perf_counter() - started, route)
+            http_requests_total.inc(1, route, str(status))
+            http_request_size.observe(request_size, route)
+            http_response_size.observe(response_size, route)
+
+
+def _is_admin_request(scope: Scope) -> bool:
+    """Запрос с JWT администратора в cookie token (без обращения к БД)."""
+    for name, value in scope["headers"]:
+        if name == b"cookie":
+            cookie = SimpleCookie()
+            cookie.load(value.decode("latin-1"))
+            token = cookie.get("token")
+            payload = decode_access_token(token.value) if token else None
+            return bool(
+                payload
+                and payload.get("type") == "access"
+                and str(payload.get("sub", "")).lower() == cfg.admin.email.lower()
+            )
+    return False
+
+
+class ProfilingMiddleware:
+    """
+    Профилирование отдельного запроса по заголовку X-Profile.
+
+    Работает только для маршрутов из routes и только для администратора.
+    Профиль сохраняется в store, его id возвращается в заголовке
+    X-Profile-Id и читается через /debug/profiles/{id}. Остальные
+    запросы проходят с одной проверкой маршрута по множеству; если
+    профилирование выключено в конфигурации, middleware не подключается.
+    """
+
+    def __init__(self, app: ASGIApp, routes: Iterable[str], store: ProfileStore, interval: float = 0.001):
+        self.app = app
+        self.routes = frozenset(routes)
+        self.store = store
+        self.interval = interval
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if (
+            scope["type"] != "http"
+            or current_route.get() not in self.routes
+            or not any(name == PROFILE_REQUEST_HEADER for name, _ in scope["headers"])
+            or not _is_admin_request(scope)
+        ):
+            await self.app(scope, receive, send)
+            return
+
+        profile_id = self.store.new_id()
+
+        async def send_wrapper(message: Message):
+            if message["type"] == "http.response.start":
+                headers = list(message.get("headers", []))
+                headers.append((PROFILE_ID_HEADER, profile_id.encode()))
+                message = {**message, "headers": headers}
+            await send(message)
+
+        profiler = SamplingProfiler(threading.get_ident(), self.interval).start()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            self.store.add(profile_id, profiler.stop(f"{current_route.get()} {profile_id}"))
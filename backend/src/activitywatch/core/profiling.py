@@ -0,0 +1,264 @@
+import sys
+import threading
+import time
+import tracemalloc
+import uuid
+from collections import Counter, OrderedDict
+from typing import Dict, List, Optional, Tuple
+
+# Кадр стека: (функция, файл, строка определения функции)
+Frame = Tuple[str, str, int]
+
+MAX_PROFILE_SECONDS = 60
+MAX_STORED_PROFILES = 20
+MAX_SNAPSHOTS = 5
+
+
+class Profile:
+    """
+    Результат сэмплирующего профилирования: стеки и число их попаданий.
+
+    Выводится в формате collapsed stacks (flamegraph.pl, speedscope)
+    или в JSON формате speedscope.
+    """
+
+    def __init__(self, name: str, stacks: Counter, interval: float, duration: float):
+        self.name = name
+        self.stacks = stacks
+        self.interval = interval
+        self.duration = duration
+
+    @property
+    def samples(self) -> int:
+        return sum(self.stacks.values())
+
+    def to_collapsed(self) -> str:
+        lines = []
+        for stack, count in self.stacks.most_common():
+            frames = ";".join(f"{name} ({filename}:{line})" for name, filename, line in stack)
+            lines.append(f"{frames} {count}")
+        return "\n".join(lines) + "\n"
+
+    def to_speedscope(self) -> Dict:
+        frame_index: Dict[Frame, int] = {}
+        frames = []
+        samples = []
+        weights = []
+        interval_ms = self.interval * 1000
+        for stack, count in self.stacks.items():
+            indexes = []
+            for frame in stack:
+                index = frame_index.get(frame)
+                if index is None:
+                    index = frame_index[frame] = len(frames)
+                    frames.append({"name": frame[0], "file": frame[1], "line": frame[2]})
+                indexes.append(index)
+            samples.append(indexes)
+            weights.append(count * interval_ms)
+
+        return {
+            "$schema": "https://www.speedscope.app/file-format-schema.json",
+            "name": self.name,
+            "exporter": "activitywatch",
+            "shared": {"frames": frames},
+            "profiles": [
+                {
+                    "type": "sampled",
+                    "name": self.name,
+                    "unit": "milliseconds",
+                    "startValue": 0,
+                    "endValue": sum(weights),
+                    "samples": samples,
+                    "weights": weights,
+                }
+            ],
+        }
+
+    def to_dict(self, profile_format: str) -> Dict:
+        """Профиль в формате speedscope или collapsed."""
+        if profile_format == "collapsed":
+            return {"name": self.name, "samples": self.samples, "collapsed": self.to_collapsed()}
+        return self.to_speedscope()
+
+
+class SamplingProfiler:
+    """
+    Сэмплирующий профилировщик потока цикла событий.
+
+    Отдельный поток с интервалом interval снимает стек целевого потока
+    через sys._current_frames(). Целевой поток не инструментируется,
+    поэтому профилирование не замедляет обработку запросов, кроме
+    захвата GIL на время снятия стека. В профиль попадает все, что
+    выполняется в цикле событий, включая соседние запросы.
+
+    Args:
+        thread_id: Поток, стек которого снимается (поток цикла событий)
+        interval: Интервал сэмплирования, секунды
+        max_seconds: Предельная длительность, после нее сбор прекращается
+    """
+
+    def __init__(
+        self,
+        thread_id: int,
+        interval: float = 0.005,
+        max_seconds: float = MAX_PROFILE_SECONDS,
+    ):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.max_seconds = max_seconds
+        self.stacks: Counter = Counter()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._started = 0.0
+
+    def start(self) -> "SamplingProfiler":
+        self._started = time.perf_counter()
+        self._thread = threading.Thread(
+            target=self._run, name="sampling-profiler", daemon=True
+        )
+        self._thread.start()
+        return self
+
+    def stop(self, name: str = "profile") -> Profile:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+        return Profile(name, self.stacks, self.interval, time.perf_counter() - self._started)
+
+    def _run(self):
+        deadline = self._started + self.max_seconds
+        while not self._stop.wait(self.interval):
+            if time.perf_counter() > deadline:
+                break
+            frame = sys._current_frames().get(self.thread_id)
+            stack: List[Frame] = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append((code.co_name, code.co_filename, code.co_firstlineno))
+                frame = frame.f_back
+            if stack:
+                stack.reverse()
+                self.stacks[tuple(stack)] += 1
+
+
+class ProfileStore:
+    """Последние профили отдельных запросов."""
+
+    def __init__(self, limit: int = MAX_STORED_PROFILES):
+        self.limit = limit
+        self.profiles: "OrderedDict[str, Profile]" = OrderedDict()
+
+    @staticmethod
+    def new_id() -> str:
+        return uuid.uuid4().hex[:12]
+
+    def add(self, profile_id: str, profile: Profile):
+        self.profiles[profile_id] = profile
+        while len(self.profiles) > self.limit:
+            self.profiles.popitem(last=False)
+
+    def get(self, profile_id: str) -> Optional[Profile]:
+        return self.profiles.get(profile_id)
+
+    def list(self) -> List[Dict]:
+        return [
+            {
+                "id": profile_id,
+                "name": profile.name,
+                "samples": profile.samples,
+                "duration_ms": round(profile.duration * 1000, 1),
+            }
+            for profile_id, profile in reversed(self.profiles.items())
+        ]
+
+
+class TracemallocSnapshots:
+    """
+    Снимки tracemalloc и их сравнение.
+
+    Хранится не больше MAX_SNAPSHOTS снимков: каждый снимок держит
+    в памяти все трассы выделений.
+    """
+
+    # Собственные выделения модулей трассировки не интересны
+    _filters = [
+        tracemalloc.Filter(False, tracemalloc.__file__),
+        tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+        tracemalloc.Filter(False, "<frozen importlib._bootstrap_external>"),
+    ]
+
+    def __init__(self):
+        self.snapshots: "OrderedDict[str, tracemalloc.Snapshot]" = OrderedDict()
+
+    @staticmethod
+    def status() -> Dict:
+        current, peak = tracemalloc.get_traced_memory()
+        return {
+            "tracing": tracemalloc.is_tracing(),
+            "frames": tracemalloc.get_traceback_limit(),
+            "current_kb": round(current / 1024, 1),
+            "peak_kb": round(peak / 1024, 1),
+        }
+
+    def start(self, frames: int = 1) -> Dict:
+        if not tracemalloc.is_tracing():
+            tracemalloc.start(frames)
+        return self.status()
+
+    def stop(self) -> Dict:
+        tracemalloc.stop()
+        self.snapshots.clear()
+        return self.status()
+
+    def take(self) -> str:
+        """
+        Снимает снимок и возвращает его id.
+
+        Raises:
+            RuntimeError: tracemalloc не запущен
+        """
+        if not tracemalloc.is_tracing():
+            raise RuntimeError("tracemalloc не запущен")
+        snapshot_id = uuid.uuid4().hex[:8]
+        self.snapshots[snapshot_id] = tracemalloc.take_snapshot().filter_traces(self._filters)
+        while len(self.snapshots) > MAX_SNAPSHOTS:
+            self.snapshots.popitem(last=False)
+        return snapshot_id
+
+    def top(self, snapshot_id: str, limit: int = 20, key_type: str = "lineno") -> List[Dict]:
+        snapshot = self.snapshots[snapshot_id]
+        return [
+            {
+                "location": self._location(stat.traceback),
+                "size_kb": round(stat.size / 1024, 1),
+                "count": stat.count,
+            }
+            for stat in snapshot.statistics(key_type)[:limit]
+        ]
+
+    def diff(
+        self, base_id: str, target_id: str, limit: int = 20, key_type: str = "lineno"
+    ) -> List[Dict]:
+        base = self.snapshots[base_id]
+        target = self.snapshots[target_id]
+        return [
+            {
+                "location": self._location(stat.traceback),
+                "size_kb": round(stat.size / 1024, 1),
+                "size_diff_kb": round(stat.size_diff / 1024, 1),
+                "count": stat.count,
+                "count_diff": stat.count_diff,
+            }
+            for stat in target.compare_to(base, key_type)[:limit]
+        ]
+
+    @staticmethod
+    def _location(traceback: tracemalloc.Traceback) -> str:
+        return " <- ".join(f"{frame.filename}:{frame.lineno}" for frame in traceback)
+
+
+# Одновременно выполняется не больше одного профилирования по запросу
+# администратора: параллельные сэмплеры искажают друг друга
+profile_lock = threading.Lock()
+request_profiles = ProfileStore()
+memory_snapshots = TracemallocSnapshots()
@@ -0,0 +1,260 @@
+import logging
+import math
+import time
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from fastapi import Depends, HTTPException, status
+
+from src.activitywatch.config import cfg
+from src.activitywatch.core.metrics import rate_limit_rejected
+from src.activitywatch.core.security import get_current_user
+
+logger = logging.getLogger(__name__)
+
+
+class RateLimitRule:
+    """
+    Бюджет токен-бакета: rate единиц в секунду, не больше burst подряд.
+
+    Args:
+        name: Имя бюджета (префикс ключа и метка метрик)
+        rate: Пополнение, единиц в секунду
+        burst: Емкость бакета
+    """
+
+    __slots__ = ("name", "rate", "burst")
+
+    def __init__(self, name: str, rate: float, burst: float):
+        self.name = name
+        self.rate = rate
+        self.burst = burst
+
+
+class MemoryRateLimitBackend:
+    """
+    Токен-бакеты в памяти процесса.
+
+    acquire не содержит await, поэтому чтение и запись бакетов атомарны
+    относительно других задач цикла событий и блокировки не нужны.
+    Бакет хранится как [токены, момент обновления, момент заполнения];
+    заполненный бакет эквивалентен отсутствующему, такие записи
+    удаляются при переполнении.
+
+    Args:
+        max_keys: Предельное число бакетов
+    """
+
+    def __init__(self, max_keys: int = 100000):
+        self.max_keys = max_keys
+        self._buckets: Dict[str, List[float]] = {}
+
+    async def acquire(
+        self, limits: Sequence[Tuple[str, float, float]], cost: float
+    ) -> List[float]:
+        now = time.monotonic()
+        levels = []
+        retry_after = []
+        for key, rate, burst in limits:
+            bucket = self._buckets.get(key)
+            if bucket is None:
+                if len(self._buckets) >= self.max_keys:
+                    self._evict(now)
+                tokens = burst
+            else:
+                tokens = min(burst, bucket[0] + (now - bucket[1]) * rate)
+            # Пачка больше burst проходит при полном бакете и уводит его в долг
+            need = min(cost, burst)
+            levels.append(tokens)
+            retry_after.append(0.0 if tokens >= need else (need - tokens) / rate)
+
+        # Списание только если хватает во всех бакетах
+        charged = not any(retry_after)
+        for (key, rate, burst), tokens in zip(limits, levels):
+            if charged:
+                tokens -= cost
+            self._buckets[key] = [tokens, now, now + (burst - tokens) / rate]
+        return retry_after
+
+    def _evict(self, now: float):
+        for key in [k for k, bucket in self._buckets.items() if bucket[2] <= now]:
+            del self._buckets[key]
+        if len(self._buckets) >= self.max_keys:
+            # Все бакеты активны: сбрасываем старшую половину
+            for key in list(self._buckets)[: len(self._buckets) // 2]:
+                del self._buckets[key]
+
+
+# Тот же алгоритм, что в MemoryRateLimitBackend, атомарно на сервере Redis
+# для всех бакетов запроса: ARGV = cost, затем rate и burst каждого ключа.
+# Время берется у Redis, чтобы часы воркеров не влияли на бакеты.
+_REDIS_ACQUIRE = """
+local cost = tonumber(ARGV[1])
+local clock = redis.call('TIME')
+local now = tonumber(clock[1]) + tonumber(clock[2]) / 1000000
+local levels = {}
+local retry_after = {}
+local charged = true
+for i, key in ipairs(KEYS) do
+    local rate = tonumber(ARGV[2 * i])
+    local burst = tonumber(ARGV[2 * i + 1])
+    local state = redis.call('HMGET', key, 'tokens', 'ts')
+    local tokens = tonumber(state[1])
+    if tokens == nil then
+        tokens = burst
+    else
+        tokens = math.min(burst, tokens + math.max(0, now - tonumber(state[2])) * rate)
+    end
+    local need = math.min(cost, burst)
+    levels[i] = tokens
+    if tokens >= need then
+        retry_after[i] = '0'
+    else
+        retry_after[i] = tostring((need - tokens) / rate)
+        charged = false
+    end
+end
+for i, key in ipairs(KEYS) do
+    local rate = tonumber(ARGV[2 * i])
+    local burst = tonumber(ARGV[2 * i + 1])
+    local tokens = levels[i]
+    if charged then
+        tokens = tokens - cost
+    end
+    redis.call('HSET', key, 'tokens', tostring(tokens), 'ts', tostring(now))
+    redis.call('PEXPIRE', key, math.ceil((burst - tokens) / rate * 1000) + 1000)
+end
+return retry_after
+"""
+
+
+class RedisRateLimitBackend:
+    """
+    Общие для всех воркеров токен-бакеты в Redis (пакет redis).
+
+    Один вызов Lua скрипта на проверку всех бакетов запроса. Если Redis недоступен, запрос
+    пропускается: ограничение не должно останавливать прием данных.
+
+    Args:
+        url: URL Redis (cfg.redis.url)
+        prefix: Префикс ключей
+    """
+
+    def __init__(self, url: str, prefix: str = "ratelimit:"):
+        try:
+            from redis import asyncio as redis_asyncio
+        except ImportError as e:
+            raise RuntimeError(
+                "Для security.rate_limit_backend=redis нужен пакет redis"
+            ) from e
+
+        self.prefix = prefix
+        self.client = redis_asyncio.from_url(url)
+        self._script = self.client.register_script(_REDIS_ACQUIRE)
+
+    async def acquire(
+        self, limits: Sequence[Tuple[str, float, float]], cost: float
+    ) -> List[float]:
+        keys = [self.prefix + key for key, _, _ in limits]
+        args = [cost]
+        for _, rate, burst in limits:
+            args += [rate, burst]
+        try:
+            result = await self._script(keys=keys, args=args)
+        except Exception as e:
+            logger.warning("Ограничение частоты пропущено, Redis недоступен: %s", e)
+            return [0.0] * len(limits)
+        return [float(value) for value in result]
+
+
+class RateLimiter:
+    """
+    Проверка токен-бакетов и ответ 429 с Retry-After.
+
+    Args:
+        backend: Хранилище бакетов (MemoryRateLimitBackend, RedisRateLimitBackend)
+        enabled: Выключенный ограничитель пропускает все запросы
+    """
+
+    def __init__(self, backend, enabled: bool = True):
+        self.backend = backend
+        self.enabled = enabled
+
+    async def hit(self, buckets: Sequence[Tuple[RateLimitRule, str]], cost: float = 1):
+        """
+        Списывает cost из всех бакетов сразу или ни из одного.
+
+        Отклоненный запрос не расходует бюджет бакетов, в которых токенов
+        хватало: повторы во время ограничения пользователя не съедают
+        бюджет устройства.
+
+        Args:
+            buckets: (бюджет, ключ владельца) - например, (ingest_device, "42")
+
+        Raises:
+            HTTPException: 429, если в каком-либо бакете не хватает токенов
+        """
+        if not self.enabled or cost <= 0:
+            return
+        retry_after = await self.backend.acquire(
+            [(f"{rule.name}:{owner}", rule.rate, rule.burst) for rule, owner in buckets], cost
+        )
+        if any(retry_after):
+            for (rule, _), wait in zip(buckets, retry_after):
+                if wait > 0:
+                    rate_limit_rejected.inc(1, rule.name)
+            raise HTTPException(
+                status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+                detail="Слишком много запросов",
+                headers={"Retry-After": str(max(1, math.ceil(max(retry_after))))},
+            )
+
+
+def _build_backend():
+    if cfg.security.rate_limit_backend == "redis":
+        return RedisRateLimitBackend(cfg.redis.url)
+    return MemoryRateLimitBackend()
+
+
+rate_limiter = RateLimiter(_build_backend(), enabled=cfg.security.rate_limit_enabled)
+
+# Статистика: запросы пользователя в минуту и в час
+STATISTICS_PER_MINUTE = RateLimitRule(
+    "statistics_minute",
+    cfg.security.rate_limit_per_minute / 60,
+    cfg.security.rate_limit_per_minute,
+)
+STATISTICS_PER_HOUR = RateLimitRule(
+    "statistics_hour",
+    cfg.security.rate_limit_per_hour / 3600,
+    cfg.security.rate_limit_per_hour,
+)
+# Прием: события в секунду на устройство и на пользователя (все устройства)
+INGEST_PER_DEVICE = RateLimitRule(
+    "ingest_device",
+    cfg.security.ingest_events_per_second_device,
+    cfg.security.ingest_events_burst_device,
+)
+INGEST_PER_USER = RateLimitRule(
+    "ingest_user",
+    cfg.security.ingest_events_per_second_user,
+    cfg.security.ingest_events_burst_user,
+)
+
+
+async def limit_statistics(current_user: dict = Depends(get_current_user)):
+    """Зависимость роутера статистики: бюджет запросов пользователя."""
+    owner = str(current_user["id"])
+    await rate_limiter.hit(((STATISTICS_PER_MINUTE, owner), (STATISTICS_PER_HOUR, owner)))
+
+
+async def limit_ingest(device_id: int, user_id: Optional[int], events: int):
+    """
+    Бюджет событий устройства и, если пользователь известен, пользователя.
+
+    Raises:
+        HTTPException: 429 с Retry-After
+    """
+    buckets = [(INGEST_PER_DEVICE, str(device_id))]
+    if user_id is not None:
+        buckets.append((INGEST_PER_USER, str(user_id)))
+    await rate_limiter.hit(buckets, events)
@@ -1,11 +1,25 @@
+import asyncio
+import hashlib
+import logging
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta, timezone
-from typing import Optional
-from fastapi import HTTPException, Request
+from typing import Callable, Dict, Optional, Set, Tuple, TypeVar
+from fastapi import Depends, HTTPException, Request
 from jose import JWTError, jwt
 from passlib.context import CryptContext
 from src.activitywatch.config import cfg
+from src.activitywatch.core.metrics import (
+    auth_device_token_cache,
+    auth_principal_cache,
+    password_hash_duration,
+    password_hash_in_flight,
+    password_hash_queue_time,
+)
 from fastapi import  status
 
+logger = logging.getLogger(__name__)
 
 pwd_context = CryptContext(schemes=["argon2"], deprecated="auto")
 
@@ -17,6 +31,79 @@ def get_password_hash(password: str) -> str:
     return pwd_context.hash(password)
 
 
+T = TypeVar("T")
+
+
+class PasswordHasher:
+    """
+    Argon2 в отдельном пуле потоков.
+
+    Хэширование и проверка пароля занимают десятки миллисекунд CPU;
+    вызванные прямо в обработчике, они останавливают цикл событий
+    для всех запросов воркера. argon2-cffi отпускает GIL на время
+    вычисления, поэтому в пуле потоков оно идет параллельно циклу
+    событий. Число потоков ограничивает долю CPU под пароли при
+    наплыве входов, остальные операции ждут в очереди пула; время
+    ожидания и вычисления пишется в метрики password_hash_*.
+
+    Args:
+        workers: Число потоков (одновременных операций Argon2)
+    """
+
+    def __init__(self, workers: int):
+        self.workers = workers
+        self._executor: Optional[ThreadPoolExecutor] = None
+
+    @property
+    def executor(self) -> ThreadPoolExecutor:
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(
+                max_workers=self.workers, thread_name_prefix="argon2"
+            )
+        return self._executor
+
+    async def hash(self, password: str) -> str:
+        return await self._run("hash", get_password_hash, password)
+
+    async def verify(self, plain_password: str, hashed_password: str) -> bool:
+        return await self._run("verify", verify_password, plain_password, hashed_password)
+
+    async def _run(self, operation: str, func: Callable[..., T], *args) -> T:
+        submitted = time.perf_counter()
+        # Начало и конец вычисления в потоке пула; None - не начиналось
+        timing = [None, None]
+
+        def job():
+            timing[0] = time.perf_counter()
+            try:
+                return func(*args)
+            finally:
+                timing[1] = time.perf_counter()
+
+        # Метрики обновляются в цикле событий, не в потоках пула
+        password_hash_in_flight.inc()
+        try:
+            return await asyncio.get_running_loop().run_in_executor(self.executor, job)
+        finally:
+            password_hash_in_flight.dec()
+            started, finished = timing
+            if started is None:
+                # Отмена до начала вычисления: учитываем только ожидание
+                password_hash_queue_time.observe(time.perf_counter() - submitted, operation)
+            else:
+                password_hash_queue_time.observe(started - submitted, operation)
+                if finished is not None:
+                    password_hash_duration.observe(finished - started, operation)
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False)
+            self._executor = None
+
+
+password_hasher = PasswordHasher(cfg.security.password_hash_workers)
+
+
 def create_access_token(
     data: dict,
     expires_delta: Optional[timedelta] = None
@@ -50,75 +137,297 @@ def decode_access_token(token: str):
     except JWTError:
         return None
     
+class PrincipalCache:
+    """
+    Кэш проверенных пользователей по хэшу JWT.
+
+    Запись живет до истечения токена, но не дольше max_ttl: сброс
+    (invalidate_user) действует только в своем процессе, и max_ttl
+    ограничивает, сколько другие воркеры видят устаревшие данные
+    пользователя. Размер ограничен, вытесняются давно не использованные
+    записи. Хранится sha256 токена, а не сам токен.
+
+    Args:
+        max_size: Предельное число записей
+        max_ttl: Предельное время жизни записи, секунды
+    """
+
+    def __init__(self, max_size: int = 10000, max_ttl: float = 300):
+        self.max_size = max_size
+        self.max_ttl = max_ttl
+        # хэш токена -> (момент истечения по time.time(), пользователь)
+        self._entries: "OrderedDict[str, Tuple[float, dict]]" = OrderedDict()
+        self._by_user: Dict[int, Set[str]] = {}
+
+    @staticmethod
+    def key(token: str) -> str:
+        return hashlib.sha256(token.encode()).hexdigest()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, key: str) -> Optional[dict]:
+        entry = self._entries.get(key)
+        if entry is None:
+            auth_principal_cache.inc(1, "miss")
+            return None
+        expires_at, principal = entry
+        if expires_at <= time.time():
+            self._remove(key)
+            auth_principal_cache.inc(1, "expired")
+            return None
+        self._entries.move_to_end(key)
+        auth_principal_cache.inc(1, "hit")
+        # Копия: вызывающий код может менять словарь пользователя
+        return dict(principal)
+
+    def set(self, key: str, principal: dict, token_exp: float):
+        expires_at = min(token_exp, time.time() + self.max_ttl)
+        self._remove(key)
+        self._entries[key] = (expires_at, dict(principal))
+        self._by_user.setdefault(principal["id"], set()).add(key)
+        while len(self._entries) > self.max_size:
+            self._remove(next(iter(self._entries)))
+
+    def invalidate_user(self, user_id: int):
+        """Сбросить все записи пользователя (после изменения или деактивации)."""
+        for key in self._by_user.pop(user_id, ()):
+            self._entries.pop(key, None)
+
+    def clear(self):
+        self._entries.clear()
+        self._by_user.clear()
+
+    def _remove(self, key: str):
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return
+        user_id = entry[1]["id"]
+        keys = self._by_user.get(user_id)
+        if keys is not None:
+            keys.discard(key)
+            if not keys:
+                del self._by_user[user_id]
+
+
+principal_cache = PrincipalCache(
+    max_size=cfg.security.principal_cache_size,
+    max_ttl=cfg.security.principal_cache_ttl_seconds,
+)
+
+
 async def get_current_user(request: Request):
+    """
+    Пользователь по JWT из cookie token.
+
+    Повторные запросы с тем же токеном обслуживаются из principal_cache
+    без декодирования JWT и обращения к БД.
+    """
     from src.activitywatch.loader import db
-    try:
-        token = request.cookies.get("token")
-        print(f"Получен токен из куки: {token[:50] if token else 'None'}...")
 
-        if not token:
-            print("Токен не найден в куках")
-            raise HTTPException(
-                status_code=status.HTTP_401_UNAUTHORIZED, detail="Не авторизован"
-            )
+    token = request.cookies.get("token")
+    if not token:
+        logger.debug("Токен не найден в куках")
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED, detail="Не авторизован"
+        )
+
+    cache_key = principal_cache.key(token)
+    principal = principal_cache.get(cache_key)
+    if principal is not None:
+        return principal
 
+    try:
         payload = decode_access_token(token)
         if not payload:
-            print("Не удалось декодировать токен или токен истек")
+            logger.info("Не удалось декодировать токен или токен истек")
             raise HTTPException(
                 status_code=status.HTTP_401_UNAUTHORIZED,
                 detail="Неверный или истекший токен",
             )
 
-        print(f"Декодированный payload: {payload}")
-
         user_id = payload.get("user_id")
         token_type = payload.get("type")
 
         if not user_id:
-            print("user_id не найден в токене")
-            print(f"Токен содержит: {payload}")
+            logger.warning("В токене нет user_id (sub=%s)", payload.get("sub"))
             raise HTTPException(
                 status_code=status.HTTP_401_UNAUTHORIZED,
                 detail="Неверный токен: отсутствует user_id",
             )
 
         if token_type != "access":
-            print(f"Неправильный тип токена: {token_type}")
+            logger.info("Неправильный тип токена: %s", token_type)
             raise HTTPException(
                 status_code=status.HTTP_401_UNAUTHORIZED, detail="Неверный тип токена"
             )
 
-        print(f"Ищем пользователя с ID: {user_id}")
-
         user = await db.users.get_user_by_id(user_id)
 
         if not user:
-            print("Пользователь не найден в БД")
+            logger.info("Пользователь %s из токена не найден в БД", user_id)
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND, detail="Пользователь не найден"
             )
 
-        return {
+        if not user.is_active:
+            logger.info("Пользователь %s деактивирован", user_id)
+            raise HTTPException(
+                status_code=status.HTTP_401_UNAUTHORIZED,
+                detail="Пользователь деактивирован",
+            )
+
+        principal = {
             "id": user.id,
             "email": user.email,
             "username": user.username,
             "is_verified": user.is_verified,
             "created_at": user.created_at,
-            "devices_count": user.devices_count
-            if hasattr(user, "devices_count")
-            else 0,
+            "devices_count": user.devices_count,
         }
 
-    except HTTPException as he:
-        print(f"HTTP Exception в get_current_user: {he.detail}")
-        raise he
-    except Exception as e:
-        print(f"Ошибка в get_current_user: {str(e)}")
-        import traceback
-
-        traceback.print_exc()
+    except HTTPException:
+        raise
+    except Exception:
+        logger.exception("Ошибка в get_current_user")
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail="Ошибка сервера при получении данных пользователя",
-        )
\ No newline at end of file
+        )
+
+    # Токены без exp не кэшируются: их срок жизни неизвестен
+    if "exp" in payload:
+        principal_cache.set(cache_key, principal, payload["exp"])
+    return dict(principal)
+
+
+async def get_admin_user(current_user: dict = Depends(get_current_user)) -> dict:
+    """Текущий пользователь, если это администратор (cfg.admin.email)"""
+    if current_user["email"].lower() != cfg.admin.email.lower():
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN, detail="Недостаточно прав"
+        )
+    return current_user
+
+
+class DeviceTokenCache:
+    """
+    Кэш проверенных токенов устройств: sha256 токена -> устройство.
+
+    Устройство - словарь device_id (pk), user_id и device_identifier
+    (строковый id, присвоенный при регистрации). Неизвестные токены
+    тоже кэшируются, на negative_ttl и в отдельном словаре, чтобы
+    перебор случайных токенов не вытеснял настоящие. revoke_token,
+    регистрация и удаление устройства сбрасывают записи в своем процессе;
+    ttl ограничивает, сколько другие воркеры принимают отозванный токен.
+
+    Args:
+        max_size: Предельное число записей каждого вида
+        ttl: Время жизни записи известного токена, секунды
+        negative_ttl: Время жизни записи неизвестного токена, секунды
+    """
+
+    def __init__(self, max_size: int = 10000, ttl: float = 300, negative_ttl: float = 30):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self._entries: "OrderedDict[str, Tuple[float, dict]]" = OrderedDict()
+        self._negative: "OrderedDict[str, float]" = OrderedDict()
+
+    @staticmethod
+    def key(token: str) -> str:
+        return hashlib.sha256(token.encode()).hexdigest()
+
+    def get(self, key: str) -> Tuple[bool, Optional[dict]]:
+        """
+        Returns:
+            Tuple[bool, Optional[dict]]: (есть ли запись, устройство или
+                None для неизвестного токена)
+        """
+        now = time.time()
+        entry = self._entries.get(key)
+        if entry is not None:
+            if entry[0] > now:
+                self._entries.move_to_end(key)
+                auth_device_token_cache.inc(1, "hit")
+                return True, entry[1]
+            del self._entries[key]
+
+        expires_at = self._negative.get(key)
+        if expires_at is not None:
+            if expires_at > now:
+                auth_device_token_cache.inc(1, "negative_hit")
+                return True, None
+            del self._negative[key]
+
+        auth_device_token_cache.inc(1, "miss")
+        return False, None
+
+    def set(self, key: str, device: Optional[dict]):
+        if device is None:
+            self._put(self._negative, key, time.time() + self.negative_ttl)
+        else:
+            self._negative.pop(key, None)
+            self._put(self._entries, key, (time.time() + self.ttl, device))
+
+    def _put(self, entries: OrderedDict, key: str, value):
+        entries[key] = value
+        entries.move_to_end(key)
+        while len(entries) > self.max_size:
+            entries.popitem(last=False)
+
+    def invalidate(self, key: str):
+        self._entries.pop(key, None)
+        self._negative.pop(key, None)
+
+    def invalidate_device(self, device_id: int):
+        """Сбросить записи всех токенов устройства (pk)."""
+        for key in [k for k, (_, d) in self._entries.items() if d["device_id"] == device_id]:
+            del self._entries[key]
+
+    def clear(self):
+        self._entries.clear()
+        self._negative.clear()
+
+
+device_token_cache = DeviceTokenCache(
+    max_size=cfg.security.device_token_cache_size,
+    ttl=cfg.security.device_token_cache_ttl_seconds,
+    negative_ttl=cfg.security.device_token_negative_ttl_seconds,
+)
+
+
+async def get_current_device(request: Request) -> dict:
+    """
+    Устройство по токену из заголовка Authorization: Bearer <token>.
+
+    Токен проверяется через device_token_cache; в установившемся режиме
+    проверка обходится без обращения к БД.
+
+    Returns:
+        dict: device_id (pk), user_id, device_identifier
+    """
+    from src.activitywatch.loader import db
+
+    scheme, _, token = request.headers.get("authorization", "").partition(" ")
+    if scheme.lower() != "bearer" or not token:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Требуется токен устройства",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
+
+    key = device_token_cache.key(token.strip())
+    cached, device = device_token_cache.get(key)
+    if not cached:
+        device = await db.tokens.get_token_device(key)
+        device_token_cache.set(key, device)
+
+    if device is None:
+        logger.info("Неизвестный токен устройства")
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Неверный токен устройства",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
+    return device
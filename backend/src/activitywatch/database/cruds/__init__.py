@@ -1,4 +1,5 @@
 from ..db_manager import DatabaseManager
+from ..presence import PresenceBuffer
 
 from .users import UsersCRUD
 from .devices import DevicesCRUD
@@ -7,7 +8,9 @@ from .activity import ActivityEventsCRUD
 from .sync import SyncSessionsCRUD
 from .statistics import StatisticsCRUD
 class CommonCRUD:
-    __slots__ = ("db_manager", "users", "devices", "tokens", "activity", "sync", "statistics")
+    __slots__ = ("db_manager", "presence", "users", "devices", "tokens", "activity", "sync", "statistics")
+
+    presence: PresenceBuffer
 
     users: UsersCRUD
     devices: DevicesCRUD
@@ -16,8 +19,9 @@ class CommonCRUD:
     sync: SyncSessionsCRUD
     statistics: StatisticsCRUD
 
-    def __init__(self, db_manager: DatabaseManager) -> None:
+    def __init__(self, db_manager: DatabaseManager, presence_flush_interval: float = 5) -> None:
         self.db_manager = db_manager
+        self.presence = PresenceBuffer(self.db_manager, presence_flush_interval)
         self.users = UsersCRUD(self.db_manager, self)
         self.devices = DevicesCRUD(self.db_manager, self)
         self.tokens = ApiTokensCRUD(self.db_manager, self)
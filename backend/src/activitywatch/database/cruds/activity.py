@@ -1,17 +1,40 @@
-from typing import TYPE_CHECKING, Optional, List, Dict, Any
+from typing import TYPE_CHECKING, Optional, List, Dict, Any, Tuple
 from datetime import datetime, timedelta, timezone
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select, and_, func, desc, or_
+from sqlalchemy import select, and_, func, desc, or_, update, bindparam
 from sqlalchemy.orm import selectinload
 import hashlib
 import uuid
-from src.activitywatch.database.models import ActivityEvent, Device, SyncSession
+from src.activitywatch.database.models import (
+    ActivityEvent,
+    Device,
+    SyncSession,
+    WINDOW_EVENT_TYPE,
+)
 from src.activitywatch.database.db_manager import DatabaseManager
 
 if TYPE_CHECKING:
     from . import CommonCRUD
 
 
+def parse_event_timestamp(timestamp: Any) -> datetime:
+    """Разбор времени события ActivityWatch в datetime UTC"""
+    if isinstance(timestamp, datetime):
+        return timestamp
+    if isinstance(timestamp, str):
+        try:
+            if timestamp.endswith("Z"):
+                timestamp = datetime.fromisoformat(timestamp.replace("Z", "+00:00"))
+            else:
+                timestamp = datetime.fromisoformat(timestamp)
+            if timestamp.tzinfo is None:
+                timestamp = timestamp.replace(tzinfo=timezone.utc)
+            return timestamp
+        except ValueError:
+            pass
+    return datetime.now(timezone.utc)
+
+
 class ActivityEventsCRUD:
     db: DatabaseManager
 
@@ -84,18 +107,30 @@ class ActivityEventsCRUD:
         device_id: int,
         sync_session_id: Optional[int],
         events_data: List[Dict[str, Any]],
+        bucket_id: Optional[str] = None,
+        event_type: Optional[str] = None,
+        session: Optional[AsyncSession] = None,
     ) -> List[ActivityEvent]:
         """
         Массовое создание событий активности.
-        Выполняется одна сессия, один коммит, проверка дубликатов по event_id.
+        Выполняется одна сессия, один коммит, проверка дубликатов по
+        (event_id, timestamp). bucket_id и event_type - bucket ActivityWatch,
+        из которого пришла пачка.
+        События с признаком "open" - незавершенные события, длительность
+        которых растет; для уже сохраненных таких событий duration_seconds
+        обновляется на месте.
+        Сводка устройства (device_stats) обновляется в той же транзакции.
+        Во внешней сессии (session) изменения не коммитятся.
         """
         if not events_data:
             return []
 
-        async with self.db.get_session() as session:
+        existing_session = session
+        async with self.db.get_session(existing_session) as session:
             # 1. Подготовим списки event_id для проверки дубликатов
             event_ids = []
             prepared_events = []  # временно храним (объект, event_id)
+            open_events = {}  # (event_id, timestamp) -> длительность
 
             for event_data in events_data:
                 # Извлекаем или генерируем event_id
@@ -105,28 +140,15 @@ class ActivityEventsCRUD:
                 else:
                     event_id = str(event_id)
 
-                # Парсим timestamp (логика из create_event)
-                timestamp = event_data.get("timestamp")
-                if isinstance(timestamp, str):
-                    try:
-                        if timestamp.endswith("Z"):
-                            timestamp = datetime.fromisoformat(
-                                timestamp.replace("Z", "+00:00")
-                            )
-                        else:
-                            timestamp = datetime.fromisoformat(timestamp)
-                        if timestamp.tzinfo is None:
-                            timestamp = timestamp.replace(tzinfo=timezone.utc)
-                    except ValueError:
-                        timestamp = datetime.now(timezone.utc)
-                elif timestamp is None:
-                    timestamp = datetime.now(timezone.utc)
+                timestamp = parse_event_timestamp(event_data.get("timestamp"))
 
                 # Готовим объект (без добавления в сессию)
                 obj = ActivityEvent(
                     device_id=device_id,
                     sync_session_id=sync_session_id,
                     event_id=event_id,
+                    bucket_id=bucket_id,
+                    event_type=event_type or WINDOW_EVENT_TYPE,
                     timestamp=timestamp,
                     duration_seconds=event_data.get("duration", 0),
                     data=event_data.get("data", {}),
@@ -137,33 +159,170 @@ class ActivityEventsCRUD:
                 )
                 prepared_events.append((obj, event_id))
                 event_ids.append(event_id)
+                if "open" in event_data:
+                    open_events[(event_id, timestamp)] = obj.duration_seconds
 
-            # 2. Загружаем уже существующие event_id для этого устройства
-            existing_ids = set()
+            # 2. Загружаем уже существующие события этого устройства
+            # (с длительностью - для прироста времени незавершенных событий)
+            existing_keys = {}
             if event_ids:
-                stmt = select(ActivityEvent.event_id).where(
+                stmt = select(
+                    ActivityEvent.event_id,
+                    ActivityEvent.timestamp,
+                    ActivityEvent.duration_seconds,
+                ).where(
                     ActivityEvent.device_id == device_id,
                     ActivityEvent.event_id.in_(event_ids),
                 )
                 result = await session.execute(stmt)
-                existing_ids = {row[0] for row in result.fetchall()}
+                existing_keys = {(row[0], row[1]): row[2] for row in result.fetchall()}
 
             # 3. Отбираем только новые события
             new_events = []
+            seen = {}
             for obj, eid in prepared_events:
-                if eid not in existing_ids:
-                    new_events.append(obj)
+                key = (eid, obj.timestamp)
+                if key in existing_keys:
+                    continue
+                if key in seen:
+                    # Повторное событие в пачке - более позднее наблюдение
+                    seen[key].duration_seconds = obj.duration_seconds
+                    continue
+                seen[key] = obj
+                new_events.append(obj)
+
+            # 4. Обновляем длительность уже сохраненных незавершенных событий
+            open_updates = [
+                {"b_event_id": eid, "b_timestamp": ts, "b_duration": duration}
+                for (eid, ts), duration in open_events.items()
+                if (eid, ts) in existing_keys
+            ]
+            if open_updates:
+                table = ActivityEvent.__table__
+                await session.execute(
+                    update(table)
+                    .where(
+                        table.c.device_id == device_id,
+                        table.c.event_id == bindparam("b_event_id"),
+                        table.c.timestamp == bindparam("b_timestamp"),
+                    )
+                    .values(duration_seconds=bindparam("b_duration")),
+                    open_updates,
+                )
 
-            if not new_events:
+            if not new_events and not open_updates:
                 return []
 
-            # 4. Массовое добавление и коммит
+            # 5. Массовое добавление и сводка устройства
             session.add_all(new_events)
-            await session.commit()
+            await self._record_device_stats(
+                session, device_id, event_type, new_events, open_updates, existing_keys
+            )
+            await self.db.commit(session, existing_session)
 
-            # 5. Возвращаем созданные объекты (они уже с id)
+            # 6. Возвращаем созданные объекты (они уже с id)
             return new_events
 
+    async def _record_device_stats(
+        self,
+        session: AsyncSession,
+        device_id: int,
+        event_type: Optional[str],
+        new_events: List[ActivityEvent],
+        open_updates: List[Dict[str, Any]],
+        existing_durations: Dict[Tuple[str, datetime], float],
+    ) -> None:
+        """Прирост device_stats от пачки: новые события и рост открытых"""
+        today_seconds = 0.0
+        # Время активности, как и в статистике, считается по событиям окон
+        if (event_type or WINDOW_EVENT_TYPE) == WINDOW_EVENT_TYPE:
+            today = datetime.now(timezone.utc).date()
+            for event in new_events:
+                if event.timestamp.astimezone(timezone.utc).date() == today:
+                    today_seconds += event.duration_seconds
+            for update_row in open_updates:
+                timestamp = update_row["b_timestamp"]
+                if timestamp.astimezone(timezone.utc).date() == today:
+                    previous = existing_durations[(update_row["b_event_id"], timestamp)]
+                    today_seconds += max(0.0, update_row["b_duration"] - previous)
+
+        timestamps = [event.timestamp for event in new_events]
+        await self.common.devices.record_events(
+            session,
+            device_id,
+            len(new_events),
+            min(timestamps, default=None),
+            max(timestamps, default=None),
+            today_seconds,
+        )
+
+    async def ingest_batch(
+        self,
+        device_id: int,
+        sync_session_id: Optional[int],
+        events_data: List[Dict[str, Any]],
+        bucket_id: Optional[str] = None,
+        event_type: Optional[str] = None,
+        session: Optional[AsyncSession] = None,
+    ) -> Tuple[int, Optional[Dict[str, Any]]]:
+        """
+        Синхронная вставка пачки событий (протокол v2).
+        Возвращает количество новых событий и водяную отметку пачки -
+        время и event_id самого позднего события, уже зафиксированного в БД.
+        """
+        created = await self.create_events_batch(
+            device_id=device_id,
+            sync_session_id=sync_session_id,
+            events_data=events_data,
+            bucket_id=bucket_id,
+            event_type=event_type,
+            session=session,
+        )
+
+        watermark = None
+        for event_data in events_data:
+            timestamp = parse_event_timestamp(event_data.get("timestamp"))
+            if watermark is None or timestamp > watermark["timestamp"]:
+                event_id = event_data.get("id")
+                watermark = {
+                    "timestamp": timestamp,
+                    "event_id": str(event_id) if event_id is not None else None,
+                }
+        return len(created), watermark
+
+    async def get_bucket_watermarks(
+        self,
+        device_id: int,
+        bucket_ids: List[str],
+        session: Optional[AsyncSession] = None,
+    ) -> Dict[str, Dict[str, Any]]:
+        """
+        Водяные отметки устройства по buckets: время и event_id самого
+        позднего сохраненного события каждого bucket.
+        """
+        if not bucket_ids:
+            return {}
+
+        async with self.db.get_session(session) as session:
+            stmt = (
+                select(
+                    ActivityEvent.bucket_id,
+                    ActivityEvent.timestamp,
+                    ActivityEvent.event_id,
+                )
+                .where(
+                    ActivityEvent.device_id == device_id,
+                    ActivityEvent.bucket_id.in_(bucket_ids),
+                )
+                .distinct(ActivityEvent.bucket_id)
+                .order_by(ActivityEvent.bucket_id, desc(ActivityEvent.timestamp))
+            )
+            result = await session.execute(stmt)
+            return {
+                bucket_id: {"timestamp": timestamp, "event_id": event_id}
+                for bucket_id, timestamp, event_id in result.fetchall()
+            }
+
     async def get_event_by_unique(
         self, device_id: int, event_id: str, timestamp: datetime
     ) -> Optional[ActivityEvent]:
@@ -186,8 +345,8 @@ class ActivityEventsCRUD:
         end_time: Optional[datetime] = None,
         limit: int = 1000,
     ) -> List[ActivityEvent]:
-        """Получить события устройства за период"""
-        async with self.db.get_session() as session:
+        """Получить события устройства за период (с реплики, если есть)"""
+        async with self.db.get_read_session() as session:
             stmt = select(ActivityEvent).where(ActivityEvent.device_id == device_id)
 
             if start_time:
@@ -201,8 +360,8 @@ class ActivityEventsCRUD:
             return list(result.scalars().all())
 
     async def get_daily_stats(self, device_id: int, date: datetime) -> Dict[str, Any]:
-        """Получить статистику за день"""
-        async with self.db.get_session() as session:
+        """Получить статистику за день (с реплики, если есть)"""
+        async with self.db.get_read_session() as session:
             # Начало и конец дня
             start_of_day = date.replace(
                 hour=0, minute=0, second=0, microsecond=0, tzinfo=timezone.utc
@@ -3,10 +3,13 @@ from __future__ import annotations
 
 from datetime import datetime, timezone
 from typing import TYPE_CHECKING, List, Optional
-from sqlalchemy import select, text
+from sqlalchemy import case, func, select, text, update
 from sqlalchemy import or_
-from sqlalchemy.orm import noload
-from src.activitywatch.database.models import Device, DevicePlatform
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import joinedload, noload
+from src.activitywatch.core.security import device_token_cache, principal_cache
+from src.activitywatch.database.models import Device, DevicePlatform, DeviceStats, User
 
 from src.activitywatch.database.db_manager import DatabaseManager
 
@@ -41,20 +44,28 @@ class DevicesCRUD:
                 meta_data={},
             )
             session.add(device)
+            await self._change_devices_count(session, user_id, 1)
             await session.commit()
             await session.refresh(device)
+            principal_cache.invalidate_user(user_id)
             return device
 
     async def get_user_devices(self, user_id: int) -> List[Device]:
+        """Устройства пользователя со сводкой device_stats - одним запросом"""
         async with self.db.get_session() as session:
             stmt = select(Device).where(Device.user_id == user_id).options(
                 noload(Device.user),
                 noload(Device.tokens),
                 noload(Device.sync_sessions),
-                noload(Device.activity_events)
+                noload(Device.activity_events),
+                joinedload(Device.stats).joinedload(DeviceStats.last_sync_session),
             )
             result = await session.execute(stmt)
-            return list(result.scalars().all())
+            devices = list(result.scalars().all())
+        # last_seen с учетом активности, еще не записанной в БД
+        for device in devices:
+            device.last_seen = self.common.presence.last_seen(device.id, device.last_seen)
+        return devices
 
     async def get_device_by_id(
         self, device_id: int, user_id: int = None
@@ -102,6 +113,8 @@ class DevicesCRUD:
 
             await session.commit()
             await session.refresh(device)
+            # Токены устройства закэшированы со старым device_id
+            device_token_cache.invalidate_device(device.id)
             return device
 
     async def delete_device(self, device_id: int, user_id: int) -> bool:
@@ -118,26 +131,93 @@ class DevicesCRUD:
                 return False
 
             await session.delete(device)
+            await self._change_devices_count(session, user_id, -1)
             await session.commit()
+            principal_cache.invalidate_user(user_id)
+            # Токены удаляются каскадом вместе с устройством
+            device_token_cache.invalidate_device(device_id)
+            # Сессии удалены каскадом: следующая пачка получит 410, а не 500
+            self.common.sync.forget_device(device_id)
             return True
 
-    async def update_device_last_seen(self, device_id: int) -> Optional[Device]:
-        """Обновить время последней активности устройства"""
-        async with self.db.get_session() as session:
-            stmt = select(Device).where(Device.id == device_id)
-            result = await session.execute(stmt)
-            device = result.scalar_one_or_none()
-
-            if device:
-                device.last_seen = datetime.now(timezone.utc)
-                device.is_active = True
-                await session.commit()
-                await session.refresh(device)
+    @staticmethod
+    async def _change_devices_count(session, user_id: int, delta: int) -> None:
+        """Изменить счетчик users.devices_count в транзакции session"""
+        await session.execute(
+            update(User)
+            .where(User.id == user_id)
+            .values(devices_count=User.devices_count + delta)
+        )
+
+    @staticmethod
+    async def record_events(
+        session: AsyncSession,
+        device_id: int,
+        events_count: int,
+        first_event_at: Optional[datetime],
+        last_event_at: Optional[datetime],
+        today_seconds: float = 0,
+    ) -> None:
+        """
+        Учесть пачку событий в device_stats в транзакции session.
+
+        Одна вставка с ON CONFLICT: счетчики прибавляются, границы времени
+        расширяются, today_seconds обнуляется при смене дня (UTC).
+        """
+        if not events_count and not today_seconds:
+            return
+        today = datetime.now(timezone.utc).date()
+        stmt = insert(DeviceStats).values(
+            device_id=device_id,
+            stats_date=today,
+            today_seconds=today_seconds,
+            total_events=events_count,
+            first_event_at=first_event_at,
+            last_event_at=last_event_at,
+        )
+        stats = DeviceStats.__table__.c
+        await session.execute(
+            stmt.on_conflict_do_update(
+                index_elements=[stats.device_id],
+                set_={
+                    "stats_date": stmt.excluded.stats_date,
+                    "today_seconds": case(
+                        (
+                            stats.stats_date == stmt.excluded.stats_date,
+                            stats.today_seconds + stmt.excluded.today_seconds,
+                        ),
+                        else_=stmt.excluded.today_seconds,
+                    ),
+                    "total_events": stats.total_events + stmt.excluded.total_events,
+                    # LEAST и GREATEST в Postgres пропускают NULL
+                    "first_event_at": func.least(stats.first_event_at, stmt.excluded.first_event_at),
+                    "last_event_at": func.greatest(stats.last_event_at, stmt.excluded.last_event_at),
+                },
+            )
+        )
+
+    @staticmethod
+    async def record_sync_session(
+        session: AsyncSession, device_id: int, sync_session_id: int
+    ) -> None:
+        """Запомнить последнюю сессию синхронизации устройства в device_stats"""
+        stmt = insert(DeviceStats).values(
+            device_id=device_id,
+            stats_date=datetime.now(timezone.utc).date(),
+            last_sync_session_id=sync_session_id,
+        )
+        await session.execute(
+            stmt.on_conflict_do_update(
+                index_elements=[DeviceStats.__table__.c.device_id],
+                set_={"last_sync_session_id": stmt.excluded.last_sync_session_id},
+            )
+        )
 
-            return device
-    async def find_device_by_identifier(self, device_identifier: str) -> Optional[Device]:
+    async def find_device_by_identifier(
+        self, device_identifier: str, session: Optional[AsyncSession] = None
+    ) -> Optional[Device]:
         """Ищет устройство по device_id (строка!)"""
-        async with self.db.get_session() as session:
+        async with self.db.get_session(session) as session:
             stmt = select(Device).where(
                 Device.device_id == device_identifier  # ← Строка!
             )
@@ -3,16 +3,61 @@
 from datetime import datetime, timedelta, timezone
 import os
 from typing import TYPE_CHECKING, Optional, List, Dict, Any
-from sqlalchemy import and_, func, select, text
+from sqlalchemy import func, literal, select, union_all
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.dialects.postgresql import array_agg
 
 from src.activitywatch.database.db_manager import DatabaseManager
-from src.activitywatch.database.models import ActivityEvent, Device
+from src.activitywatch.database.models import (
+    ActivityEvent,
+    ActivityRollup,
+    Device,
+    WINDOW_EVENT_TYPE,
+)
 
 if TYPE_CHECKING:
     from . import CommonCRUD
 
+# Время активности считается только по событиям окон: AFK- и браузерные
+# события перекрываются с ними по времени
+_WINDOW_EVENTS = ActivityEvent.event_type == WINDOW_EVENT_TYPE
+
+
+def _window_activity(user_id: int, cutoff: datetime):
+    """
+    Активность окон пользователя начиная с cutoff из обоих источников:
+    сырых событий и почасовых итогов событий старше срока хранения
+    (database.retention). Событие учтено ровно в одном из них, поэтому
+    суммы складываются; граница итогов - с точностью до часа.
+
+    Колонки: device_id, ts (время события или начало часа), app,
+    seconds, events (количество событий).
+    """
+    user_devices = select(Device.id).where(Device.user_id == user_id)
+    raw = select(
+        ActivityEvent.device_id.label("device_id"),
+        ActivityEvent.timestamp.label("ts"),
+        ActivityEvent.app.label("app"),
+        ActivityEvent.duration_seconds.label("seconds"),
+        literal(1).label("events"),
+    ).where(
+        ActivityEvent.device_id.in_(user_devices),
+        ActivityEvent.timestamp >= cutoff,
+        _WINDOW_EVENTS,
+    )
+    rolled = select(
+        ActivityRollup.device_id,
+        ActivityRollup.hour,
+        ActivityRollup.app,
+        ActivityRollup.duration_seconds,
+        ActivityRollup.event_count,
+    ).where(
+        ActivityRollup.device_id.in_(user_devices),
+        ActivityRollup.event_type == WINDOW_EVENT_TYPE,
+        ActivityRollup.hour > cutoff - timedelta(hours=1),
+    )
+    return union_all(raw, rolled).subquery()
+
 
 class StatisticsCRUD:
     db: DatabaseManager
@@ -29,7 +74,7 @@ class StatisticsCRUD:
         session: Optional[AsyncSession] = None,
     ) -> Dict[str, Any]:
         if session is None:
-            async with self.db.get_session() as session:
+            async with self.db.get_read_session() as session:
                 return await self._get_overview_stats(session, user_id, days)
         return await self._get_overview_stats(session, user_id, days)
 
@@ -40,7 +85,7 @@ class StatisticsCRUD:
         session: Optional[AsyncSession] = None,
     ) -> List[Dict[str, Any]]:
         if session is None:
-            async with self.db.get_session() as session:
+            async with self.db.get_read_session() as session:
                 return await self._get_daily_activity_chart(session, user_id, days)
         return await self._get_daily_activity_chart(session, user_id, days)
 
@@ -51,7 +96,7 @@ class StatisticsCRUD:
         session: Optional[AsyncSession] = None,
     ) -> Dict[str, Any]:
         if session is None:
-            async with self.db.get_session() as session:
+            async with self.db.get_read_session() as session:
                 return await self._get_platform_distribution(session, user_id, days)
         return await self._get_platform_distribution(session, user_id, days)
 
@@ -63,7 +108,7 @@ class StatisticsCRUD:
         session: Optional[AsyncSession] = None,
     ) -> List[Dict[str, Any]]:
         if session is None:
-            async with self.db.get_session() as session:
+            async with self.db.get_read_session() as session:
                 return await self._get_top_apps(session, user_id, limit, days)
         return await self._get_top_apps(session, user_id, limit, days)
 
@@ -74,7 +119,7 @@ class StatisticsCRUD:
         session: Optional[AsyncSession] = None,
     ) -> List[List[int]]:
         if session is None:
-            async with self.db.get_session() as session:
+            async with self.db.get_read_session() as session:
                 return await self._get_hourly_activity(session, user_id, days)
         return await self._get_hourly_activity(session, user_id, days)
 
@@ -85,7 +130,7 @@ class StatisticsCRUD:
         session: Optional[AsyncSession] = None,
     ) -> List[Dict[str, Any]]:
         if session is None:
-            async with self.db.get_session() as session:
+            async with self.db.get_read_session() as session:
                 return await self._get_category_distribution(session, user_id, days)
         return await self._get_category_distribution(session, user_id, days)
 
@@ -96,7 +141,7 @@ class StatisticsCRUD:
         session: Optional[AsyncSession] = None,
     ) -> Dict[str, Any]:
         if session is None:
-            async with self.db.get_session() as session:
+            async with self.db.get_read_session() as session:
                 return await self._get_trends(session, user_id, period)
         return await self._get_trends(session, user_id, period)
 
@@ -120,11 +165,10 @@ class StatisticsCRUD:
         ]
 
         # 1. Подзапрос для суммы по дням (используется для вычисления среднего)
+        daily = _window_activity(user_id, cutoff)
         daily_subq = (
-            select(func.sum(ActivityEvent.duration_seconds).label("daily_total"))
-            .join(Device, ActivityEvent.device_id == Device.id)
-            .where(and_(Device.user_id == user_id, ActivityEvent.timestamp >= cutoff))
-            .group_by(func.date_trunc("day", ActivityEvent.timestamp))
+            select(func.sum(daily.c.seconds).label("daily_total"))
+            .group_by(func.date_trunc("day", daily.c.ts))
             .subquery()
         )
 
@@ -132,32 +176,25 @@ class StatisticsCRUD:
         daily_avg_subq = select(func.avg(daily_subq.c.daily_total)).scalar_subquery()
 
         # 3. Подзапрос количества активных устройств
+        devices_activity = _window_activity(user_id, cutoff)
         active_devices_subq = (
             select(func.count(func.distinct(Device.id)))
             .where(
                 Device.user_id == user_id,
                 Device.is_active == True,
-                Device.id.in_(
-                    select(ActivityEvent.device_id).where(
-                        ActivityEvent.timestamp >= cutoff
-                    )
-                ),
+                Device.id.in_(select(devices_activity.c.device_id)),
             )
             .scalar_subquery()
             .label("active_devices")
         )
 
         # 4. Подзапрос продуктивного времени
+        productive = _window_activity(user_id, cutoff)
         productive_subq = (
-            select(func.coalesce(func.sum(ActivityEvent.duration_seconds), 0))
-            .join(Device, ActivityEvent.device_id == Device.id)
+            select(func.coalesce(func.sum(productive.c.seconds), 0))
             .where(
-                and_(
-                    Device.user_id == user_id,
-                    ActivityEvent.timestamp >= cutoff,
-                    func.lower(ActivityEvent.app).in_(
-                        [kw.lower() for kw in productive_keywords]
-                    ),
+                func.lower(productive.c.app).in_(
+                    [kw.lower() for kw in productive_keywords]
                 )
             )
             .scalar_subquery()
@@ -165,20 +202,14 @@ class StatisticsCRUD:
         )
 
         # 5. Основной запрос (итоговые показатели)
-        stmt = (
-            select(
-                func.coalesce(func.sum(ActivityEvent.duration_seconds), 0).label(
-                    "total_seconds"
-                ),
-                func.count(ActivityEvent.id).label("event_count"),
-                func.coalesce(daily_avg_subq, 0).label("avg_daily_seconds"),
-                active_devices_subq,
-                productive_subq,
-            )
-            .select_from(ActivityEvent)
-            .join(Device, ActivityEvent.device_id == Device.id)
-            .where(and_(Device.user_id == user_id, ActivityEvent.timestamp >= cutoff))
-        )
+        activity = _window_activity(user_id, cutoff)
+        stmt = select(
+            func.coalesce(func.sum(activity.c.seconds), 0).label("total_seconds"),
+            func.coalesce(func.sum(activity.c.events), 0).label("event_count"),
+            func.coalesce(daily_avg_subq, 0).label("avg_daily_seconds"),
+            active_devices_subq,
+            productive_subq,
+        ).select_from(activity)
 
         result = await session.execute(stmt)
         row = result.one()
@@ -206,16 +237,15 @@ class StatisticsCRUD:
     ) -> List[Dict[str, Any]]:
         cutoff = datetime.now(timezone.utc) - timedelta(days=days)
 
+        activity = _window_activity(user_id, cutoff)
         # Создаем выражение для даты и даем ему метку
-        date_col = func.date_trunc("day", ActivityEvent.timestamp).label("date")
+        date_col = func.date_trunc("day", activity.c.ts).label("date")
 
         stmt = (
             select(
                 date_col,
-                func.sum(ActivityEvent.duration_seconds).label("total_seconds"),
+                func.sum(activity.c.seconds).label("total_seconds"),
             )
-            .join(Device, ActivityEvent.device_id == Device.id)
-            .where(and_(Device.user_id == user_id, ActivityEvent.timestamp >= cutoff))
             .group_by(date_col)  # Используем тот же объект с меткой
             .order_by(date_col)
         )
@@ -250,15 +280,14 @@ class StatisticsCRUD:
     ) -> Dict[str, Any]:
         cutoff = datetime.now(timezone.utc) - timedelta(days=days)
 
+        activity = _window_activity(user_id, cutoff)
         stmt = (
             select(
                 Device.platform,
-                func.coalesce(func.sum(ActivityEvent.duration_seconds), 0).label(
-                    "total_seconds"
-                ),
+                func.coalesce(func.sum(activity.c.seconds), 0).label("total_seconds"),
             )
-            .join(ActivityEvent, Device.id == ActivityEvent.device_id)
-            .where(and_(Device.user_id == user_id, ActivityEvent.timestamp >= cutoff))
+            .select_from(activity)
+            .join(Device, Device.id == activity.c.device_id)
             .group_by(Device.platform)
         )
 
@@ -292,19 +321,19 @@ class StatisticsCRUD:
     ) -> List[Dict[str, Any]]:
         cutoff = datetime.now(timezone.utc) - timedelta(days=days)
 
+        activity = _window_activity(user_id, cutoff)
+        total_seconds = func.sum(activity.c.seconds)
         stmt = (
             select(
-                ActivityEvent.app,
-                func.coalesce(func.sum(ActivityEvent.duration_seconds), 0).label(
-                    "total_seconds"
-                ),
-                func.count(ActivityEvent.id).label("event_count"),
+                activity.c.app,
+                func.coalesce(total_seconds, 0).label("total_seconds"),
+                func.sum(activity.c.events).label("event_count"),
                 array_agg(func.distinct(Device.platform)).label("platforms"),
             )
-            .join(Device, ActivityEvent.device_id == Device.id)
-            .where(and_(Device.user_id == user_id, ActivityEvent.timestamp >= cutoff))
-            .group_by(ActivityEvent.app)
-            .order_by(func.sum(ActivityEvent.duration_seconds).desc())
+            .select_from(activity)
+            .join(Device, Device.id == activity.c.device_id)
+            .group_by(activity.c.app)
+            .order_by(total_seconds.desc())
             .limit(limit)
         )
 
@@ -339,19 +368,20 @@ class StatisticsCRUD:
     async def _get_hourly_activity(
         self, session: AsyncSession, user_id: int, days: int
     ) -> List[List[int]]:
-        # Используем сырой SQL для производительности
-        query = text("""
-            SELECT EXTRACT(DOW FROM ae.timestamp) as day_of_week,
-                   EXTRACT(HOUR FROM ae.timestamp) as hour,
-                   SUM(ae.duration_seconds) as total_seconds
-            FROM activity_events ae
-            JOIN devices d ON ae.device_id = d.id
-            WHERE d.user_id = :user_id
-              AND ae.timestamp >= NOW() - (:days * INTERVAL '1 day')
-            GROUP BY day_of_week, hour
-            ORDER BY day_of_week, hour
-        """)
-        result = await session.execute(query, {"user_id": user_id, "days": days})
+        cutoff = datetime.now(timezone.utc) - timedelta(days=days)
+        activity = _window_activity(user_id, cutoff)
+        day_of_week = func.extract("dow", activity.c.ts)
+        hour = func.extract("hour", activity.c.ts)
+        stmt = (
+            select(
+                day_of_week.label("day_of_week"),
+                hour.label("hour"),
+                func.sum(activity.c.seconds).label("total_seconds"),
+            )
+            .group_by(day_of_week, hour)
+            .order_by(day_of_week, hour)
+        )
+        result = await session.execute(stmt)
         rows = result.fetchall()
 
         heatmap = [[0] * 24 for _ in range(7)]
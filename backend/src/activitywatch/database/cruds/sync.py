@@ -1,10 +1,10 @@
 # 📁 src/activitywatch/cruds/sync_crud.py
-from typing import Optional, List, TYPE_CHECKING
+from typing import Any, Dict, Optional, List, Tuple, TYPE_CHECKING
 from datetime import datetime, timezone
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import and_, select, desc
 
-from src.activitywatch.database.models import SyncSession, SyncStatus
+from src.activitywatch.database.models import Device, SyncSession, SyncStatus
 from src.activitywatch.database.db_manager import DatabaseManager
 
 if TYPE_CHECKING:
@@ -18,27 +18,37 @@ class SyncSessionsCRUD:
     def __init__(self, db: DatabaseManager, common_crud: "CommonCRUD"):
         self.db = db
         self.common = common_crud
+        # Открытые сессии протокола v2: id сессии -> (id устройства, id пользователя)
+        self._open_sessions: Dict[int, Tuple[int, int]] = {}
 
     async def create_sync_session(
         self,
         device_id: int,
         token_id: Optional[int] = None,
-        status: SyncStatus = SyncStatus.PENDING
+        status: SyncStatus = SyncStatus.PENDING,
+        meta_data: Optional[Dict[str, Any]] = None,
+        session: Optional[AsyncSession] = None,
     ) -> SyncSession:
-        """Создать новую сессию синхронизации"""
-        async with self.db.get_session() as session:        
+        """Создать новую сессию синхронизации (во внешней сессии - без коммита)"""
+        existing_session = session
+        async with self.db.get_session(existing_session) as session:
             sync_session = SyncSession(
                 device_id=device_id,
                 token_id=token_id,
                 start_time=datetime.now(timezone.utc),
                 status=status,
-                meta_data={"source": "activitywatch"}
+                meta_data=meta_data or {"source": "activitywatch"}
             )
             
             session.add(sync_session)
-            await session.commit()
-            await session.refresh(sync_session)
-            
+            await session.flush()
+            await self.common.devices.record_sync_session(
+                session, device_id, sync_session.id
+            )
+            await self.db.commit(session, existing_session)
+            if existing_session is None:
+                await session.refresh(sync_session)
+
             return sync_session
         
     # async def complete_sync_session(
@@ -65,6 +75,71 @@ class SyncSessionsCRUD:
             
     #         return sync_session
     
+    async def get_open_session_device(
+        self, sync_session_id: int, session: Optional[AsyncSession] = None
+    ) -> Optional[Tuple[int, int]]:
+        """Получить (ID устройства, ID пользователя) открытой сессии синхронизации (с кэшем)"""
+        owner = self._open_sessions.get(sync_session_id)
+        if owner is not None:
+            return owner
+        # Закрытие еще в буфере присутствия и не записано в БД
+        if self.common.presence.session_finished(sync_session_id):
+            return None
+
+        async with self.db.get_session(session) as session:
+            stmt = (
+                select(SyncSession.device_id, Device.user_id)
+                .join(Device, Device.id == SyncSession.device_id)
+                .where(
+                    and_(
+                        SyncSession.id == sync_session_id,
+                        SyncSession.end_time.is_(None),
+                    )
+                )
+            )
+            row = (await session.execute(stmt)).first()
+
+        if row is None:
+            return None
+        if len(self._open_sessions) >= 10000:
+            self._open_sessions.clear()
+        owner = self._open_sessions[sync_session_id] = (row.device_id, row.user_id)
+        return owner
+
+    async def get_open_v2_sessions(
+        self, device_id: int, session: Optional[AsyncSession] = None
+    ) -> List[int]:
+        """ID незакрытых сессий протокола v2 устройства"""
+        async with self.db.get_session(session) as session:
+            stmt = select(SyncSession.id, SyncSession.meta_data).where(
+                and_(
+                    SyncSession.device_id == device_id,
+                    SyncSession.end_time.is_(None),
+                    SyncSession.status == SyncStatus.IN_PROGRESS,
+                )
+            )
+            result = await session.execute(stmt)
+            return [
+                session_id
+                for session_id, meta_data in result.all()
+                if (meta_data or {}).get("protocol") == 2
+            ]
+
+    def close_session(self, sync_session_id: int) -> None:
+        """
+        Закрыть сессию протокола v2: end_time и статус записываются
+        отложенно (db.presence), из кэша открытых сессий она убирается сразу.
+        """
+        self._open_sessions.pop(sync_session_id, None)
+        self.common.presence.finish_session(sync_session_id)
+
+    def forget_device(self, device_id: int) -> None:
+        """Убрать из кэша открытых сессий сессии устройства (pk)"""
+        for session_id in [
+            sid for sid, (cached, _) in self._open_sessions.items() if cached == device_id
+        ]:
+            del self._open_sessions[session_id]
+
     async def get_device_sessions(
         self,
         device_id: int,
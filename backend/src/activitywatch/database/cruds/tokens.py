@@ -6,7 +6,8 @@ import uuid
 from sqlalchemy import select
 
 
-from src.activitywatch.database.models import ApiToken
+from src.activitywatch.core.security import device_token_cache
+from src.activitywatch.database.models import ApiToken, Device
 
 from src.activitywatch.database.db_manager import DatabaseManager
 
@@ -81,21 +82,49 @@ class ApiTokensCRUD:
             result = await session.execute(stmt)
             return list(result.scalars().all())
 
-    async def revoke_token(self, token_id: int, user_id: int) -> bool:
-        """Отозвать токен"""
+    async def get_token_device(self, token_hash: str) -> Optional[Dict[str, Any]]:
+        """
+        Устройство токена по хэшу (для device_token_cache).
+
+        Returns:
+            Optional[Dict[str, Any]]: device_id (pk), user_id и
+                device_identifier или None, если токена нет
+        """
+        async with self.db.get_session() as session:
+            stmt = (
+                select(Device.id, Device.user_id, Device.device_id)
+                .join(ApiToken, ApiToken.device_id == Device.id)
+                .where(ApiToken.token_hash == token_hash)
+            )
+            row = (await session.execute(stmt)).first()
+
+        if row is None:
+            return None
+        return {"device_id": row.id, "user_id": row.user_id, "device_identifier": row.device_id}
+
+    async def revoke_token(
+        self, token_id: int, user_id: int, device_id: Optional[int] = None
+    ) -> bool:
+        """Отозвать (удалить) токен и сбросить его в кэше токенов устройств"""
         async with self.db.get_session() as session:
             stmt = select(ApiToken).where(
                 ApiToken.id == token_id, ApiToken.user_id == user_id
             )
+            if device_id is not None:
+                stmt = stmt.where(ApiToken.device_id == device_id)
             result = await session.execute(stmt)
             token = result.scalar_one_or_none()
 
-        
+            if not token:
+                return False
+
+            token_hash = token.token_hash
+            await session.delete(token)
+            await session.commit()
 
-            return False
+        device_token_cache.invalidate(token_hash)
+        return True
 
     def _hash_token(self, token: str) -> str:
-        """Хэширование токена (используйте bcrypt в production!)"""
-        import hashlib
-
-        return hashlib.sha256(token.encode()).hexdigest()
+        """Хэширование токена (тот же sha256, что и ключ device_token_cache)"""
+        return device_token_cache.key(token)
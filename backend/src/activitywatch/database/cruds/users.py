@@ -8,7 +8,7 @@ from sqlalchemy import select, text
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import noload
 from src.activitywatch.database.models import User
-from src.activitywatch.core.security import verify_password, get_password_hash
+from src.activitywatch.core.security import password_hasher, principal_cache
 from src.activitywatch.database.db_manager import DatabaseManager
 
 if TYPE_CHECKING:
@@ -30,6 +30,10 @@ class UsersCRUD:
         settings: Optional[dict] = None,
     ) -> User:
         """Создание нового пользователя"""
+        # Хэшируем пароль до открытия сессии: пока поток Argon2 занят,
+        # соединение пула не удерживается
+        password_hash = await password_hasher.hash(password)
+
         async with self.db.get_session() as session:
             # Проверяем, существует ли пользователь с таким email
             existing_user = await self.get_user_by_email(email, session=session)
@@ -44,9 +48,6 @@ class UsersCRUD:
                 if existing_username:
                     raise ValueError("Пользователь с таким именем уже существует")
 
-            # Хэшируем пароль
-            password_hash = get_password_hash(password)
-
             # Создаем пользователя
             new_user = User(
                 email=email,
@@ -141,7 +142,7 @@ class UsersCRUD:
         if not user.password_hash:
             return None
 
-        if not verify_password(password, user.password_hash):
+        if not await password_hasher.verify(password, user.password_hash):
             return None
 
         if not user.is_active:
@@ -162,6 +163,8 @@ class UsersCRUD:
 
     async def update_user_password(self, user_id: int, new_password: str) -> bool:
         """Обновление пароля пользователя"""
+        password_hash = await password_hasher.hash(new_password)
+
         async with self.db.get_session() as session:
             stmt = select(User).where(User.id == user_id)
             result = await session.execute(stmt)
@@ -170,11 +173,50 @@ class UsersCRUD:
             if not user:
                 return False
 
-            user.password_hash = get_password_hash(new_password)
+            user.password_hash = password_hash
             user.updated_at = datetime.now(timezone.utc)
             await session.commit()
+            principal_cache.invalidate_user(user_id)
             return True
 
+    # Поля, которые можно менять через update_user
+    UPDATABLE_FIELDS = {"username", "is_active", "is_verified", "settings"}
+
+    async def update_user(self, user_id: int, **fields) -> Optional[User]:
+        """
+        Обновление полей пользователя (username, is_active, is_verified, settings).
+
+        Деактивация - update_user(user_id, is_active=False). Кэш
+        пользователей по JWT сбрасывается, чтобы изменения были видны
+        в get_current_user сразу.
+
+        Raises:
+            ValueError: Поле нельзя менять через update_user
+        """
+        unknown = set(fields) - self.UPDATABLE_FIELDS
+        if unknown:
+            raise ValueError(f"Нельзя обновить поля: {', '.join(sorted(unknown))}")
+
+        async with self.db.get_session() as session:
+            stmt = select(User).where(User.id == user_id).options(
+                noload(User.devices),
+                noload(User.tokens)
+            )
+            result = await session.execute(stmt)
+            user = result.scalar_one_or_none()
+
+            if not user:
+                return None
+
+            for name, value in fields.items():
+                setattr(user, name, value)
+            user.updated_at = datetime.now(timezone.utc)
+            await session.commit()
+            await session.refresh(user)
+
+        principal_cache.invalidate_user(user_id)
+        return user
+
     async def get_user_by_id(self, user_id: int) -> Optional[User]:
         async with self.db.get_session() as session:
             stmt = select(User).where(User.id == user_id).options(
@@ -1,24 +1,276 @@
+import asyncio
+import logging
 from collections.abc import AsyncIterator
 from contextlib import asynccontextmanager
+from typing import List, Optional, Sequence
 
+from sqlalchemy import exc, text
+from sqlalchemy.engine import make_url
 from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 
+from src.activitywatch.core.metrics import Gauge, Metric, registry
+from src.activitywatch.database.query_stats import (
+    QueryStats,
+    TimedQueuePool,
+    instrument_engine,
+)
+
+logger = logging.getLogger(__name__)
+
+# Отставание реплики в секундах. Если все полученные WAL уже применены,
+# реплика догнала мастер: время последней транзакции на простаивающем
+# мастере не считается отставанием. Не реплика (pg_is_in_recovery = false)
+# отстает на 0.
+REPLICA_LAG_SQL = text(
+    """
+    SELECT CASE
+        WHEN NOT pg_is_in_recovery() THEN 0
+        WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0
+        ELSE COALESCE(
+            EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 1e9
+        )
+    END
+    """
+)
+
 
 class DatabaseManager:
-    def __init__(self, database_url):
+    """
+    Движок, пул соединений и фабрика сессий.
+
+    Args:
+        database_url: URL БД (postgresql+asyncpg://...)
+        slow_query_ms: Порог медленного запроса для статистики, мс
+        pool_size: Постоянных соединений в пуле
+        max_overflow: Дополнительных соединений при пике
+        pool_timeout: Ожидание свободного соединения, секунды
+        echo: Логировать SQL
+        statement_cache_size: Размер кэша подготовленных запросов asyncpg
+            на соединение; 0 - без кэша (нужно за pgbouncer в режиме
+            transaction)
+        name: Имя пула в метриках db_pool_*
+        replica_urls: URL реплик только для чтения (get_read_session);
+            у каждой свой пул с теми же размерами, имена replica_1, ...
+        replica_max_lag_seconds: Реплика с большим отставанием не
+            используется, пока не догонит мастер
+        replica_check_interval: Период проверки реплик, секунды
+        replica_pool_timeout: Ожидание соединения из пула реплики, секунды;
+            короткое, чтобы при занятом пуле чтение быстро ушло на мастер
+        collect_metrics: Регистрировать коллектор пулов; у реплик выключен,
+            их пулы выводит коллектор мастера
+    """
+
+    def __init__(
+        self,
+        database_url,
+        slow_query_ms: float = 200,
+        pool_size: int = 20,
+        max_overflow: int = 10,
+        pool_timeout: float = 30,
+        echo: bool = False,
+        statement_cache_size: int = 100,
+        name: str = "primary",
+        replica_urls: Sequence[str] = (),
+        replica_max_lag_seconds: float = 10,
+        replica_check_interval: float = 5,
+        replica_pool_timeout: float = 1,
+        collect_metrics: bool = True,
+    ):
+        self.name = name
+        connect_args = {}
+        if make_url(database_url).drivername == "postgresql+asyncpg":
+            connect_args["prepared_statement_cache_size"] = statement_cache_size
         self.engine = create_async_engine(
             database_url,
-            echo=False,
-            pool_size=20,  # базовых соединений
-            max_overflow=10,  # доп. при пике
+            echo=echo,
+            poolclass=TimedQueuePool,
+            pool_size=pool_size,
+            max_overflow=max_overflow,
+            pool_timeout=pool_timeout,
             pool_pre_ping=True,
+            connect_args=connect_args,
         )
+        # Время, строки и ожидание пула по каждому SQL запросу
+        self.query_stats = QueryStats(slow_query_ms)
+        instrument_engine(self.engine, self.query_stats)
+        self.engine.sync_engine.pool.pool_name = name
         self.AsyncSession = sessionmaker(
             bind=self.engine, expire_on_commit=False, class_=AsyncSession
         )
 
+        # Состояние по последней проверке; имеет смысл только у реплик
+        self.healthy = True
+        self.lag_seconds = 0.0
+        self.replicas = [
+            DatabaseManager(
+                url,
+                slow_query_ms=slow_query_ms,
+                pool_size=pool_size,
+                max_overflow=max_overflow,
+                pool_timeout=replica_pool_timeout,
+                echo=echo,
+                statement_cache_size=statement_cache_size,
+                name=f"replica_{number}",
+                collect_metrics=False,
+            )
+            for number, url in enumerate(replica_urls, start=1)
+        ]
+        self.replica_max_lag_seconds = replica_max_lag_seconds
+        self.replica_check_interval = replica_check_interval
+        self._replica_turn = 0
+        self._monitor_task: Optional[asyncio.Task] = None
+        if collect_metrics:
+            registry.add_collector(self.pool_metrics)
+            if self.replicas:
+                registry.add_collector(self.replica_metrics)
+
+    def pool_metrics(self) -> List[Metric]:
+        """
+        Состояние пулов мастера и реплик в момент вывода /metrics
+        (коллектор реестра): по одной метрике, отсчет на каждый пул.
+        """
+        gauges = (
+            (Gauge("db_pool_size", "Постоянных соединений в пуле", ("pool",)), lambda p: p.size()),
+            (
+                Gauge("db_pool_checked_out", "Соединения, выданные из пула", ("pool",)),
+                lambda p: p.checkedout(),
+            ),
+            (
+                Gauge("db_pool_checked_in", "Свободные соединения в пуле", ("pool",)),
+                lambda p: p.checkedin(),
+            ),
+            # overflow() отрицателен, пока пул не открыл pool_size соединений
+            (
+                Gauge("db_pool_overflow", "Дополнительные соединения сверх pool_size", ("pool",)),
+                lambda p: max(0, p.overflow()),
+            ),
+        )
+        for manager in (self, *self.replicas):
+            pool = manager.engine.sync_engine.pool
+            for gauge, value in gauges:
+                gauge.set(value(pool), manager.name)
+        return [gauge for gauge, _ in gauges]
+
+    def replica_metrics(self) -> List[Metric]:
+        """Доступность и отставание реплик (коллектор реестра)."""
+        healthy = Gauge("db_replica_healthy", "Реплика принимает чтение (1) или нет (0)", ("pool",))
+        lag = Gauge("db_replica_lag_seconds", "Отставание реплики по последней проверке", ("pool",))
+        for replica in self.replicas:
+            healthy.set(int(replica.healthy), replica.name)
+            lag.set(replica.lag_seconds, replica.name)
+        return [healthy, lag]
+
+    async def check_replicas(self) -> None:
+        """
+        Проверяет доступность и отставание каждой реплики.
+
+        Реплика, которая не ответила за replica_check_interval или отстает
+        больше replica_max_lag_seconds, исключается из чтения до
+        следующей успешной проверки.
+        """
+
+        async def check(replica: "DatabaseManager"):
+            try:
+                async with replica.engine.connect() as conn:
+                    lag = float((await conn.execute(REPLICA_LAG_SQL)).scalar())
+            except Exception as e:
+                if replica.healthy:
+                    logger.warning("Реплика %s недоступна: %s", replica.name, e)
+                replica.healthy = False
+                return
+            replica.lag_seconds = lag
+            healthy = lag <= self.replica_max_lag_seconds
+            if healthy != replica.healthy:
+                logger.warning(
+                    "Реплика %s %s, отставание %.1f с",
+                    replica.name,
+                    "снова принимает чтение" if healthy else "исключена из чтения",
+                    lag,
+                )
+            replica.healthy = healthy
+
+        async def check_with_timeout(replica: "DatabaseManager"):
+            try:
+                await asyncio.wait_for(check(replica), self.replica_check_interval)
+            except asyncio.TimeoutError:
+                logger.warning("Реплика %s не ответила на проверку", replica.name)
+                replica.healthy = False
+
+        await asyncio.gather(*(check_with_timeout(r) for r in self.replicas))
+
+    async def start_replica_monitor(self) -> None:
+        """Первая проверка реплик и фоновая проверка раз в replica_check_interval."""
+        if not self.replicas or self._monitor_task is not None:
+            return
+        await self.check_replicas()
+
+        async def monitor():
+            while True:
+                await asyncio.sleep(self.replica_check_interval)
+                try:
+                    await self.check_replicas()
+                except Exception:
+                    logger.exception("Проверка реплик")
+
+        self._monitor_task = asyncio.create_task(monitor())
+
+    async def close(self) -> None:
+        """Останавливает проверку реплик и закрывает все пулы."""
+        if self._monitor_task is not None:
+            self._monitor_task.cancel()
+            try:
+                await self._monitor_task
+            except asyncio.CancelledError:
+                pass
+            self._monitor_task = None
+        for replica in self.replicas:
+            await replica.engine.dispose()
+        await self.engine.dispose()
+
+    def _next_replica(self) -> Optional["DatabaseManager"]:
+        """Следующая доступная реплика по кругу или None."""
+        for _ in range(len(self.replicas)):
+            replica = self.replicas[self._replica_turn % len(self.replicas)]
+            self._replica_turn += 1
+            if replica.healthy:
+                return replica
+        return None
+
+    async def warm_up(self, connections: int) -> int:
+        """
+        Открывает connections соединений заранее, до первых запросов.
+
+        Соединения удерживаются одновременно, иначе пул вернул бы одно и
+        то же соединение; затем они возвращаются в пул открытыми.
+        Ошибка подключения пишется в лог и не мешает запуску приложения.
+
+        Returns:
+            int: Сколько соединений открыто
+        """
+        if connections <= 0:
+            return 0
+        barrier = asyncio.Barrier(connections)
+
+        async def open_connection():
+            try:
+                async with self.engine.connect() as conn:
+                    await conn.execute(text("SELECT 1"))
+                    try:
+                        await barrier.wait()
+                    except asyncio.BrokenBarrierError:
+                        # Другое соединение не открылось, это уже открыто
+                        pass
+                return True
+            except Exception as e:
+                await barrier.abort()
+                logger.warning("Прогрев пула %s: %s", self.name, e)
+                return False
+
+        results = await asyncio.gather(*(open_connection() for _ in range(connections)))
+        return sum(results)
+
     @asynccontextmanager
     async def get_session(
         self, existing_session: AsyncSession = None
@@ -68,5 +320,75 @@ class DatabaseManager:
         else:
             yield existing_session
 
+    def pool_exhausted(self) -> bool:
+        """Выданы ли все соединения пула, включая max_overflow (-1 - без предела)."""
+        pool = self.engine.sync_engine.pool
+        max_overflow = pool._max_overflow
+        return max_overflow >= 0 and pool.checkedout() >= pool.size() + max_overflow
+
+    @asynccontextmanager
+    async def get_read_session(
+        self, existing_session: AsyncSession = None
+    ) -> AsyncIterator[AsyncSession]:
+        """
+        Сессия только для чтения: реплика по кругу, иначе мастер.
+
+        Внешняя сессия (unit of work запроса) используется как есть, чтобы
+        запрос видел свои же изменения. Соединение с репликой берется сразу:
+        если реплика не отвечает, она исключается до следующей проверки, и
+        чтение уходит на мастер. Без реплик - то же, что get_session.
+        """
+        if existing_session is not None:
+            yield existing_session
+            return
+
+        session = None
+        replica = self._next_replica()
+        if replica is not None and replica.pool_exhausted():
+            # Все соединения реплики заняты: не ждем pool_timeout
+            replica = None
+        if replica is not None:
+            session = replica.AsyncSession()
+            try:
+                await session.connection()
+            except exc.TimeoutError:
+                # Пул реплики занят: реплика исправна, читаем с мастера
+                await session.close()
+                session = None
+            except (OSError, exc.DBAPIError) as e:
+                await session.close()
+                session = None
+                replica.healthy = False
+                logger.warning("Реплика %s недоступна, чтение с мастера: %s", replica.name, e)
+
+        if session is None:
+            async with self.get_session() as session:
+                yield session
+            return
+
+        try:
+            yield session
+        except Exception:
+            await session.rollback()
+            raise
+        finally:
+            await session.close()
+
+    @staticmethod
+    async def commit(
+        session: AsyncSession, existing_session: Optional[AsyncSession]
+    ) -> None:
+        """
+        Завершает изменения метода CRUD.
+
+        Если метод открыл сессию сам (existing_session is None), она
+        коммитится. Во внешней сессии (unit of work запроса) изменения
+        только отправляются в БД (flush): коммитит владелец сессии.
+        """
+        if existing_session is None:
+            await session.commit()
+        else:
+            await session.flush()
+
 
 Base = declarative_base()
@@ -1,11 +1,12 @@
 import uuid
-from datetime import datetime, timezone
+from datetime import date, datetime, timezone
 from typing import Optional, List, Dict, Any
 from sqlalchemy import (
     String,
     Integer,
     BigInteger,
     Boolean,
+    Date,
     DateTime,
     Float,
     Text,
@@ -65,6 +66,10 @@ class Base(DeclarativeBase):
         return session.get(cls, id)
 
 
+# Тип bucket ActivityWatch с активностью окон; статистика строится по нему
+WINDOW_EVENT_TYPE = "currentwindow"
+
+
 # Enums
 class DevicePlatform(str, enum.Enum):
     """Платформы устройств"""
@@ -143,6 +148,13 @@ class User(Base):
         server_default=text("'{}'::jsonb"),
         comment="Настройки пользователя в формате JSON",
     )
+    devices_count: Mapped[int] = mapped_column(
+        Integer,
+        nullable=False,
+        default=0,
+        server_default=text("0"),
+        comment="Количество устройств (поддерживается DevicesCRUD)",
+    )
     created_at: Mapped[datetime] = mapped_column(
         DateTime(timezone=True),
         nullable=False,
@@ -174,11 +186,6 @@ class User(Base):
             raise ValueError("Invalid email address")
         return value.lower()
 
-    @hybrid_property
-    def devices_count(self) -> int:
-        """Количество устройств пользователя"""
-        return len(self.devices) if self.devices else 0
-
 
 class Device(Base):
     __tablename__ = "devices"
@@ -226,12 +233,82 @@ class Device(Base):
         cascade="all, delete-orphan",
         lazy="select",
     )
+    # Загружается явно (joinedload) там, где нужна; строка удаляется каскадом БД
+    stats: Mapped[Optional["DeviceStats"]] = relationship(
+        "DeviceStats", uselist=False, lazy="noload", passive_deletes=True
+    )
 
     def update_last_seen(self):
         """Обновляет время последней активности"""
         self.last_seen = datetime.now(timezone.utc)
 
 
+class DeviceStats(Base):
+    """
+    Сводка по устройству для списка устройств.
+
+    Поддерживается приемом событий (DevicesCRUD.record_events) и созданием
+    сессий синхронизации, поэтому список устройств не агрегирует
+    activity_events. today_seconds относится к дню stats_date (UTC).
+    """
+
+    __tablename__ = "device_stats"
+    __table_args__ = {"comment": "Сводка по устройству, поддерживаемая приемом событий"}
+
+    device_id: Mapped[int] = mapped_column(
+        Integer,
+        ForeignKey("devices.id", ondelete="CASCADE"),
+        primary_key=True,
+        comment="ID устройства",
+    )
+    stats_date: Mapped[date] = mapped_column(
+        Date, nullable=False, comment="День (UTC), к которому относится today_seconds"
+    )
+    today_seconds: Mapped[float] = mapped_column(
+        Float, nullable=False, default=0, server_default=text("0"),
+        comment="Время активности окон за stats_date, секунды",
+    )
+    total_events: Mapped[int] = mapped_column(
+        BigInteger, nullable=False, default=0, server_default=text("0"),
+        comment="Всего сохраненных событий",
+    )
+    first_event_at: Mapped[Optional[datetime]] = mapped_column(
+        DateTime(timezone=True), nullable=True, comment="Время самого раннего события"
+    )
+    last_event_at: Mapped[Optional[datetime]] = mapped_column(
+        DateTime(timezone=True), nullable=True, comment="Время самого позднего события"
+    )
+    last_sync_session_id: Mapped[Optional[int]] = mapped_column(
+        Integer,
+        ForeignKey("sync_sessions.id", ondelete="SET NULL"),
+        nullable=True,
+        comment="Последняя сессия синхронизации",
+    )
+
+    last_sync_session: Mapped[Optional["SyncSession"]] = relationship(
+        "SyncSession", lazy="noload"
+    )
+
+    @property
+    def usage_today_seconds(self) -> float:
+        """Время активности за сегодня: 0, если событий сегодня не было"""
+        if self.stats_date != datetime.now(timezone.utc).date():
+            return 0.0
+        return self.today_seconds
+
+    @property
+    def last_sync_status(self) -> Optional["SyncStatus"]:
+        session = self.last_sync_session
+        return session.status if session is not None else None
+
+    @property
+    def last_sync_at(self) -> Optional[datetime]:
+        session = self.last_sync_session
+        if session is None:
+            return None
+        return session.end_time or session.start_time
+
+
 class ApiToken(Base):
     """API токены для аутентификации устройств"""
 
@@ -395,6 +472,8 @@ class ActivityEvent(Base):
     __tablename__ = "activity_events"
     __table_args__ = (
         Index("ix_events_device_time", "device_id", "timestamp"),
+        Index("ix_events_device_type_time", "device_id", "event_type", "timestamp"),
+        Index("ix_events_device_bucket_time", "device_id", "bucket_id", "timestamp"),
         Index("ix_events_app", "app"),
         UniqueConstraint("device_id", "event_id", "timestamp", name="uq_event_unique"),
         {"comment": "События активности пользователей"},
@@ -419,6 +498,16 @@ class ActivityEvent(Base):
     event_id: Mapped[str] = mapped_column(
         String(255), nullable=False, comment="Уникальный ID события из ActivityWatch"
     )
+    bucket_id: Mapped[Optional[str]] = mapped_column(
+        String(255), nullable=True, comment="ID bucket ActivityWatch"
+    )
+    event_type: Mapped[str] = mapped_column(
+        String(64),
+        nullable=False,
+        default=WINDOW_EVENT_TYPE,
+        server_default=WINDOW_EVENT_TYPE,
+        comment="Тип bucket ActivityWatch (currentwindow, afkstatus, ...)",
+    )
     timestamp: Mapped[datetime] = mapped_column(
         DateTime(timezone=True), nullable=False, index=True, comment="Время события"
     )
@@ -468,14 +557,88 @@ class ActivityEvent(Base):
         return self.duration_seconds / 3600
 
 
+class ActivityRollup(Base):
+    """
+    Почасовые итоги событий, перенесенных из activity_events по сроку хранения.
+
+    Событие находится либо в activity_events, либо учтено здесь (перенос
+    одной транзакцией), поэтому статистика складывает оба источника.
+    """
+
+    __tablename__ = "activity_rollups_hourly"
+    __table_args__ = {"comment": "Почасовые итоги событий старше срока хранения"}
+
+    device_id: Mapped[int] = mapped_column(
+        Integer,
+        ForeignKey("devices.id", ondelete="CASCADE"),
+        primary_key=True,
+        comment="ID устройства",
+    )
+    event_type: Mapped[str] = mapped_column(
+        String(64), primary_key=True, comment="Тип bucket ActivityWatch"
+    )
+    hour: Mapped[datetime] = mapped_column(
+        DateTime(timezone=True), primary_key=True, comment="Начало часа (по времени событий)"
+    )
+    app: Mapped[str] = mapped_column(
+        String(255), primary_key=True, comment="Название приложения"
+    )
+    duration_seconds: Mapped[float] = mapped_column(
+        Float, nullable=False, comment="Суммарная длительность событий, секунды"
+    )
+    event_count: Mapped[int] = mapped_column(
+        Integer, nullable=False, comment="Количество событий"
+    )
+
+
+class ActivityEventArchive(Base):
+    """Сырые события старше срока хранения (retention.mode = archive)"""
+
+    __tablename__ = "activity_events_archive"
+    __table_args__ = (
+        Index("ix_events_archive_device_time", "device_id", "timestamp"),
+        {"comment": "Архив событий активности старше срока хранения"},
+    )
+
+    id: Mapped[int] = mapped_column(
+        Integer, primary_key=True, autoincrement=False, comment="ID события в activity_events"
+    )
+    device_id: Mapped[int] = mapped_column(
+        Integer,
+        ForeignKey("devices.id", ondelete="CASCADE"),
+        nullable=False,
+        comment="ID устройства",
+    )
+    event_id: Mapped[str] = mapped_column(String(255), nullable=False)
+    bucket_id: Mapped[Optional[str]] = mapped_column(String(255), nullable=True)
+    event_type: Mapped[str] = mapped_column(String(64), nullable=False)
+    timestamp: Mapped[datetime] = mapped_column(DateTime(timezone=True), nullable=False)
+    duration_seconds: Mapped[float] = mapped_column(Float, nullable=False)
+    app: Mapped[str] = mapped_column(String(255), nullable=False)
+    window_title: Mapped[Optional[str]] = mapped_column(Text, nullable=True)
+    url: Mapped[Optional[str]] = mapped_column(Text, nullable=True)
+    data: Mapped[Dict[str, Any]] = mapped_column(JSON, nullable=False)
+    created_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), nullable=False)
+    archived_at: Mapped[datetime] = mapped_column(
+        DateTime(timezone=True),
+        nullable=False,
+        server_default=text("CURRENT_TIMESTAMP"),
+        comment="Время переноса в архив",
+    )
+
+
 __all__ = [
     "Base",
     "User",
     "Device",
     "ApiToken",
     "SyncSession",
+    "DeviceStats",
     "ActivityEvent",
+    "ActivityRollup",
+    "ActivityEventArchive",
     "DevicePlatform",
     "SyncStatus",
     "TokenPermission",
+    "WINDOW_EVENT_TYPE",
 ]
@@ -0,0 +1,230 @@
+import asyncio
+import logging
+import time
+from datetime import datetime, timezone
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy import DateTime, Integer, case, cast, column, func, literal, update, values
+
+from src.activitywatch.core.metrics import (
+    Gauge,
+    Metric,
+    presence_flush_duration,
+    presence_flush_errors,
+    presence_flush_rows,
+    registry,
+)
+from src.activitywatch.database.db_manager import DatabaseManager
+from src.activitywatch.database.models import Device, SyncSession, SyncStatus
+
+logger = logging.getLogger(__name__)
+
+# Строк в одном UPDATE ... FROM (VALUES ...): 3 параметра на строку,
+# с запасом до предела asyncpg в 32767 параметров
+FLUSH_CHUNK = 1000
+
+
+class PresenceBuffer:
+    """
+    Отложенная запись присутствия устройств и счетчиков сессий синхронизации.
+
+    Обработчики приема только обновляют словари в памяти (без await и без
+    SQL); раз в flush_interval все накопленные изменения записываются
+    одним UPDATE ... FROM (VALUES ...) на таблицу. last_seen пишется через
+    GREATEST, а события сессии прибавляются, поэтому сбросы нескольких
+    воркеров не затирают друг друга. Если сброс не удался, изменения
+    возвращаются в буфер и уходят со следующим.
+
+    В БД last_seen и events_count отстают не больше чем на flush_interval;
+    last_seen() отдает время с учетом еще не записанного.
+
+    Args:
+        db: Менеджер БД (мастер)
+        flush_interval: Период сброса, секунды
+    """
+
+    def __init__(self, db: DatabaseManager, flush_interval: float = 5):
+        self.db = db
+        self.flush_interval = flush_interval
+        # id устройства -> последнее время активности
+        self._devices: Dict[int, datetime] = {}
+        # id сессии -> [прибавка events_count, end_time или None]
+        self._sessions: Dict[int, List] = {}
+        # Сессии сбрасываемой сейчас порции (до коммита)
+        self._flushing_sessions: Dict[int, List] = {}
+        self._task: Optional[asyncio.Task] = None
+        self._flush_lock = asyncio.Lock()
+        registry.add_collector(self.metrics)
+
+    def touch_device(self, device_id: int, seen_at: Optional[datetime] = None) -> None:
+        """Отметить активность устройства (id строки devices)."""
+        seen_at = seen_at or datetime.now(timezone.utc)
+        current = self._devices.get(device_id)
+        if current is None or seen_at > current:
+            self._devices[device_id] = seen_at
+
+    def add_session_events(self, sync_session_id: int, events_count: int) -> None:
+        """Прибавить события к счетчику сессии синхронизации."""
+        if not events_count:
+            return
+        pending = self._sessions.setdefault(sync_session_id, [0, None])
+        pending[0] += events_count
+
+    def finish_session(
+        self,
+        sync_session_id: int,
+        events_count: int = 0,
+        end_time: Optional[datetime] = None,
+    ) -> None:
+        """Завершить сессию: end_time, статус SUCCESS и прибавка событий."""
+        pending = self._sessions.setdefault(sync_session_id, [0, None])
+        pending[0] += events_count
+        pending[1] = end_time or datetime.now(timezone.utc)
+
+    def session_finished(self, sync_session_id: int) -> bool:
+        """Закрыта ли сессия изменением, еще не записанным в БД."""
+        for sessions in (self._sessions, self._flushing_sessions):
+            pending = sessions.get(sync_session_id)
+            if pending is not None and pending[1] is not None:
+                return True
+        return False
+
+    def last_seen(self, device_id: int, stored: Optional[datetime] = None) -> Optional[datetime]:
+        """Время активности устройства с учетом еще не записанного в БД."""
+        pending = self._devices.get(device_id)
+        if pending is None or (stored is not None and stored >= pending):
+            return stored
+        return pending
+
+    def pending(self) -> Tuple[int, int]:
+        """Устройств и сессий, ожидающих записи."""
+        return len(self._devices), len(self._sessions)
+
+    def metrics(self) -> List[Metric]:
+        """Размер буфера в момент вывода /metrics (коллектор реестра)."""
+        gauge = Gauge("presence_buffer_pending", "Строки, ожидающие записи", ("table",))
+        devices, sessions = self.pending()
+        gauge.set(devices, "devices")
+        gauge.set(sessions, "sync_sessions")
+        return [gauge]
+
+    async def flush(self) -> int:
+        """
+        Записать накопленные изменения в одной транзакции.
+
+        Returns:
+            int: Сколько строк отправлено в UPDATE
+        """
+        async with self._flush_lock:
+            # Подмена словарей без await: изменения, пришедшие во время
+            # записи, попадают уже в новый буфер
+            devices, self._devices = self._devices, {}
+            sessions, self._sessions = self._sessions, {}
+            if not devices and not sessions:
+                return 0
+
+            self._flushing_sessions = sessions
+            started = time.perf_counter()
+            try:
+                async with self.db.get_session() as session:
+                    device_rows = list(devices.items())
+                    for start in range(0, len(device_rows), FLUSH_CHUNK):
+                        await session.execute(
+                            self._devices_statement(device_rows[start : start + FLUSH_CHUNK])
+                        )
+                    session_rows = [
+                        (session_id, delta, end_time)
+                        for session_id, (delta, end_time) in sessions.items()
+                    ]
+                    for start in range(0, len(session_rows), FLUSH_CHUNK):
+                        await session.execute(
+                            self._sessions_statement(session_rows[start : start + FLUSH_CHUNK])
+                        )
+                    await session.commit()
+            except Exception as e:
+                self._restore(devices, sessions)
+                presence_flush_errors.inc()
+                logger.warning("Сброс присутствия не удался, повтор позже: %s", e)
+                return 0
+            finally:
+                self._flushing_sessions = {}
+                presence_flush_duration.observe(time.perf_counter() - started)
+
+        presence_flush_rows.inc(len(devices), "devices")
+        presence_flush_rows.inc(len(sessions), "sync_sessions")
+        return len(devices) + len(sessions)
+
+    @staticmethod
+    def _devices_statement(rows: List[Tuple[int, datetime]]):
+        pending = values(
+            column("id", Integer),
+            column("last_seen", DateTime(timezone=True)),
+            name="pending",
+        ).data(rows)
+        return (
+            update(Device)
+            .where(Device.id == pending.c.id)
+            .values(last_seen=func.greatest(Device.last_seen, pending.c.last_seen), is_active=True)
+            .execution_options(synchronize_session=False)
+        )
+
+    @staticmethod
+    def _sessions_statement(rows: List[Tuple[int, int, Optional[datetime]]]):
+        pending = values(
+            column("id", Integer),
+            column("events", Integer),
+            column("end_time", DateTime(timezone=True)),
+            name="pending",
+        ).data(rows)
+        # None в VALUES выводится как NULL без типа: без приведения колонка
+        # из одних NULL получила бы тип text
+        end_time = cast(pending.c.end_time, DateTime(timezone=True))
+        return (
+            update(SyncSession)
+            .where(SyncSession.id == pending.c.id)
+            .values(
+                events_count=SyncSession.events_count + pending.c.events,
+                end_time=func.coalesce(end_time, SyncSession.end_time),
+                status=case(
+                    (
+                        end_time.is_not(None),
+                        literal(SyncStatus.SUCCESS, SyncSession.status.type),
+                    ),
+                    else_=SyncSession.status,
+                ),
+            )
+            .execution_options(synchronize_session=False)
+        )
+
+    def _restore(self, devices: Dict[int, datetime], sessions: Dict[int, List]) -> None:
+        """Вернуть в буфер изменения несостоявшегося сброса."""
+        for device_id, seen_at in devices.items():
+            self.touch_device(device_id, seen_at)
+        for session_id, (delta, end_time) in sessions.items():
+            pending = self._sessions.setdefault(session_id, [0, None])
+            pending[0] += delta
+            if end_time is not None and pending[1] is None:
+                pending[1] = end_time
+
+    def start(self) -> None:
+        """Запустить периодический сброс в цикле событий приложения."""
+        if self._task is not None:
+            return
+
+        async def flush_periodically():
+            while True:
+                await asyncio.sleep(self.flush_interval)
+                await self.flush()
+
+        self._task = asyncio.create_task(flush_periodically())
+
+    async def stop(self) -> None:
+        """Остановить периодический сброс и записать остаток."""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self.flush()
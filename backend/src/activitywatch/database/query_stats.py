@@ -0,0 +1,256 @@
+import json
+import logging
+import time
+from collections import deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from datetime import datetime, timezone
+from typing import Deque, Dict, Iterator, Optional
+
+from sqlalchemy import event, exc
+from sqlalchemy.ext.asyncio import AsyncEngine
+from sqlalchemy.pool import AsyncAdaptedQueuePool
+
+from src.activitywatch.core.metrics import (
+    COUNT_BUCKETS,
+    Histogram,
+    current_route,
+    db_pool_timeouts,
+    db_pool_wait,
+)
+
+slow_query_logger = logging.getLogger("activitywatch.sql.slow")
+
+# Сколько последних медленных запросов хранить для /debug/db-stats
+SLOW_QUERY_HISTORY = 50
+# Длина текста запроса в логе медленных запросов
+STATEMENT_LOG_LIMIT = 2000
+
+
+class QueryBudgetExceeded(AssertionError):
+    """Выполнено больше SQL запросов, чем разрешено бюджетом."""
+
+
+class QueryCounter:
+    """
+    Счетчик SQL запросов в контексте (HTTP запрос, блок query_budget).
+
+    Счетчики вкладываются: запрос учитывается во всех счетчиках цепочки,
+    поэтому бюджет теста учитывает и запросы, посчитанные middleware.
+    Один объект разделяется задачами asyncio.gather внутри контекста.
+    """
+
+    __slots__ = ("count", "checkouts", "parent")
+
+    def __init__(self, parent: Optional["QueryCounter"] = None):
+        self.count = 0
+        # Сколько раз соединение бралось из пула
+        self.checkouts = 0
+        self.parent = parent
+
+    def increment(self):
+        counter = self
+        while counter is not None:
+            counter.count += 1
+            counter = counter.parent
+
+    def increment_checkouts(self):
+        counter = self
+        while counter is not None:
+            counter.checkouts += 1
+            counter = counter.parent
+
+
+_query_counter: ContextVar[Optional[QueryCounter]] = ContextVar(
+    "query_counter", default=None
+)
+
+
+class RouteQueryStats:
+    """Статистика SQL запросов одного маршрута."""
+
+    __slots__ = ("latency_ms", "rows", "per_request", "checkouts_per_request")
+
+    def __init__(self):
+        self.latency_ms = Histogram()
+        self.rows = Histogram(COUNT_BUCKETS)
+        self.per_request = Histogram(COUNT_BUCKETS)
+        self.checkouts_per_request = Histogram(COUNT_BUCKETS)
+
+
+class QueryStats:
+    """
+    Статистика SQL запросов движка по маршрутам.
+
+    Заполняется обработчиками событий SQLAlchemy (instrument_engine):
+    время выполнения и число строк каждого запроса, время ожидания
+    соединения из пула, количество запросов и взятий соединения из
+    пула на HTTP запрос.
+    Запросы дольше slow_query_ms пишутся в лог activitywatch.sql.slow
+    одной JSON-строкой.
+
+    Args:
+        slow_query_ms: Порог медленного запроса, миллисекунды
+    """
+
+    def __init__(self, slow_query_ms: float = 200):
+        self.slow_query_ms = slow_query_ms
+        self.reset()
+
+    def reset(self):
+        self.routes: Dict[str, RouteQueryStats] = {}
+        self.pool_wait_ms = Histogram()
+        self.slow_queries: Deque[Dict] = deque(maxlen=SLOW_QUERY_HISTORY)
+        self.started_at = datetime.now(timezone.utc)
+
+    def _route(self, route: str) -> RouteQueryStats:
+        stats = self.routes.get(route)
+        if stats is None:
+            stats = self.routes[route] = RouteQueryStats()
+        return stats
+
+    def record_query(self, statement: str, duration_ms: float, rows: int):
+        route = current_route.get()
+        stats = self._route(route)
+        stats.latency_ms.observe(duration_ms)
+        if rows >= 0:
+            stats.rows.observe(rows)
+
+        counter = _query_counter.get()
+        if counter is not None:
+            counter.increment()
+
+        if duration_ms >= self.slow_query_ms:
+            entry = {
+                "at": datetime.now(timezone.utc).isoformat(),
+                "route": route,
+                "duration_ms": round(duration_ms, 2),
+                "rows": rows,
+                "statement": " ".join(statement.split())[:STATEMENT_LOG_LIMIT],
+            }
+            self.slow_queries.append(entry)
+            slow_query_logger.warning(json.dumps(entry, ensure_ascii=False))
+
+    def record_pool_wait(self, duration_ms: float):
+        self.pool_wait_ms.observe(duration_ms)
+
+    def record_checkout(self):
+        counter = _query_counter.get()
+        if counter is not None:
+            counter.increment_checkouts()
+
+    def record_request(self, route: str, queries: int, checkouts: int = 0):
+        stats = self._route(route)
+        stats.per_request.observe(queries)
+        stats.checkouts_per_request.observe(checkouts)
+
+    def snapshot(self) -> Dict:
+        return {
+            "since": self.started_at.isoformat(),
+            "slow_query_ms": self.slow_query_ms,
+            "pool_wait_ms": self.pool_wait_ms.summary(),
+            "routes": {
+                route: {
+                    "latency_ms": stats.latency_ms.summary(),
+                    "rows": stats.rows.summary(),
+                    "queries_per_request": stats.per_request.summary(),
+                    "checkouts_per_request": stats.checkouts_per_request.summary(),
+                }
+                for route, stats in sorted(self.routes.items())
+            },
+            "slow_queries": list(self.slow_queries),
+        }
+
+
+class TimedQueuePool(AsyncAdaptedQueuePool):
+    """
+    Пул, замеряющий время получения соединения.
+
+    Включает ожидание свободного соединения и открытие нового
+    при росте пула. Время пишется в статистику (назначается после
+    создания движка) и в метрику db_pool_wait_seconds, исчерпание
+    pool_timeout - в db_pool_timeouts_total.
+    """
+
+    query_stats: Optional[QueryStats] = None
+    pool_name: str = "primary"
+
+    def connect(self):
+        started = time.perf_counter()
+        try:
+            return super().connect()
+        except exc.TimeoutError:
+            db_pool_timeouts.inc(1, self.pool_name)
+            raise
+        finally:
+            waited = time.perf_counter() - started
+            db_pool_wait.observe(waited, self.pool_name)
+            if self.query_stats is not None:
+                self.query_stats.record_pool_wait(waited * 1000)
+
+
+def instrument_engine(engine: AsyncEngine, stats: QueryStats):
+    """
+    Подключает сбор статистики к движку.
+
+    Args:
+        engine: Асинхронный движок (пул должен быть TimedQueuePool,
+            чтобы учитывалось ожидание соединения)
+        stats: Куда записывать статистику
+    """
+    sync_engine = engine.sync_engine
+    if isinstance(sync_engine.pool, TimedQueuePool):
+        sync_engine.pool.query_stats = stats
+
+    @event.listens_for(sync_engine.pool, "checkout")
+    def _checkout(dbapi_connection, connection_record, connection_proxy):
+        stats.record_checkout()
+
+    @event.listens_for(sync_engine, "before_cursor_execute")
+    def _before_execute(conn, cursor, statement, parameters, context, executemany):
+        context._query_started = time.perf_counter()
+
+    @event.listens_for(sync_engine, "after_cursor_execute")
+    def _after_execute(conn, cursor, statement, parameters, context, executemany):
+        started = getattr(context, "_query_started", None)
+        if started is None:
+            return
+        stats.record_query(
+            statement, (time.perf_counter() - started) * 1000, cursor.rowcount
+        )
+
+
+@contextmanager
+def count_queries() -> Iterator[QueryCounter]:
+    """
+    Считает SQL запросы, выполненные внутри блока.
+
+    Yields:
+        QueryCounter: Счетчик, count - число запросов
+    """
+    counter = QueryCounter(parent=_query_counter.get())
+    token = _query_counter.set(counter)
+    try:
+        yield counter
+    finally:
+        _query_counter.reset(token)
+
+
+@contextmanager
+def query_budget(max_queries: int, label: str = "") -> Iterator[QueryCounter]:
+    """
+    Проверяет, что блок выполнил не больше max_queries SQL запросов.
+
+    Пример:
+        with query_budget(8, "GET /api/statistics/summary"):
+            await client.get("/api/statistics/summary")
+
+    Raises:
+        QueryBudgetExceeded: Запросов больше бюджета
+    """
+    with count_queries() as counter:
+        yield counter
+    if counter.count > max_queries:
+        raise QueryBudgetExceeded(
+            f"{label or 'Блок'}: {counter.count} SQL запросов при бюджете {max_queries}"
+        )
@@ -0,0 +1,237 @@
+"""
+Срок хранения сырых событий: перенос старых activity_events в почасовые
+итоги activity_rollups_hourly (и, в режиме archive, в
+activity_events_archive).
+
+Запуск по расписанию (cron, systemd timer) из каталога backend:
+    python -m src.activitywatch.database.retention
+    python -m src.activitywatch.database.retention --days 180 --mode archive
+"""
+
+import argparse
+import asyncio
+import logging
+from datetime import datetime, timedelta, timezone
+from typing import List, Optional, Tuple
+
+from sqlalchemy import ARRAY, Integer, bindparam, select, text
+
+from src.activitywatch.core.jobs import JobProgress
+from src.activitywatch.database.db_manager import DatabaseManager
+from src.activitywatch.database.models import Device, User
+
+logger = logging.getLogger(__name__)
+
+# Ключ pg_advisory_lock: один перенос на все воркеры и запуски по cron
+RETENTION_LOCK_KEY = 7_262_716_539
+
+# Последнее событие каждого bucket не переносится: по нему строится
+# водяная отметка протокола v2 (get_bucket_watermarks), без нее клиент
+# отправил бы уже учтенные события заново
+KEEP_WATERMARKS_SQL = text(
+    """
+    SELECT DISTINCT ON (bucket_id) id
+    FROM activity_events
+    WHERE device_id = :device_id AND bucket_id IS NOT NULL
+    ORDER BY bucket_id, timestamp DESC
+    """
+)
+
+_ARCHIVE_CTE = """
+archived AS (
+    INSERT INTO activity_events_archive (
+        id, device_id, event_id, bucket_id, event_type, timestamp,
+        duration_seconds, app, window_title, url, data, created_at
+    )
+    SELECT id, device_id, event_id, bucket_id, event_type, timestamp,
+           duration_seconds, app, window_title, url, data, created_at
+    FROM moved
+    ON CONFLICT (id) DO NOTHING
+),
+"""
+
+# Одна порция - одна короткая транзакция: строки выбираются по индексу
+# (device_id, timestamp), занятые приемом пропускаются (SKIP LOCKED),
+# удаляются и прибавляются к итогам часа
+_MOVE_SQL = """
+WITH batch AS (
+    SELECT id FROM activity_events
+    WHERE device_id = :device_id
+      AND timestamp < :cutoff
+      AND id <> ALL(:keep_ids)
+    ORDER BY timestamp
+    LIMIT :batch_size
+    FOR UPDATE SKIP LOCKED
+),
+moved AS (
+    DELETE FROM activity_events e
+    USING batch
+    WHERE e.id = batch.id
+    RETURNING e.id, e.device_id, e.event_id, e.bucket_id, e.event_type, e.timestamp,
+              e.duration_seconds, e.app, e.window_title, e.url, e.data, e.created_at
+),
+{archive}
+rolled AS (
+    INSERT INTO activity_rollups_hourly AS r (
+        device_id, event_type, hour, app, duration_seconds, event_count
+    )
+    SELECT device_id, event_type, date_trunc('hour', timestamp), app,
+           sum(duration_seconds), count(*)
+    FROM moved
+    GROUP BY device_id, event_type, date_trunc('hour', timestamp), app
+    ON CONFLICT (device_id, event_type, hour, app) DO UPDATE SET
+        duration_seconds = r.duration_seconds + excluded.duration_seconds,
+        event_count = r.event_count + excluded.event_count
+)
+SELECT count(*) FROM moved
+"""
+
+
+def _move_statement(archive: bool):
+    sql = _MOVE_SQL.format(archive=_ARCHIVE_CTE if archive else "")
+    return text(sql).bindparams(bindparam("keep_ids", type_=ARRAY(Integer)))
+
+
+class RetentionJob:
+    """
+    Перенос событий старше срока хранения в почасовые итоги.
+
+    Срок - raw_days или retention_days из users.settings пользователя
+    (0 - хранить всегда). Событие удаляется из activity_events в той же
+    транзакции, в которой учитывается в итогах, поэтому статистика,
+    складывающая оба источника, не теряет и не удваивает время.
+    Вызывается как задача JobRunner: job(progress).
+
+    Args:
+        db: Менеджер БД (мастер)
+        raw_days: Срок хранения по умолчанию, дней
+        mode: delete или archive (копия строк в activity_events_archive)
+        batch_size: Событий в одной транзакции
+        batch_pause_ms: Пауза между транзакциями, чтобы не занимать
+            ввод-вывод и автовакуум подряд
+    """
+
+    def __init__(
+        self,
+        db: DatabaseManager,
+        raw_days: int = 0,
+        mode: str = "delete",
+        batch_size: int = 5000,
+        batch_pause_ms: int = 50,
+    ):
+        self.db = db
+        self.raw_days = raw_days
+        self.mode = mode
+        self.batch_size = batch_size
+        self.batch_pause = batch_pause_ms / 1000
+
+    def retention_days(self, user_settings: Optional[dict]) -> int:
+        """Срок хранения пользователя: retention_days из настроек или общий"""
+        value = (user_settings or {}).get("retention_days")
+        try:
+            return max(0, int(value)) if value is not None else self.raw_days
+        except (TypeError, ValueError):
+            return self.raw_days
+
+    async def device_cutoffs(self) -> List[Tuple[int, datetime]]:
+        """Устройства с ограниченным сроком и граница переноса для каждого"""
+        async with self.db.get_session() as session:
+            result = await session.execute(
+                select(Device.id, User.settings)
+                .join(User, User.id == Device.user_id)
+                .order_by(Device.id)
+            )
+            rows = result.fetchall()
+
+        now = datetime.now(timezone.utc)
+        cutoffs = []
+        for device_id, settings in rows:
+            days = self.retention_days(settings)
+            if days > 0:
+                cutoffs.append((device_id, now - timedelta(days=days)))
+        return cutoffs
+
+    async def process_device(
+        self, device_id: int, cutoff: datetime, progress: JobProgress
+    ) -> int:
+        """Перенести события устройства старше cutoff порциями по batch_size"""
+        async with self.db.get_session() as session:
+            keep_ids = list(
+                (await session.execute(KEEP_WATERMARKS_SQL, {"device_id": device_id})).scalars()
+            )
+
+        statement = _move_statement(self.mode == "archive")
+        params = {
+            "device_id": device_id,
+            "cutoff": cutoff,
+            "keep_ids": keep_ids,
+            "batch_size": self.batch_size,
+        }
+        total = 0
+        while True:
+            async with self.db.get_session() as session:
+                # Порция не ждет чужих блокировок дольше нескольких секунд
+                await session.execute(text("SET LOCAL lock_timeout = '5s'"))
+                moved = (await session.execute(statement, params)).scalar_one()
+                await session.commit()
+            total += moved
+            progress.add(moved)
+            if moved < self.batch_size:
+                return total
+            await asyncio.sleep(self.batch_pause)
+
+    async def __call__(self, progress: JobProgress) -> None:
+        cutoffs = await self.device_cutoffs()
+        if not cutoffs:
+            return
+
+        # Соединение с блокировкой удерживается на весь запуск
+        async with self.db.engine.connect() as lock_conn:
+            locked = (
+                await lock_conn.execute(
+                    text("SELECT pg_try_advisory_lock(:key)"), {"key": RETENTION_LOCK_KEY}
+                )
+            ).scalar()
+            if not locked:
+                logger.info("Перенос событий уже выполняется другим процессом")
+                return
+            try:
+                for device_id, cutoff in cutoffs:
+                    await self.process_device(device_id, cutoff, progress)
+            finally:
+                await lock_conn.execute(
+                    text("SELECT pg_advisory_unlock(:key)"), {"key": RETENTION_LOCK_KEY}
+                )
+
+
+async def main():
+    from src.activitywatch.config import cfg, setup_environment
+    from src.activitywatch.core.jobs import job_runner
+    from src.activitywatch.loader import db_manager, retention
+
+    parser = argparse.ArgumentParser(description="Перенос старых событий в почасовые итоги")
+    parser.add_argument("--days", type=int, help=f"Срок хранения (по умолчанию {cfg.retention.raw_days})")
+    parser.add_argument("--mode", choices=("delete", "archive"), help="Удалять или архивировать")
+    parser.add_argument("--batch-size", type=int, help="Событий в транзакции")
+    args = parser.parse_args()
+
+    setup_environment()
+    if args.days is not None:
+        retention.raw_days = args.days
+    if args.mode:
+        retention.mode = args.mode
+    if args.batch_size:
+        retention.batch_size = args.batch_size
+
+    try:
+        report = await job_runner.run_once("retention")
+    finally:
+        await db_manager.close()
+    print(
+        f"перенесено {report['rows']} событий за {report['seconds']} с "
+        f"({report['rows_per_second']} строк/с)"
+    )
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
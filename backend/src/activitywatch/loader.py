@@ -1,11 +1,58 @@
+from collections.abc import AsyncIterator
+
+from sqlalchemy.ext.asyncio import AsyncSession
+
 from src.activitywatch.config import cfg
+from src.activitywatch.core.jobs import job_runner
 from src.activitywatch.database.cruds import CommonCRUD
 from src.activitywatch.database.db_manager import DatabaseManager
+from src.activitywatch.database.retention import RetentionJob
+
+
+db_manager = DatabaseManager(
+    cfg.database.async_url,
+    slow_query_ms=cfg.database.slow_query_ms,
+    pool_size=cfg.database.pool_size,
+    max_overflow=cfg.database.max_overflow,
+    pool_timeout=cfg.database.pool_timeout,
+    echo=cfg.database.echo,
+    statement_cache_size=cfg.database.statement_cache_size,
+    replica_urls=cfg.database.replica_urls,
+    replica_max_lag_seconds=cfg.database.replica_max_lag_seconds,
+    replica_check_interval=cfg.database.replica_check_interval_seconds,
+    replica_pool_timeout=cfg.database.replica_pool_timeout_seconds,
+)
+db = CommonCRUD(db_manager, presence_flush_interval=cfg.database.presence_flush_seconds)
+
+retention = RetentionJob(
+    db_manager,
+    raw_days=cfg.retention.raw_days,
+    mode=cfg.retention.mode,
+    batch_size=cfg.retention.batch_size,
+    batch_pause_ms=cfg.retention.batch_pause_ms,
+)
+job_runner.register("retention", retention, cfg.retention.interval_minutes * 60)
 
 
-db_manager = DatabaseManager(cfg.database.async_url)
-db = CommonCRUD(db_manager)
+async def get_db_session() -> AsyncIterator[AsyncSession]:
+    """
+    Сессия запроса (unit of work) для Depends.
 
+    Одна сессия и одно соединение из пула на весь запрос: обработчик
+    передает ее в методы CRUD (session=...) и сам вызывает commit.
+    Незакоммиченные изменения откатываются при закрытии сессии.
+    Соединение берется из пула при первом SQL запросе.
+    """
+    async with db_manager.get_session() as session:
+        yield session
 
 
+async def get_db_read_session() -> AsyncIterator[AsyncSession]:
+    """
+    Сессия запроса только для чтения (реплика, если настроена).
 
+    Для обработчиков, которые ничего не пишут: тяжелые запросы статистики
+    не занимают соединения мастера, нужные приему данных.
+    """
+    async with db_manager.get_read_session() as session:
+        yield session
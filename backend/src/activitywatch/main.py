@@ -1,3 +1,6 @@
+import logging
+from contextlib import asynccontextmanager
+
 from fastapi import FastAPI
 
 import uvicorn
@@ -6,14 +9,50 @@ from src.activitywatch.api.auth.router import router as auth_router
 from src.activitywatch.api.device.router import router as device_router
 from src.activitywatch.api.tracker.router import router as tracker_router
 from src.activitywatch.api.statistics.router import router as statistics_router
+from src.activitywatch.api.debug.router import router as debug_router
+from src.activitywatch.api.metrics.router import router as metrics_router
+from src.activitywatch.config import cfg
+from src.activitywatch.core.middleware import (
+    MetricsMiddleware,
+    ProfilingMiddleware,
+    RouteContextMiddleware,
+)
+from src.activitywatch.core.jobs import job_runner
+from src.activitywatch.core.profiling import request_profiles
+from src.activitywatch.core.security import password_hasher
+from src.activitywatch.loader import db, db_manager
 from fastapi.middleware.gzip import GZipMiddleware
 
-app = FastAPI(title="ActivityWatch Receiver", version="1.0")
+logger = logging.getLogger(__name__)
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Соединения открываются до первых запросов, а не на их времени
+    opened = await db_manager.warm_up(
+        min(cfg.database.pool_warmup, cfg.database.pool_size)
+    )
+    logger.info("Пул БД прогрет: %s соединений", opened)
+    await db_manager.start_replica_monitor()
+    db.presence.start()
+    if cfg.retention.run_in_app:
+        job_runner.start()
+    yield
+    await job_runner.stop()
+    # Остаток присутствия записывается до закрытия пулов
+    await db.presence.stop()
+    password_hasher.shutdown()
+    await db_manager.close()
+
+
+app = FastAPI(title="ActivityWatch Receiver", version="1.0", lifespan=lifespan)
 
 app.include_router(auth_router)
 app.include_router(device_router)
 app.include_router(tracker_router)
 app.include_router(statistics_router)
+app.include_router(debug_router)
+app.include_router(metrics_router)
 
 origins = ["http://localhost:5173"]
 
@@ -25,6 +64,17 @@ app.add_middleware(
     allow_headers=["*"],
 )
 app.add_middleware(GZipMiddleware, minimum_size=1000)
+# Внешним подключается последний: RouteContext -> Metrics -> Profiling -> GZip -> CORS
+if cfg.app.profiling_enabled:
+    app.add_middleware(
+        ProfilingMiddleware, routes=cfg.app.profile_routes, store=request_profiles
+    )
+app.add_middleware(MetricsMiddleware)
+app.add_middleware(
+    RouteContextMiddleware,
+    query_stats=db_manager.query_stats,
+    expose_query_count=cfg.app.debug,
+)
 received_data = []
 
 
@@ -4,7 +4,7 @@ from typing import List, Optional
 from pydantic import BaseModel, ConfigDict
 
 
-from src.activitywatch.database.models import DevicePlatform, TokenPermission
+from src.activitywatch.database.models import DevicePlatform, SyncStatus, TokenPermission
 
 
 class CreateDeviceRequest(BaseModel):
@@ -28,6 +28,19 @@ class RegisterDeviceRequest(BaseModel):
 
 
 
+class DeviceStatsResponse(BaseModel):
+    """Сводка device_stats в списке устройств"""
+
+    usage_today_seconds: float = 0
+    total_events: int = 0
+    first_event_at: Optional[datetime] = None
+    last_event_at: Optional[datetime] = None
+    last_sync_status: Optional[SyncStatus] = None
+    last_sync_at: Optional[datetime] = None
+
+    model_config = ConfigDict(from_attributes=True)
+
+
 class DeviceResponse(BaseModel):
     id: int
     device_name: str
@@ -39,6 +52,8 @@ class DeviceResponse(BaseModel):
     sync_enabled: bool  # Добавьте если нужно
     last_seen: Optional[datetime] = None  # Может быть None
     first_seen: datetime
+    # Заполняется в списке устройств (GET /devices/), иначе None
+    stats: Optional[DeviceStatsResponse] = None
     # created_at: datetime  # УДАЛИТЕ - в Device нет этого поля
 
     # Добавьте конфигурацию для работы с ORM объектами